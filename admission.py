@@ -0,0 +1,138 @@
+import os
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict
+
+from metrics import ADMISSION, IN_FLIGHT, WAITING
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits: Dict[str, int] = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        if name.strip() and value.strip():
+            limits[name.strip()] = int(value)
+    return limits
+
+# Concurrent analyzer runs / LLM plans per route; routes not listed get ROUTE_CONCURRENCY_DEFAULT
+ROUTE_CONCURRENCY = _parse_limits(os.getenv("ROUTE_CONCURRENCY", "sales=8,weather=8,films=4,network=2,csv=8,llm=4"))
+ROUTE_CONCURRENCY_DEFAULT = int(os.getenv("ROUTE_CONCURRENCY_DEFAULT", "4"))
+# Requests allowed to wait for a slot, per route, and for how long; beyond that they are shed
+ROUTE_QUEUE_SIZE = int(os.getenv("ROUTE_QUEUE_SIZE", "16"))
+ROUTE_QUEUE_TIMEOUT = float(os.getenv("ROUTE_QUEUE_TIMEOUT", "30"))
+ROUTE_RETRY_AFTER = int(os.getenv("ROUTE_RETRY_AFTER", "2"))
+# Batches running at once. Their questions wait for route slots instead of being shed, up to
+# BATCH_CONCURRENCY each, so this bounds those waiters; further batches are shed whole
+BATCH_MAX_ACTIVE = int(os.getenv("BATCH_MAX_ACTIVE", "2"))
+
+class Overloaded(RuntimeError):
+    """A route's slots and wait queue are full; answered with 503 and Retry-After."""
+
+    def __init__(self, message: str, retry_after: int = ROUTE_RETRY_AFTER):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class RouteGate:
+    """
+    Concurrency budget of one route: `limit` requests run, up to `max_waiting` more wait in
+    FIFO order. Slots are handed straight to the next waiter, so a burst cannot overtake
+    requests already queued. Callers that are never shed (job workers, admitted batches) are
+    bounded upstream and do not count against `max_waiting`. Not bound to an event loop until
+    a request has to wait.
+    """
+
+    def __init__(self, route: str, limit: int, max_waiting: int = ROUTE_QUEUE_SIZE):
+        self.route = route
+        self.limit = max(1, limit)
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._unshed = 0
+
+    @property
+    def waiting(self) -> int:
+        # Waiters that can be shed; the ones the max_waiting budget is about
+        return len(self._waiters) - self._unshed
+
+    def _publish(self):
+        IN_FLIGHT.set(self.in_flight, route=self.route)
+        WAITING.set(len(self._waiters), route=self.route)
+
+    async def acquire(self, shed: bool = True):
+        """Take a slot, waiting in line if needed. With shed=False, wait however long it takes (async jobs)."""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            ADMISSION.inc(route=self.route, result="admitted")
+            self._publish()
+            return
+        if shed and self.waiting >= self.max_waiting:
+            ADMISSION.inc(route=self.route, result="shed")
+            raise Overloaded(f"Too many concurrent '{self.route}' requests; retry later")
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        if not shed:
+            self._unshed += 1
+        self._publish()
+        ADMISSION.inc(route=self.route, result="queued")
+        try:
+            await asyncio.wait_for(fut, ROUTE_QUEUE_TIMEOUT if shed else None)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if fut.done() and not fut.cancelled():
+                # The slot arrived as the wait ended; pass it on
+                self.release()
+            if isinstance(e, asyncio.TimeoutError):
+                ADMISSION.inc(route=self.route, result="timeout")
+                raise Overloaded(f"Timed out waiting for a '{self.route}' slot; retry later")
+            raise
+        finally:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+            if not shed:
+                self._unshed -= 1
+            self._publish()
+
+    def release(self):
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                # in_flight is unchanged: the slot moves to the waiter
+                fut.set_result(None)
+                return
+        self.in_flight -= 1
+        self._publish()
+
+    def stats(self) -> Dict[str, int]:
+        return {"limit": self.limit, "in_flight": self.in_flight, "waiting": self.waiting,
+                "max_waiting": self.max_waiting, "waiting_unshed": self._unshed}
+
+class BatchGate:
+    """Whole-batch admission: a batch is admitted or shed up front, never question by question."""
+
+    def __init__(self, limit: int = BATCH_MAX_ACTIVE):
+        self.limit = max(1, limit)
+        self.active = 0
+
+    def acquire(self):
+        if self.active >= self.limit:
+            ADMISSION.inc(route="batch", result="shed")
+            raise Overloaded(f"Too many concurrent batches (limit {self.limit}); retry later")
+        self.active += 1
+        ADMISSION.inc(route="batch", result="admitted")
+
+    def release(self):
+        self.active -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"limit": self.limit, "active": self.active}
+
+batch_gate = BatchGate()
+
+_gates: Dict[str, RouteGate] = {}
+
+def route_gate(route: str) -> RouteGate:
+    gate = _gates.get(route)
+    if gate is None:
+        gate = _gates[route] = RouteGate(route, ROUTE_CONCURRENCY.get(route, ROUTE_CONCURRENCY_DEFAULT))
+    return gate
+
+def admission_stats() -> Dict[str, Any]:
+    return {name: _gates[name].stats() for name in sorted(_gates)}
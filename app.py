@@ -1,104 +1,227 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Response
-from fastapi.responses import JSONResponse
-from typing import List, Optional, Dict, Any
-import tempfile, os
+import time
+_APP_IMPORT_START = time.perf_counter()
 
-from router import decide_route, detect_output_spec
-from planner import plan_with_llm
-from executor import run_code_steps
-from validators import ValidationError, validate_final_output_schema
-from yaml_utils import load_yaml_files_merged
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
+from typing import List, Optional, Dict, Any
+import asyncio, json, logging, os
+
+from sandbox import get_sandbox_pool, shutdown_sandbox_pool
+from workers import start_workers, shutdown_workers
+from response_cache import response_cache
+from uploads import MAX_REQUEST_BYTES, RequestSizeLimit, declared_size, read_question
+from lazy_imports import import_times
+from json_response import dumps
+from metrics import TIMING_HEADER, RequestTimer, render_metrics
+from plan_cache import plan_cache
+from admission import Overloaded, admission_stats, batch_gate
+from scratch import get_scratch_space
+from pipeline import UploadSet, answer_question, http_error, receive_uploads
+from jobs import JOB_RETRY_AFTER, QueueFull, get_job_queue, shutdown_job_queue
+
+# "background" warms pools after the server starts accepting connections; "blocking" before; "off" never
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "background").lower()
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "100"))
+# Questions of one batch in flight at once; the rest wait their turn instead of being shed
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+logger = logging.getLogger(__name__)
+startup_profile: Dict[str, Any] = {"warmup": "pending"}
+
+async def _warm_up():
+    start = time.perf_counter()
+    try:
+        startup_profile["worker_import_times"] = await start_workers()
+        startup_profile["warmup"] = "done"
+    except Exception as e:
+        startup_profile["warmup"] = f"failed: {e}"
+    startup_profile["warmup_s"] = round(time.perf_counter() - start, 4)
+    logger.info("Analyzer warm-up %s in %.2fs: %s", startup_profile["warmup"],
+                startup_profile["warmup_s"], startup_profile.get("worker_import_times"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    get_sandbox_pool().start()
+    await get_job_queue().start()
+    # Directories of crashed processes, except uploads of jobs that were just re-queued
+    get_scratch_space().sweep(keep=await asyncio.to_thread(get_job_queue().store.live_tempdirs))
+    warmup = None
+    if STARTUP_WARMUP == "blocking":
+        await _warm_up()
+    elif STARTUP_WARMUP == "background":
+        warmup = asyncio.create_task(_warm_up())
+    else:
+        startup_profile["warmup"] = "off"
+    try:
+        yield
+    finally:
+        if warmup is not None:
+            warmup.cancel()
+        await shutdown_job_queue()
+        shutdown_workers()
+        shutdown_sandbox_pool()
 
-# Existing analyzers
-from sales_analyzer import handle_sales_task
-from films_analyzer import handle_films_task
+app = FastAPI(title="LLM Data Analyst Agent", lifespan=lifespan)
 
-from network_analyzer import handle_network_task
-from weather_analyzer import handle_weather_task
+# Enforced on the body stream, so chunked uploads are cut off before they are spooled in full
+app.add_middleware(RequestSizeLimit, max_bytes=MAX_REQUEST_BYTES)
 
-app = FastAPI(title="LLM Data Analyst Agent")
+def _timed(resp: Response, timer: RequestTimer) -> Response:
+    if TIMING_HEADER:
+        resp.headers["Server-Timing"] = timer.server_timing()
+    return resp
 
 @app.post("/api/")
 async def analyze_api(
     questions: UploadFile = File(...),
     files: Optional[List[UploadFile]] = File(None),
+    async_mode: bool = Query(False, alias="async"),
 ):
-    tempdir = tempfile.mkdtemp(prefix="llm_daa_")
+    scratch = get_scratch_space().allocate(declared_size(files))
+    queued = False
+    timer = RequestTimer()
+    try:
+        with timer.stage("upload"):
+            # Read the question text
+            qtext = await read_question(questions)
+            uploads = await receive_uploads(files, scratch)
+
+        if async_mode:
+            # ?async=true: queue the work and answer with a job id straight away
+            timer.route = "async"
+            job_id = await get_job_queue().submit(qtext, uploads.file_map, uploads.file_hashes, scratch.path)
+            # The job owns the directory now and releases it when it has run
+            queued = True
+            return JSONResponse(status_code=202, content={
+                "job_id": job_id, "status": "queued",
+                "status_url": f"/api/jobs/{job_id}", "result_url": f"/api/jobs/{job_id}/result"})
+
+        answer = await answer_question(qtext, uploads, timer)
+        headers = {"X-Cache": "hit"} if answer.cached else None
+        return _timed(Response(content=answer.body, media_type="application/json", headers=headers), timer)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(JOB_RETRY_AFTER)})
+    except Exception as e:
+        raise http_error(e)
+    finally:
+        timer.finish()
+        if not queued:
+            get_scratch_space().release(scratch.path)
+
+def _question_list(text: str) -> List[str]:
+    # A part holding a JSON array of strings is a list of questions; otherwise one question
+    stripped = text.strip()
+    if stripped.startswith("["):
+        try:
+            items = json.loads(stripped)
+        except ValueError:
+            items = None
+        if isinstance(items, list) and all(isinstance(q, str) for q in items):
+            return items
+    return [text]
+
+async def _batch_item(qtext: str, uploads: UploadSet, limit: asyncio.Semaphore) -> bytes:
+    timer = RequestTimer()
     try:
-        # Read the question text
-        qtext = (await questions.read()).decode("utf-8", errors="ignore")
-
-        # Save uploaded files and map filename -> path
-        file_map: Dict[str, str] = {}
-        if files:
-            for f in files:
-                path = os.path.join(tempdir, f.filename)
-                with open(path, "wb") as out:
-                    out.write(await f.read())
-                file_map[f.filename] = path
-
-        # Parse YAML files into structured context for LLM
-        yaml_context = load_yaml_files_merged(file_map)
-
-        # Route the request
-        route = decide_route(qtext, file_map)
-
-        # ---- Fast-path analyzers ----
-
-        # SALES
-        if "sample-sales.csv" in file_map:
-            result = handle_sales_task(qtext, file_map["sample-sales.csv"])
-            return JSONResponse(content=result)
-
-        # FILMS
-        if route["type"] == "films":
-            result_array = handle_films_task()
-            if not (isinstance(result_array, list) and len(result_array) == 4 and all(isinstance(x, str) for x in result_array)):
-                raise HTTPException(status_code=400, detail="Validation failed: Expected JSON array output.")
-            return JSONResponse(content=result_array)
-
-        # NETWORK
-        if "edges.csv" in file_map:
-            result = handle_network_task(qtext, file_map["edges.csv"])
-            return JSONResponse(content=result)
-
-        # WEATHER
-        if "sample-weather.csv" in file_map:
-            result = handle_weather_task(qtext, file_map["sample-weather.csv"])
-            return JSONResponse(content=result)
-
-        # ---- Generic LLM pipeline ----
-        output_spec = detect_output_spec(qtext)
-        plan = await plan_with_llm(
-            qtext,
-            {"files": list(file_map.keys()), "yaml_summary": yaml_context.get("__summary__", {})},
-            output_spec
-        )
-        context = {
-            "files": file_map,
-            "tempdir": tempdir,
-            "yaml_data": yaml_context
-        }
-        exec_result: Any = await run_code_steps(plan, context)
-
-        validate_final_output_schema(exec_result, output_spec)
-
-        if output_spec.get("type") == "json_array":
-            if not isinstance(exec_result, list):
-                raise HTTPException(status_code=400, detail="Validation failed: Expected JSON array output.")
-            return JSONResponse(content=[str(x) for x in exec_result])
-        else:
-            if not isinstance(exec_result, dict):
-                raise HTTPException(status_code=400, detail="Validation failed: Expected JSON object output.")
-            return JSONResponse(content=exec_result)
-
-    except ValidationError as ve:
-        raise HTTPException(status_code=400, detail=f"Validation failed: {ve}")
+        # An admitted batch never sheds its own questions: it holds at most `limit` route
+        # slots and waits for them like an async job (batch_gate bounds how many batches do)
+        async with limit:
+            answer = await answer_question(qtext, uploads, timer, shed=False)
+        # The stored body is spliced in as is; it is already serialized JSON
+        return (b'{"status":200,"route":' + dumps(answer.route) + b',"cached":'
+                + (b"true" if answer.cached else b"false") + b',"result":' + answer.body + b"}")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal error: {e}")
+        err = http_error(e)
+        return dumps({"status": err.status_code, "route": timer.route, "detail": err.detail})
     finally:
-        # In production, you might remove tempdir here
-        pass
+        timer.finish()
+
+@app.post("/api/batch/")
+async def analyze_batch(
+    questions: List[UploadFile] = File(...),
+    files: Optional[List[UploadFile]] = File(None),
+):
+    """
+    Many questions over one upload. Files are saved, hashed and opened once; questions
+    run concurrently over the same dataset handles, so parsed frames and per-dataset
+    analyzer intermediates (Dataset.memo) are computed once for the batch.
+    """
+    try:
+        batch_gate.acquire()
+    except Overloaded as e:
+        raise http_error(e)
+    try:
+        scratch = get_scratch_space().allocate(declared_size(files))
+        timer = RequestTimer()
+        timer.route = "batch"
+        try:
+            try:
+                with timer.stage("upload"):
+                    qtexts: List[str] = []
+                    for q in questions:
+                        qtexts.extend(_question_list(await read_question(q)))
+                    if not qtexts:
+                        raise HTTPException(status_code=400, detail="No questions provided.")
+                    if len(qtexts) > BATCH_MAX_QUESTIONS:
+                        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_QUESTIONS} questions")
+                    uploads = await receive_uploads(files, scratch)
+            except Exception as e:
+                raise http_error(e)
+            finally:
+                timer.finish()
+
+            limit = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+            items = await asyncio.gather(*(_batch_item(q, uploads, limit) for q in qtexts))
+        finally:
+            get_scratch_space().release(scratch.path)
+    finally:
+        batch_gate.release()
+    return Response(content=b'{"results":[' + b",".join(items) + b"]}", media_type="application/json")
+
+def _job_or_404(job_id: str) -> Dict[str, Any]:
+    job = get_job_queue().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+def job_status(job_id: str):
+    job = _job_or_404(job_id)
+    job.pop("result")
+    return dict(job, result_url=f"/api/jobs/{job_id}/result")
+
+@app.get("/api/jobs/{job_id}/result")
+def job_result(job_id: str):
+    job = _job_or_404(job_id)
+    if job["status"] == "done":
+        return Response(content=job["result"], media_type="application/json")
+    if job["status"] == "failed":
+        return JSONResponse(status_code=job["http_status"] or 500, content={"detail": job["detail"]})
+    # Still queued or running
+    return JSONResponse(status_code=202, content={"job_id": job_id, "status": job["status"]},
+                        headers={"Retry-After": str(JOB_RETRY_AFTER)})
+
+@app.get("/startup")
+def startup_report():
+    # Per-module import seconds for this process and for an analyzer worker
+    return dict(startup_profile, api_import_times=import_times())
+
+@app.get("/cache/stats")
+def cache_stats():
+    return dict(response_cache.stats(), plans=plan_cache.stats())
+
+@app.get("/admission/stats")
+def load_stats():
+    # Per-route slots in use and requests waiting for one, the async job backlog and scratch usage
+    queue = get_job_queue()
+    return {"routes": admission_stats(), "batches": batch_gate.stats(), "jobs": dict(queue.store.counts(), queue_depth=queue.depth()),
+            "scratch": get_scratch_space().stats()}
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text exposition; counters are per process (run one scrape target per worker)
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def health():
@@ -114,4 +237,6 @@ def health():
         </body>
     </html>
     """
-    return Response(content=html_content, media_type="text/html")
\ No newline at end of file
+    return Response(content=html_content, media_type="text/html")
+
+startup_profile["app_import_s"] = round(time.perf_counter() - _APP_IMPORT_START, 4)
@@ -0,0 +1,53 @@
+"""Synthetic sales, weather and edge-list CSVs shaped like the sample fixtures."""
+import os
+import numpy as np
+import pandas as pd
+
+REGIONS = ["East", "West", "North", "South", "Central", "Northeast", "Southwest", "Pacific"]
+
+def generate_sales(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2015-01-01") + pd.to_timedelta(rng.integers(0, 3650, n), unit="D")
+    return pd.DataFrame({
+        "order_id": np.arange(1, n + 1),
+        "date": dates.strftime("%Y-%m-%d"),
+        "region": rng.choice(REGIONS, n),
+        "sales": rng.gamma(2.0, 60.0, n).round(2),
+    })
+
+def generate_weather(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("1990-01-01", periods=n, freq="h")
+    season = 10 * np.sin(2 * np.pi * np.arange(n) / (24 * 365.25))
+    return pd.DataFrame({
+        "date": dates.strftime("%Y-%m-%d %H:%M"),
+        "temperature_c": (12 + season + rng.normal(0, 3, n)).round(1),
+        "precip_mm": np.where(rng.random(n) < 0.7, 0.0, rng.gamma(1.2, 2.0, n)).round(1),
+    })
+
+def generate_edges(n: int, seed: int = 0) -> pd.DataFrame:
+    # Skewed degrees (a few hubs), with the Alice/Eve pair the analyzer looks for
+    rng = np.random.default_rng(seed)
+    nodes = max(10, n // 5)
+    names = np.array(["Alice", "Bob", "Carol", "David", "Eve"] + [f"n{i}" for i in range(nodes - 5)], dtype=object)
+    src = np.minimum((rng.pareto(1.5, n) * nodes / 50).astype(np.int64), nodes - 1)
+    dst = rng.integers(0, nodes, n)
+    return pd.DataFrame({"source": names[src], "target": names[dst]})
+
+GENERATORS = {
+    "sales": (generate_sales, "sample-sales.csv"),
+    "weather": (generate_weather, "sample-weather.csv"),
+    "network": (generate_edges, "edges.csv"),
+}
+
+def dataset_path(kind: str, n: int, data_dir: str, seed: int = 0) -> str:
+    """Generate (once) and return the CSV for `kind` at `n` rows under `data_dir`."""
+    gen, filename = GENERATORS[kind]
+    folder = os.path.join(data_dir, f"{kind}-{n}-s{seed}")
+    path = os.path.join(folder, filename)
+    if not os.path.exists(path):
+        os.makedirs(folder, exist_ok=True)
+        tmp = path + ".tmp"
+        gen(n, seed).to_csv(tmp, index=False)
+        os.replace(tmp, path)
+    return path
@@ -0,0 +1,180 @@
+"""
+Benchmark the analyzers, routing and PNG encoding on synthetic data.
+
+    python benchmarks/run.py --sizes 1000,100000,1000000 --out results.json
+    python benchmarks/run.py --compare before.json after.json
+
+Each (target, rows) case is timed `--repeat` times with perf_counter (setup excluded),
+then run once more under tracemalloc for peak traced memory.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from datagen import dataset_path  # noqa: E402
+
+DEFAULT_SIZES = "1000,10000,100000,1000000"
+TARGETS = ["sales", "weather", "network", "route", "png"]
+
+def _question(kind: str) -> str:
+    with open(os.path.join(ROOT, kind, "questions.txt"), encoding="utf-8") as f:
+        return f.read()
+
+# A case returns (prepare, run): prepare() builds fresh arguments, run(*args) is timed
+Case = Tuple[Callable[[], tuple], Callable[..., Any]]
+
+def _analyzer_case(kind: str, target: str) -> Callable[[int, str], Case]:
+    def build(n: int, data_dir: str) -> Case:
+        from io_utils import CsvDataset
+        from workers import _resolve
+        path = dataset_path(kind, n, data_dir)
+        qtext = _question(kind)
+        handler = _resolve(target)
+        # A new dataset per run so the CSV parse is part of the measurement
+        return (lambda: (qtext, CsvDataset(os.path.basename(path), path))), handler
+    return build
+
+def _route_case(n: int, data_dir: str) -> Case:
+    from io_utils import open_datasets
+    from router import decide_route
+    file_map = {}
+    for kind in ("sales", "weather", "network"):
+        path = dataset_path(kind, n, data_dir)
+        file_map[os.path.basename(path)] = path
+    qtext = _question("sales")
+
+    def run():
+        return decide_route(qtext, file_map, open_datasets(file_map))
+    return (lambda: ()), run
+
+def _png_case(n: int, data_dir: str) -> Case:
+    import numpy as np
+    from plot_utils import new_subplots, png_base64_under_limit
+
+    def prepare():
+        rng = np.random.default_rng(0)
+        fig, ax = new_subplots()
+        ax.scatter(rng.random(n), rng.random(n), s=4)
+        return (fig,)
+    return prepare, png_base64_under_limit
+
+CASES: Dict[str, Callable[[int, str], Case]] = {
+    "sales": _analyzer_case("sales", "sales_analyzer:handle_sales_task"),
+    "weather": _analyzer_case("weather", "weather_analyzer:handle_weather_task"),
+    "network": _analyzer_case("network", "network_analyzer:handle_network_task"),
+    "route": _route_case,
+    "png": _png_case,
+}
+
+def measure(target: str, n: int, data_dir: str, repeat: int) -> Dict[str, Any]:
+    row: Dict[str, Any] = {"target": target, "rows": n}
+    try:
+        prepare, run = CASES[target](n, data_dir)
+        run(*prepare())  # warm-up: imports, page cache, thread pools
+        runs = []
+        for _ in range(repeat):
+            args = prepare()
+            start = time.perf_counter()
+            run(*args)
+            runs.append(time.perf_counter() - start)
+        args = prepare()
+        tracemalloc.start()
+        try:
+            run(*args)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        row.update(min_s=round(min(runs), 6), median_s=round(statistics.median(runs), 6),
+                   runs=[round(r, 6) for r in runs], peak_mb=round(peak / 2 ** 20, 2))
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    return row
+
+def _git(*args) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True,
+                              timeout=30).stdout.strip()
+    except Exception:
+        return ""
+
+def environment() -> Dict[str, Any]:
+    versions = {}
+    for name in ("numpy", "pandas", "matplotlib", "networkx", "PIL"):
+        try:
+            versions[name] = __import__(name).__version__
+        except Exception:
+            versions[name] = None
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
+
+def compare(base_path: str, new_path: str):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    before = {(r["target"], r["rows"]): r for r in base["results"]}
+    print(f"{'target':<10}{'rows':>10}{'before_s':>12}{'after_s':>12}{'ratio':>8}")
+    for r in new["results"]:
+        b = before.get((r["target"], r["rows"]))
+        if not b or "median_s" not in b or "median_s" not in r:
+            continue
+        ratio = r["median_s"] / b["median_s"] if b["median_s"] else float("nan")
+        print(f"{r['target']:<10}{r['rows']:>10}{b['median_s']:>12.4f}{r['median_s']:>12.4f}{ratio:>8.2f}")
+    print(f"before: {base['environment'].get('commit')}  after: {new['environment'].get('commit')}")
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated row counts (up to 10000000)")
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data-dir", default=os.getenv("BENCH_DATA_DIR", os.path.join(ROOT, "benchmarks", ".data")),
+                        help="where generated CSVs are kept between runs")
+    parser.add_argument("--out", default=None, help="results JSON path (default bench-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    targets = [t for t in args.targets.split(",") if t]
+    unknown = set(targets) - set(CASES)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    results = []
+    for n in sizes:
+        for target in targets:
+            row = measure(target, n, args.data_dir, args.repeat)
+            results.append(row)
+            print(f"{target:<10}{n:>10}  " + (row.get("error") or
+                  f"median {row['median_s']:.4f}s  min {row['min_s']:.4f}s  peak {row['peak_mb']} MiB"),
+                  flush=True)
+
+    env = environment()
+    out = args.out or f"bench-{env['commit'] or 'local'}.json"
+    with open(out, "w") as f:
+        json.dump({"environment": env, "repeat": args.repeat, "results": results}, f, indent=2)
+    print(f"wrote {out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from io_utils import private_dir, user_temp_path
+
+# Parsed uploads as one .npy per column plus schema.json, keyed by content hash. Entries are
+# read back as the upload's data, so the directory must be private to this user (see
+# io_utils.private_dir); otherwise nothing is cached
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", user_temp_path("columns"))
+DATASET_CACHE_MAX_BYTES = int(os.getenv("DATASET_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+# Small CSVs parse faster than a directory of .npy files opens
+DATASET_CACHE_MIN_BYTES = int(os.getenv("DATASET_CACHE_MIN_BYTES", str(1024 * 1024)))
+# A writer's temp directory untouched for this long belongs to a killed process and is removed
+DATASET_CACHE_TMP_GRACE = int(os.getenv("DATASET_CACHE_TMP_GRACE", "3600"))
+
+SCHEMA_FILE = "schema.json"
+SCHEMA_VERSION = 1
+
+logger = logging.getLogger(__name__)
+# Conversion runs off the request path, one file at a time
+_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="columnar")
+_pending = set()
+_pending_lock = threading.Lock()
+_verified: Dict[str, bool] = {}
+
+def _cache_dir() -> Optional[str]:
+    if not DATASET_CACHE_DIR:
+        return None
+    if DATASET_CACHE_DIR not in _verified:
+        try:
+            private_dir(DATASET_CACHE_DIR)
+            _verified[DATASET_CACHE_DIR] = True
+        except OSError as e:
+            logger.warning("Columnar cache disabled: %s", e)
+            _verified[DATASET_CACHE_DIR] = False
+    return DATASET_CACHE_DIR if _verified[DATASET_CACHE_DIR] else None
+
+def _entry_dir(content_hash: str) -> str:
+    return os.path.join(DATASET_CACHE_DIR, content_hash)
+
+def has_frame(content_hash: Optional[str]) -> bool:
+    return bool(content_hash) and _cache_dir() is not None and os.path.exists(
+        os.path.join(_entry_dir(content_hash), SCHEMA_FILE))
+
+def load_frame(content_hash: Optional[str]) -> Optional[pd.DataFrame]:
+    """
+    The frame stored for `content_hash`, or None. Numeric columns are copy-on-write
+    memory maps (pages load on demand; writes stay private to this process); text
+    columns are rebuilt from their factorized codes as the object columns read_csv gives.
+    """
+    if not has_frame(content_hash):
+        return None
+    folder = _entry_dir(content_hash)
+    try:
+        with open(os.path.join(folder, SCHEMA_FILE), "r", encoding="utf-8") as f:
+            schema = json.load(f)
+        if schema.get("version") != SCHEMA_VERSION:
+            return None
+        data = {}
+        for i, col in enumerate(schema["columns"]):
+            if col["kind"] == "numeric":
+                data[i] = np.load(os.path.join(folder, f"{i}.npy"), mmap_mode="c").view(np.ndarray)
+            else:
+                codes = np.load(os.path.join(folder, f"{i}.codes.npy"), mmap_mode="r")
+                uniques = _load_strings(folder, i)
+                values = uniques.take(codes, mode="clip") if len(uniques) else np.empty(len(codes), dtype=object)
+                values[codes < 0] = np.nan
+                data[i] = values
+        frame = pd.DataFrame(data, copy=False)
+        frame.columns = pd.Index([c["name"] for c in schema["columns"]], dtype=object)
+        os.utime(os.path.join(folder, SCHEMA_FILE))  # mtime is the LRU clock
+        return frame
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning("Dropping unreadable columnar cache entry %s: %s", content_hash, e)
+        shutil.rmtree(folder, ignore_errors=True)
+        return None
+
+def _save_strings(folder: str, i: int, values: np.ndarray):
+    # Distinct strings as one UTF-8 text plus character offsets: compact for any length mix
+    lengths = np.fromiter((len(v) for v in values), dtype=np.int64, count=len(values))
+    np.save(os.path.join(folder, f"{i}.offsets.npy"), np.concatenate(([0], np.cumsum(lengths))))
+    with open(os.path.join(folder, f"{i}.uniques.txt"), "w", encoding="utf-8", newline="") as f:
+        f.write("".join(values))
+
+def _load_strings(folder: str, i: int) -> np.ndarray:
+    offsets = np.load(os.path.join(folder, f"{i}.offsets.npy")).tolist()
+    with open(os.path.join(folder, f"{i}.uniques.txt"), "r", encoding="utf-8", newline="") as f:
+        text = f.read()
+    out = np.empty(len(offsets) - 1, dtype=object)
+    out[:] = [text[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+    return out
+
+def _storable(frame: pd.DataFrame) -> bool:
+    if not isinstance(frame.index, pd.RangeIndex) or frame.index.start != 0 or frame.index.step != 1:
+        return False
+    if not all(isinstance(c, str) for c in frame.columns):
+        return False
+    for _, s in frame.items():
+        if s.dtype.kind in "biuf":
+            continue
+        # read_csv text columns hold str or NaN; anything else is not round-tripped
+        if s.dtype != object or pd.api.types.infer_dtype(s, skipna=True) not in ("string", "empty"):
+            return False
+    return True
+
+def store_frame(content_hash: str, frame: pd.DataFrame):
+    """Write `frame` under `content_hash` (atomically; concurrent writers of the same hash are harmless)."""
+    if _cache_dir() is None:
+        return
+    final = _entry_dir(content_hash)
+    if os.path.exists(final) or not _storable(frame):
+        return
+    tmp = tempfile.mkdtemp(prefix=f".{content_hash[:16]}.", dir=DATASET_CACHE_DIR)
+    try:
+        columns = []
+        for i, (name, s) in enumerate(frame.items()):
+            if s.dtype.kind in "biuf":
+                np.save(os.path.join(tmp, f"{i}.npy"), s.to_numpy())
+                columns.append({"name": str(name), "kind": "numeric", "dtype": str(s.dtype)})
+            else:
+                codes, uniques = pd.factorize(s, use_na_sentinel=True)
+                np.save(os.path.join(tmp, f"{i}.codes.npy"), codes.astype(np.int32 if len(uniques) < 2**31 else np.int64))
+                _save_strings(tmp, i, np.asarray(uniques, dtype=object))
+                columns.append({"name": str(name), "kind": "text"})
+        with open(os.path.join(tmp, SCHEMA_FILE), "w", encoding="utf-8") as f:
+            json.dump({"version": SCHEMA_VERSION, "rows": len(frame), "columns": columns}, f)
+        os.rename(tmp, final)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+    _evict()
+
+def store_frame_async(content_hash: Optional[str], frame: pd.DataFrame, source_path: str):
+    """Queue conversion of a freshly parsed upload, if it is worth caching."""
+    if not content_hash or _cache_dir() is None or has_frame(content_hash):
+        return
+    try:
+        if os.path.getsize(source_path) < DATASET_CACHE_MIN_BYTES:
+            return
+    except OSError:
+        return
+    with _pending_lock:
+        if content_hash in _pending:
+            return
+        _pending.add(content_hash)
+
+    def job():
+        try:
+            store_frame(content_hash, frame)
+        except Exception as e:
+            logger.warning("Columnar cache write failed for %s: %s", content_hash, e)
+        finally:
+            with _pending_lock:
+                _pending.discard(content_hash)
+    _writer.submit(job)
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, names in os.walk(path):
+        for n in names:
+            try:
+                total += os.path.getsize(os.path.join(root, n))
+            except OSError:
+                pass
+    return total
+
+def _evict():
+    entries = []
+    writing = 0
+    try:
+        names = os.listdir(DATASET_CACHE_DIR)
+    except OSError:
+        return
+    now = time.time()
+    for n in names:
+        path = os.path.join(DATASET_CACHE_DIR, n)
+        if n.startswith("."):
+            # .<hash>.* temp directories: in-progress writes count toward the budget, stale ones go
+            try:
+                if now - os.path.getmtime(path) > DATASET_CACHE_TMP_GRACE:
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    writing += _dir_size(path)
+            except OSError:
+                pass
+            continue
+        schema = os.path.join(path, SCHEMA_FILE)
+        if not os.path.exists(schema):
+            continue
+        try:
+            entries.append((os.path.getmtime(schema), _dir_size(path), n))
+        except OSError:
+            continue
+    total = writing + sum(e[1] for e in entries)
+    for _, size, n in sorted(entries):
+        if total <= DATASET_CACHE_MAX_BYTES:
+            break
+        # Open memory maps keep working after unlink on POSIX
+        shutil.rmtree(os.path.join(DATASET_CACHE_DIR, n), ignore_errors=True)
+        total -= size
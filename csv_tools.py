@@ -1,67 +1,484 @@
 import re
+import warnings
 import pandas as pd
 import numpy as np
-from typing import Dict, Optional
-from plot_utils import fig_to_base64_under_limit
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from plot_utils import bar_chart, downsample_line, line_width_px, new_subplots, png_image_under_limit, render_charts
+from io_utils import CsvDataset, open_datasets
+from validators import ValidationError, validate_final_output_schema
 
-def maybe_answer_with_builtins(qtext: str, file_map: Dict[str, str]) -> Optional[dict]:
+# "- `key`: type" lines of the requested output, and "1. question" lines of the task
+KEY_LINE = re.compile(r"^\s*[-*]\s*(?:`([^`]+)`|([A-Za-z_][A-Za-z0-9_]*))\s*:\s*(.+?)\s*$")
+ITEM_LINE = re.compile(r"^\s*\d+[.)]\s+(.+?)\s*$")
+
+STATS = {"sum": ("total", "sum"), "mean": ("average", "mean", "avg"), "median": ("median",),
+         "std": ("standard deviation", "std"), "var": ("variance",)}
+EXTREMES = {"max": ("maximum", "max", "highest", "largest", "biggest", "greatest", "most", "peak", "top"),
+            "min": ("minimum", "min", "lowest", "smallest", "least", "fewest", "bottom")}
+COMPARATORS = (("greater than or equal to", ">="), ("less than or equal to", "<="), ("at least", ">="),
+               ("at most", "<="), ("greater than", ">"), ("more than", ">"), ("above", ">"), ("over", ">"),
+               ("exceeding", ">"), ("less than", "<"), ("below", "<"), ("under", "<"), ("equal to", "=="),
+               (">=", ">="), ("<=", "<="), (">", ">"), ("<", "<"))
+COLORS = ("red", "blue", "green", "orange", "purple", "black", "gray", "grey", "yellow", "pink",
+          "brown", "cyan", "magenta", "teal", "navy")
+DATE_PARTS = (("day of the month", "day"), ("day of month", "day"), ("day of the week", "dayofweek"),
+              ("day of week", "dayofweek"), ("weekday", "dayofweek"), ("month", "month"), ("year", "year"))
+# Text columns with at most this many distinct values can be filtered on by value
+FILTER_MAX_VALUES = 50
+# Qualifiers answer_query does not model (time buckets, date ranges, rates); questions using
+# them go to the planner rather than getting the unqualified answer
+UNMODELED_TIME = re.compile(r"\b(daily|weekly|monthly|quarterly|yearly|annual|annually|hourly|after|before|since|"
+                            r"between|until|through|during|prior to|from \d|january|february|march|april|may|june|"
+                            r"july|august|september|october|november|december)\b")
+UNMODELED_GROUPING = re.compile(r"\b(per|each|every|by)\b")
+DATE_LITERAL = re.compile(r"\b\d{4}[-/.]\d{1,2}(?:[-/.]\d{1,2})?\b|\b\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4}\b")
+YEAR = re.compile(r"\b(?:1[89]|2\d)\d{2}\b")
+# Negations, ordinals and derived quantities have no model either: "not in East" must not
+# become the East filter, nor "second highest" the maximum
+UNMODELED_MODIFIER = re.compile(r"\b(not|no|non|none|excluding|exclude[sd]?|except|other than|without|besides|apart from|"
+                                r"ignoring|outside|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth|"
+                                r"\d+(?:st|nd|rd|th)|penultimate|runner[- ]up|next|previous|last|difference|ratio|"
+                                r"proportion|share|fraction|percentage|change|growth|increase|decrease|discount|net)\b|n't\b")
+PERCENT = re.compile(r"(\d+(?:\.\d+)?)\s*(?:%|percent\b)")
+
+_COMPARE = re.compile(r"(?<![a-z])(" + "|".join(re.escape(w) for w, _ in COMPARATORS) + r")\s*(-?\d+(?:\.\d+)?)(?![\d.]*\s*(?:kb|bytes)\b)")
+_CHART = re.compile(r"\b(plot|chart|graph|histogram|draw|scatter\s*plot|scatterplot|visuali[sz]e)")
+
+def _has(text: str, phrase: str) -> bool:
+    return re.search(r"\b" + re.escape(phrase) + r"\b", text) is not None
+
+def _pick(text: str, table: Dict[str, Tuple[str, ...]]) -> Optional[str]:
+    # Key of the earliest-mentioned phrase in `table`
+    best = None
+    for key, phrases in table.items():
+        for p in phrases:
+            m = re.search(r"\b" + re.escape(p) + r"\b", text)
+            if m and (best is None or m.start() < best[0]):
+                best = (m.start(), key)
+    return best[1] if best else None
+
+def _tokens(name: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", name.lower())
+
+def _word_matches(word: str, token: str) -> bool:
+    # "temperature" names temperature_c and "temp" names temperature; short tokens must match exactly
+    return word == token or (len(token) >= 4 and word.startswith(token)) or (len(word) >= 4 and token.startswith(word))
+
+def _py(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, pd.Timestamp):
+        return str(value.date()) if value == value.normalize() else str(value)
+    return value
+
+def _finite(value: Any) -> bool:
+    return not (isinstance(value, float) and not np.isfinite(value))
+
+class _Table:
+    """Column lookups over one dataset's shared frame; derived columns are memoized on the dataset."""
+
+    def __init__(self, ds: CsvDataset):
+        self.ds = ds
+        self.df = ds.frame
+        self._names = {str(c): c for c in self.df.columns}
+        self._tokens = {name: _tokens(name) for name in self._names}
+        self._leads = Counter(toks[0] for toks in self._tokens.values() if toks)
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._names)
+
+    def col(self, name: str) -> pd.Series:
+        return self.df[self._names[name]]
+
+    def is_numeric(self, name: str) -> bool:
+        return self.col(name).dtype.kind in "biuf"
+
+    def is_measure(self, name: str) -> bool:
+        # Identifier columns (order_id) are counted, never summed
+        toks = self._tokens[name]
+        return self.is_numeric(name) and not (toks and toks[-1] in ("id", "key", "index"))
+
+    def mentions(self, text: str) -> List[Tuple[int, str]]:
+        """(position, column) for every column named in `text`, in order; longer names win overlaps."""
+        words = [(m.start(), m.end(), m.group()) for m in re.finditer(r"[a-z0-9]+", text)]
+        hits = []
+        for name, toks in self._tokens.items():
+            n = len(toks)
+            span = next(((words[i][0], words[i + n - 1][1]) for i in range(len(words) - n + 1)
+                         if all(_word_matches(words[i + j][2], toks[j]) for j in range(n))), None) if n else None
+            if span is None and n > 1 and len(toks[0]) >= 3 and self._leads[toks[0]] == 1:
+                span = next(((s, e) for s, e, w in words if _word_matches(w, toks[0])), None)
+            if span is not None:
+                hits.append((span[0], span[1], name))
+        hits.sort(key=lambda h: (h[0], h[0] - h[1]))
+        out, taken = [], []
+        for s, e, name in hits:
+            if any(s >= ts and e <= te for ts, te in taken):
+                continue
+            taken.append((s, e))
+            out.append((s, name))
+        return out
+
+    def date_column(self) -> Optional[str]:
+        def find():
+            named = [c for c in self.columns if any(t in ("date", "time", "timestamp", "day") for t in self._tokens[c])]
+            for name in named + [c for c in self.columns if c not in named]:
+                s = self.col(name)
+                if s.dtype.kind == "M":
+                    return name
+                if s.dtype != object:
+                    continue
+                head = s.dropna().head(50)
+                if len(head) and _parse_dates(head).notna().mean() >= 0.9:
+                    return name
+            return None
+        return self.ds.memo("query:date_column", find)
+
+    def dates(self, name: str) -> pd.Series:
+        return self.ds.memo(f"query:dates:{name}", lambda: _parse_dates(self.col(name)))
+
+    def values(self) -> Dict[str, List[str]]:
+        """Distinct values of low-cardinality text columns (the ones questions filter on)."""
+        def collect():
+            out = {}
+            for name in self.columns:
+                s = self.col(name)
+                if s.dtype == object and name != self.date_column():
+                    uniq = s.dropna().unique()
+                    if len(uniq) <= FILTER_MAX_VALUES:
+                        # Dates are ranges, not labels: "after 2024-01-05" must not become an equality filter
+                        out[name] = [str(v) for v in uniq if len(str(v)) >= 2 and not DATE_LITERAL.search(str(v))]
+            return out
+        return self.ds.memo("query:values", collect)
+
+def _parse_dates(s: pd.Series) -> pd.Series:
+    if s.dtype.kind == "M":
+        return s
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return pd.to_datetime(s, errors="coerce")
+
+def _unmodeled(t: str, chart: bool) -> bool:
+    # "correlation between X and Y" names two columns, not a range
+    t = re.sub(r"\bcorrelat\w*\s+between\b", " ", t)
+    if UNMODELED_TIME.search(t) or DATE_LITERAL.search(t) or YEAR.search(_COMPARE.sub(" ", t)):
+        return True
+    if UNMODELED_MODIFIER.search(t) or (PERCENT.search(t) and _COMPARE.search(t)):
+        return True
+    # Charts group by their label column; scalar answers cannot
+    return not chart and UNMODELED_GROUPING.search(t) is not None
+
+def _filters(q: str, t: str, tab: _Table, mentions: List[Tuple[int, str]]) -> Optional[Tuple[pd.Series, List[str]]]:
+    """
+    Row mask from "<column> above 100"-style comparisons and from text values quoted in
+    the question ("in the West region"); None when a comparison names no numeric column.
+    """
+    mask = pd.Series(True, index=tab.df.index)
+    used: List[str] = []
+    ops = dict(COMPARATORS)
+    for m in _COMPARE.finditer(t):
+        before = [name for pos, name in mentions if pos < m.start() and tab.is_numeric(name)]
+        if not before:
+            return None
+        s, op, value = tab.col(before[-1]), ops[m.group(1)], float(m.group(2))
+        mask &= {">": s > value, ">=": s >= value, "<": s < value, "<=": s <= value, "==": s == value}[op]
+        used.append(before[-1])
+    for name, values in tab.values().items():
+        wanted = [v for v in values if re.search(r"(?<!\w)" + re.escape(v) + r"(?!\w)", q)]
+        if wanted:
+            mask &= tab.col(name).astype(str).isin(wanted)
+            used.append(name)
+    return mask, used
+
+def _correlation(t: str, tab: _Table, mentions: List[Tuple[int, str]]) -> Optional[float]:
+    date_col = tab.date_column()
+    part = next((p for phrase, p in DATE_PARTS if _has(t, phrase)), None)
+    series = []
+    for _, name in mentions:
+        if tab.is_numeric(name):
+            series.append(tab.col(name))
+        elif name == date_col and part:
+            series.append(getattr(tab.dates(name).dt, part))
+    if part and date_col and date_col not in [n for _, n in mentions]:
+        series.insert(0, getattr(tab.dates(date_col).dt, part))
+    if len(series) < 2:
+        return None
+    method = "spearman" if "spearman" in t else "kendall" if "kendall" in t else "pearson"
+    return float(series[0].astype(float).corr(series[1].astype(float), method=method))
+
+def _grouped(tab: _Table, mask: pd.Series, label: str, measure: Optional[str], stat: Optional[str]) -> pd.Series:
+    df = tab.df[mask]
+    keys = df[tab._names[label]]
+    if measure is None:
+        return keys.value_counts()
+    values = df[tab._names[measure]]
+    if keys.is_unique and stat is None:
+        # One row per label: rank the rows themselves
+        return pd.Series(values.to_numpy(), index=keys.to_numpy())
+    return values.groupby(keys).agg(stat or "sum")
+
+def _color(t: str) -> Optional[str]:
+    return next((c for c in COLORS if _has(t, c)), None)
+
+def _chart(t: str, tab: _Table, mentions: List[Tuple[int, str]], max_bytes: int) -> Optional[Callable[[], Any]]:
+    color = _color(t)
+    date_col = tab.date_column()
+    nums = [n for _, n in mentions if tab.is_numeric(n)]
+    labels = [n for _, n in mentions if not tab.is_numeric(n) and n != date_col]
+    if not nums:
+        all_nums = [c for c in tab.columns if tab.is_numeric(c)]
+        nums = all_nums if len(all_nums) == 1 else []
+
+    if "histogram" in t and nums:
+        col = nums[0]
+        def histogram():
+            fig, ax = new_subplots(figsize=(4, 3))
+            ax.hist(tab.col(col).dropna().to_numpy(), bins="auto", color=color, edgecolor="black", linewidth=0.5)
+            ax.set_xlabel(col)
+            ax.set_ylabel("Frequency")
+            ax.set_title(f"Distribution of {col}")
+            return png_image_under_limit(fig, max_bytes=max_bytes)
+        return histogram
+
+    if "scatter" in t and len(nums) >= 2:
+        xcol, ycol = nums[0], nums[1]
+        regression = re.search(r"\b(regression|trend|fit)", t) is not None
+        def scatter():
+            s = tab.df[[tab._names[xcol], tab._names[ycol]]].dropna()
+            x, y = s.iloc[:, 0].to_numpy(dtype=float), s.iloc[:, 1].to_numpy(dtype=float)
+            fig, ax = new_subplots(figsize=(4, 3))
+            ax.scatter(x, y, s=12, alpha=0.8, color=color)
+            if regression and len(s) >= 2:
+                coef = np.polyfit(x, y, 1)
+                xr = np.linspace(x.min(), x.max(), 100)
+                ax.plot(xr, coef[0] * xr + coef[1], color="red" if color != "red" else "black",
+                        linestyle="--", linewidth=1.5)
+            ax.set_xlabel(xcol)
+            ax.set_ylabel(ycol)
+            ax.set_title(f"{xcol} vs {ycol}")
+            return png_image_under_limit(fig, max_bytes=max_bytes)
+        return scatter
+
+    if re.search(r"\bbars?\b", t) and labels:
+        label, measure = labels[0], (nums[0] if nums else None)
+        stat = _pick(t, STATS)
+        def bars():
+            everything = pd.Series(True, index=tab.df.index)
+            totals = _grouped(tab, everything, label, measure, stat or "sum").sort_values(ascending=False, kind="stable")
+            fig, ax = new_subplots()
+            what = f"{'Average' if stat == 'mean' else 'Total'} {measure}" if measure else "Count"
+            bar_chart(ax, totals.index, totals.to_numpy(), color=color, title=f"{what} by {label}")
+            ax.set_xlabel(label)
+            ax.set_ylabel(what)
+            return png_image_under_limit(fig, max_bytes=max_bytes)
+        return bars
+
+    if re.search(r"\b(line|over time|cumulative|running total|trend)\b", t) and nums:
+        col = nums[0]
+        cumulative = re.search(r"\b(cumulative|running total)\b", t) is not None
+        def line():
+            y = tab.col(col)
+            if date_col:
+                x = tab.dates(date_col)
+                keep = x.notna() & y.notna()
+                order = np.argsort(x[keep].to_numpy(), kind="stable")
+                xs, ys = x[keep].to_numpy()[order], y[keep].to_numpy(dtype=float)[order]
+            else:
+                ys = y.dropna().to_numpy(dtype=float)
+                xs = np.arange(len(ys))
+            if cumulative:
+                ys = np.cumsum(ys)
+            fig, ax = new_subplots(figsize=(4, 3))
+            xs, ys = downsample_line(xs, ys, line_width_px(fig))
+            ax.plot(xs, ys, color=color)
+            ax.set_xlabel(date_col or "Row")
+            ax.set_ylabel(f"Cumulative {col}" if cumulative else col)
+            ax.set_title(f"{'Cumulative ' if cumulative else ''}{col} over time")
+            return png_image_under_limit(fig, max_bytes=max_bytes)
+        return line
+    return None
+
+def answer_query(q: str, tab: _Table, kind: Optional[str] = None, max_bytes: int = 100_000) -> Any:
     """
-    If questions are generic (e.g., column list, row count, simple correlations/plots),
-    answer without LLM for speed and determinism.
+    Answer one sub-question on the table: a value, a chart builder (callable) for chart
+    requests, or None when the question is not understood well enough to answer, including
+    any question qualified by period, date range, "per X", a negation or an ordinal.
+    """
+    t = q.lower()
+    chart = kind == "png" or _CHART.search(t) is not None
+    if _unmodeled(t, chart):
+        return None
+    mentions = tab.mentions(t)
+    if chart:
+        return _chart(t, tab, mentions, max_bytes) if kind in (None, "png") else None
+
+    if "correlat" in t:
+        return _correlation(t, tab, mentions)
+    if re.search(r"\b(column names|list (of )?(the )?columns|which columns)\b", t):
+        return tab.columns
+    if re.search(r"\b(row count|number of rows|how many (rows|records|entries|lines))\b", t) and not _COMPARE.search(t):
+        return int(len(tab.df))
+
+    filtered = _filters(q, t, tab, mentions)
+    if filtered is None:
+        return None
+    mask, used = filtered
+    date_col = tab.date_column()
+    stat, extreme = _pick(t, STATS), _pick(t, EXTREMES)
+    nums = [n for _, n in mentions if tab.is_measure(n) and n not in used]
+    labels = [n for _, n in mentions if not tab.is_numeric(n) and n not in used]
+    if not labels and date_col and date_col not in used and re.search(r"\b(when|what date|which date|which day)\b", t):
+        labels = [date_col]
+    measure = nums[0] if nums else None
+    # A percentage only scales a plain aggregate ("total sales tax at 10%")
+    pct = PERCENT.search(t)
+    if pct and not ((stat or extreme) and measure and not labels):
+        return None
+
+    # Top N labels
+    m = re.search(r"\btop\s+(\d+)\b", t) or re.search(r"\b(\d+)\s+(?:highest|largest|biggest|most|lowest|smallest)\b", t)
+    if m and labels and (measure or re.search(r"\b(common|frequent|most)\b", t)):
+        ranked = _grouped(tab, mask, labels[0], measure, stat).sort_values(ascending=extreme == "min", kind="stable")
+        return [_py(v) for v in ranked.index[:int(m.group(1))]]
+
+    # Which label has the highest/lowest measure (row lookup, or group totals when labels repeat)
+    names_label = labels and (re.search(r"\b(which|who|when)\b", t)
+                              or re.search(r"\bwhat\s+" + re.escape(_tokens(labels[0])[0]), t))
+    if extreme and labels and (names_label or kind == "string") and (measure or re.search(r"\b(common|frequent|most)\b", t)):
+        ranked = _grouped(tab, mask, labels[0], measure, stat)
+        if ranked.empty:
+            return None
+        return _py(ranked.idxmax() if extreme == "max" else ranked.idxmin())
+
+    if re.search(r"\b(how many|number of|count of)\b", t):
+        target = labels[0] if labels else None
+        if target and (re.search(r"\b(distinct|unique|different)\b", t) or not used):
+            return int(tab.col(target)[mask].nunique())
+        if measure:
+            # "number of units sold": the measure's total, not the rows it is spread over
+            return _py(tab.col(measure)[mask].sum())
+        return int(mask.sum())
+
+    op = stat or extreme
+    if op and measure:
+        values = tab.col(measure)[mask]
+        if stat and extreme and labels:
+            # e.g. "highest average sales of any region"
+            return _py(values.groupby(tab.col(labels[0])[mask]).agg(stat).agg(extreme))
+        result = float(getattr(values, op)())
+        if pct:
+            result *= float(pct.group(1)) / 100
+        return result
+    if not op and measure and used and mask.sum() == 1:
+        # "What were the sales of the Widget product?": a single matching row
+        return _py(tab.col(measure)[mask].iloc[0])
+    return None
+
+def parse_question(qtext: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """(key, type text) pairs of the requested output and the numbered sub-questions."""
+    keys, items = [], []
+    for line in (qtext or "").splitlines():
+        m = KEY_LINE.match(line)
+        if m:
+            keys.append((m.group(1) or m.group(2), m.group(3)))
+            continue
+        m = ITEM_LINE.match(line)
+        if m:
+            items.append(m.group(1))
+    return keys, items
+
+def _kind(type_text: str) -> str:
+    t = type_text.lower()
+    if re.search(r"\b(png|base64|image|chart|plot)\b", t):
+        return "png"
+    if re.search(r"\b(number|float|int|integer|numeric|decimal)\b", t):
+        return "number"
+    if re.search(r"\b(array|list)\b", t):
+        return "list"
+    return "string"
+
+def _max_bytes(type_text: str, default: int) -> int:
+    m = re.search(r"under\s+(\d+(?:\.\d+)?)\s*(kb|kib|k|bytes|b)\b", type_text.lower())
+    if not m:
+        return default
+    return int(float(m.group(1)) * (1000 if m.group(2) in ("kb", "k") else 1024 if m.group(2) == "kib" else 1))
+
+def _conform(value: Any, kind: Optional[str]) -> Any:
+    # The answer in the declared type, or None when it does not fit
+    if value is None or (callable(value) and kind not in (None, "png")):
+        return None
+    if kind == "png":
+        return value if callable(value) else None
+    if kind == "number":
+        return value if isinstance(value, (int, float)) and not isinstance(value, bool) and _finite(value) else None
+    if kind == "string":
+        return ", ".join(map(str, value)) if isinstance(value, list) else str(value)
+    if kind == "list":
+        return value if isinstance(value, list) else [value]
+    return value if _finite(value) else None
+
+def _pick_dataset(text: str, file_map: Dict[str, str], datasets: Dict[str, CsvDataset]) -> Optional[CsvDataset]:
+    named = [datasets[n] for n in file_map if n in datasets and n.lower() in text]
+    if len(named) == 1:
+        return named[0]
+    present = [datasets[n] for n in file_map if n in datasets]
+    return present[0] if len(present) == 1 and not named else None
+
+def maybe_answer_with_builtins(qtext: str, file_map: Dict[str, str],
+                               datasets: Optional[Dict[str, CsvDataset]] = None,
+                               output_spec: Optional[Dict[str, Any]] = None) -> Optional[Union[dict, list]]:
+    """
+    Deterministic answers for generic CSV tasks: counts, aggregates, group totals, top-N,
+    extremes with label/date lookup, correlations and bar/line/histogram/scatter charts,
+    computed on the shared frame. Every requested key (or numbered question for array
+    output) must be answered in its declared type; otherwise returns None and the
+    caller falls through to the LLM planner.
     """
     text = (qtext or "").lower()
-    wants_array = "respond with a json array" in text or "return a json array" in text
-
-    # If any CSV is present and question is generic summary
-    csv_path = None
-    for name, path in file_map.items():
-        if name.lower().endswith(".csv"):
-            csv_path = path
-            break
-    if not csv_path:
+    output_spec = output_spec or {"type": "json_object", "keys": None,
+                                  "image_constraints": {"max_png_bytes": 100_000}}
+    default_max = output_spec.get("image_constraints", {}).get("max_png_bytes", 100_000)
+
+    if datasets is None:
+        datasets = open_datasets(file_map)
+    dataset = _pick_dataset(text, file_map, datasets)
+    if dataset is None:
+        return None
+
+    keys, items = parse_question(qtext)
+    if keys:
+        if items and len(items) != len(keys):
+            return None
+        # Without numbered questions the key names are the questions (average_temp_c)
+        queries = [(name, _kind(type_text), items[i] if items else name.replace("_", " "),
+                    _max_bytes(type_text, default_max)) for i, (name, type_text) in enumerate(keys)]
+    elif items and output_spec.get("type") == "json_array":
+        queries = [(None, None, item, default_max) for item in items]
+    else:
+        return None
+    if output_spec.get("keys") and set(output_spec["keys"]) - {q[0] for q in queries}:
         return None
 
-    df = pd.read_csv(csv_path)
-    result = {
-        "columns": list(df.columns),
-        "rows": int(len(df))
-    }
-
-    # If numeric, add simple stats
-    num = df.select_dtypes(include=[np.number])
-    if not num.empty:
-        result["numeric_columns"] = list(num.columns)
-        result["means"] = {c: float(num[c].mean()) for c in num.columns}
-
-    # If question asks for correlation between two named columns
-    m = re.search(r'correlation\s+between\s+([A-Za-z0-9_]+)\s+and\s+([A-Za-z0-9_]+)', text)
-    if m and m.group(1) in df.columns and m.group(2) in df.columns:
-        s1, s2 = pd.to_numeric(df[m.group(1)], errors="coerce"), pd.to_numeric(df[m.group(2)], errors="coerce")
-        corr = float(s1.corr(s2))
-        result["correlation"] = corr
-
-    # If question asks for a simple scatter with regression
-    if "scatterplot" in text and len(num.columns) >= 2:
-        xcol = num.columns[0]
-        ycol = num.columns[1]
-        s = df.dropna(subset=[xcol, ycol])
-        fig, ax = plt.subplots(figsize=(4,3))
-        ax.scatter(s[xcol], s[ycol], s=12, alpha=0.8)
-        # regression
-        if len(s) >= 2:
-            coef = np.polyfit(s[xcol], s[ycol], 1)
-            xr = np.linspace(s[xcol].min(), s[xcol].max(), 100)
-            yr = coef[0]*xr + coef[1]
-            ax.plot(xr, yr, 'r--', linewidth=1.5)
-        ax.set_xlabel(str(xcol))
-        ax.set_ylabel(str(ycol))
-        ax.set_title(f"{xcol} vs {ycol}")
-        b64 = fig_to_base64_under_limit(fig, max_bytes=100_000, start_dpi=110)
-        result["scatter_plot"] = b64
-
-    if wants_array:
-        return [result]
+    tab = _Table(dataset)
+    answers: List[Any] = []
+    for _, kind, q, max_bytes in queries:
+        value = _conform(answer_query(q, tab, kind, max_bytes), kind)
+        if value is None:
+            return None
+        answers.append(value)
+
+    # Render the charts together, like the analyzers do
+    charts = render_charts({str(i): v for i, v in enumerate(answers) if callable(v)})
+    answers = [charts[str(i)] if callable(v) else v for i, v in enumerate(answers)]
+
+    if keys:
+        result: Union[dict, list] = {name: value for (name, *_), value in zip(queries, answers)}
+    else:
+        result = [", ".join(map(str, v)) if isinstance(v, list) else str(v) for v in answers]
+    try:
+        validate_final_output_schema(result, output_spec)
+    except ValidationError:
+        return None
     return result
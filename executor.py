@@ -1,47 +1,61 @@
-import asyncio, base64, io
-from typing import Dict, Any, List
-
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-
-def png_base64(fig, max_bytes=100_000, start_dpi=110):
-    for dpi in [start_dpi, 100, 90, 80, 70, 60, 50]:
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight", pad_inches=0.1,
-                    metadata={"Software": "matplotlib"})
-        data = buf.getvalue()
-        if len(data) <= max_bytes:
-            plt.close(fig)
-            return base64.b64encode(data).decode("ascii")
-    plt.close(fig)
-    return base64.b64encode(data).decode("ascii")
-
-def assert_image_under_limit(b64_str: str, max_bytes: int):
-    raw = base64.b64decode(b64_str, validate=True)
-    if len(raw) > max_bytes:
+import hashlib
+from collections import OrderedDict
+from types import CodeType
+from typing import Dict, Any, List, Union
+
+from sandbox import get_sandbox_pool
+from images import PngImage, base64_decoded_size
+
+def png_image(fig, max_bytes=100_000, start_dpi=110) -> PngImage:
+    # Imported here so the API process doesn't load matplotlib just to reach run_code_steps.
+    # Returns raw bytes; they become base64 when the response is serialized (or formatted as str)
+    from plot_utils import png_image_under_limit
+    return png_image_under_limit(fig, max_bytes=max_bytes, start_dpi=start_dpi)
+
+def png_base64(fig, max_bytes=100_000, start_dpi=110) -> str:
+    # Base64 text, as its name says: plans concatenate it ("data:image/png;base64," + b64)
+    return png_image(fig, max_bytes=max_bytes, start_dpi=start_dpi).to_base64()
+
+def assert_image_under_limit(image: Union[PngImage, str], max_bytes: int):
+    size = len(image) if isinstance(image, bytes) else base64_decoded_size(image)
+    if size > max_bytes:
         raise RuntimeError(f"Image exceeds {max_bytes} bytes")
 
-async def run_code_steps(plan: List[Dict[str, Any]], context: Dict[str, Any], timeout_sec: int = 120) -> Any:
+# Compiled plan steps by source hash; sandbox workers are long-lived, so cached and
+# retried plans skip compilation
+CODE_CACHE_ENTRIES = 256
+_code_cache: "OrderedDict[str, CodeType]" = OrderedDict()
+
+def compile_step(source: str, index: int = 0) -> CodeType:
+    key = hashlib.sha256(source.encode("utf-8")).hexdigest()
+    code = _code_cache.get(key)
+    if code is None:
+        code = compile(source, f"<plan step {index}>", "exec")
+        _code_cache[key] = code
+        if len(_code_cache) > CODE_CACHE_ENTRIES:
+            _code_cache.popitem(last=False)
+    else:
+        _code_cache.move_to_end(key)
+    return code
+
+def exec_plan(plan: List[Dict[str, Any]], context: Dict[str, Any]) -> Any:
+    """Run plan steps in one shared namespace. Called inside a sandbox worker process."""
     env_globals = {
         "__builtins__": __builtins__,
         "context": context,
+        "png_image": png_image,
         "png_base64": png_base64,
         "assert_image_under_limit": assert_image_under_limit,
     }
-    env_locals: Dict[str, Any] = {}
-    RESULT = None
-
-    async def _exec_all():
-        nonlocal RESULT
-        for step in plan:
-            if step.get("type") != "python":
-                continue
-            code = step.get("code", "")
-            exec(code, env_globals, env_locals)
-        RESULT = env_locals.get("RESULT", None)
-
-    await asyncio.wait_for(_exec_all(), timeout=timeout_sec)
+    for i, step in enumerate(plan):
+        if step.get("type") != "python":
+            continue
+        exec(compile_step(step.get("code", ""), i), env_globals)
+    RESULT = env_globals.get("RESULT", None)
     if RESULT is None:
         raise RuntimeError("No RESULT produced by plan")
     return RESULT
+
+async def run_code_steps(plan: List[Dict[str, Any]], context: Dict[str, Any], timeout_sec: int = 120) -> Any:
+    # exec() never yields, so the timeout is enforced by killing the sandbox worker
+    return await get_sandbox_pool().run(plan, context, timeout_sec)
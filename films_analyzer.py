@@ -1,47 +1,160 @@
-import io, base64
+import io, os, json, time, hashlib, logging, threading
+from typing import Optional
+import lxml.html
+import requests
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from plot_utils import new_subplots, png_base64_under_limit
+from io_utils import private_dir, user_temp_path
 
 WIKI_URL = "https://en.wikipedia.org/wiki/List_of_highest-grossing_films"
+USER_AGENT = "tds-data-analyst-agent/1.0"
+FILMS_FETCH_TIMEOUT = 30
 
-def _fetch_table():
-    # Simple robust read of the page’s tables; pick the one with Rank and Peak
-    dfs = pd.read_html(WIKI_URL)
-    target = None
-    for df in dfs:
-        cols = [str(c).strip().lower() for c in df.columns]
-        if "rank" in cols and "peak" in cols:
-            target = df
-            break
-    if target is None:
-        for df in dfs:
-            cols = [str(c).strip().lower() for c in df.columns]
-            if "rank" in cols:
-                target = df
-                break
+# Fetched page is cached on disk (private to this user) and revalidated after the TTL
+FILMS_CACHE_DIR = os.getenv("FILMS_CACHE_DIR", user_temp_path("films"))
+FILMS_CACHE_TTL = int(os.getenv("FILMS_CACHE_TTL", str(24 * 3600)))
+# Saved copy of the page used to seed an empty cache (offline machines)
+FILMS_FIXTURE = os.getenv("FILMS_FIXTURE", "")
+
+logger = logging.getLogger(__name__)
+_cache_lock = threading.Lock()
+_memo: dict = {}
+
+def _header_cells(table) -> list:
+    row = table.find(".//tr")
+    if row is None:
+        return []
+    return [" ".join(c.text_content().split()).lower() for c in row.findall("th")]
+
+def _find_table(doc):
+    # Stops at the first Rank/Peak table; the first Rank table, then the first table, are fallbacks
+    first = ranked = None
+    for table in doc.iterfind(".//table"):
+        header = _header_cells(table)
+        if "rank" in header and "peak" in header:
+            return table
+        if first is None:
+            first = table
+        if ranked is None and "rank" in header:
+            ranked = table
+    return ranked if ranked is not None else first
+
+def _extract_table(html: bytes) -> pd.DataFrame:
+    # Only the chosen table is handed to read_html; the page's other tables are never built
+    target = _find_table(lxml.html.fromstring(html))
     if target is None:
-        target = dfs[0]
-    return target
+        raise ValueError("No tables found in films page")
+    return pd.read_html(io.StringIO(lxml.html.tostring(target, encoding="unicode")))[0]
+
+def _cache_dir() -> Optional[str]:
+    if not FILMS_CACHE_DIR:
+        return None
+    try:
+        return private_dir(FILMS_CACHE_DIR)
+    except OSError as e:
+        logger.warning("Films page not cached: %s", e)
+        return None
+
+def _cache_paths():
+    return (os.path.join(FILMS_CACHE_DIR, "page.html"),
+            os.path.join(FILMS_CACHE_DIR, "page.json"))
+
+def _read_meta() -> dict:
+    if _cache_dir() is None:
+        return {}
+    try:
+        with open(_cache_paths()[1], "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _store_page(html: bytes, meta: dict) -> pd.DataFrame:
+    page_path, meta_path = _cache_paths()
+    table = _extract_table(html)
+    digest = hashlib.sha256(html).hexdigest()
+    if _cache_dir() is not None:
+        _write_atomic(page_path, html)
+        meta = dict(meta, sha256=digest, fetched_at=time.time())
+        _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+    _memo.update(sha256=digest, table=table)
+    return table
+
+def _load_cached_table(meta: dict) -> Optional[pd.DataFrame]:
+    digest = meta.get("sha256")
+    if not digest:
+        return None
+    if _memo.get("sha256") == digest:
+        return _memo["table"]
+    # Only the page is stored; the table is re-extracted once per process
+    try:
+        with open(_cache_paths()[0], "rb") as f:
+            html = f.read()
+        if hashlib.sha256(html).hexdigest() != digest:
+            return None
+        table = _extract_table(html)
+    except Exception:
+        return None
+    _memo.update(sha256=digest, table=table)
+    return table
+
+def seed_films_cache(fixture_path: str) -> pd.DataFrame:
+    """Populate the cache from a saved copy of the Wikipedia page, e.g. on machines without network."""
+    with open(fixture_path, "rb") as f:
+        html = f.read()
+    return _store_page(html, {"source": os.path.abspath(fixture_path)})
+
+def _fetch_table() -> pd.DataFrame:
+    with _cache_lock:
+        meta = _read_meta()
+        cached = _load_cached_table(meta)
+        if cached is not None and time.time() - meta.get("fetched_at", 0) < FILMS_CACHE_TTL:
+            return cached
+        if cached is None and FILMS_FIXTURE:
+            return seed_films_cache(FILMS_FIXTURE)
+
+        # Revalidate: a 304 keeps the cached table and only refreshes its timestamp
+        headers = {"User-Agent": USER_AGENT}
+        if cached is not None and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if cached is not None and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            resp = requests.get(WIKI_URL, headers=headers, timeout=FILMS_FETCH_TIMEOUT)
+        except requests.RequestException:
+            if cached is not None:
+                return cached  # serve stale rather than fail while offline
+            raise
+        if resp.status_code == 304 and cached is not None:
+            meta["fetched_at"] = time.time()
+            _write_atomic(_cache_paths()[1], json.dumps(meta).encode("utf-8"))
+            return cached
+        if resp.status_code != 200 and cached is not None:
+            return cached
+        resp.raise_for_status()
+        return _store_page(resp.content, {"etag": resp.headers.get("ETag"),
+                                          "last_modified": resp.headers.get("Last-Modified")})
 
 def _clean_numeric(series):
     return pd.to_numeric(series.astype(str).str.replace(r"[^0-9.\-]", "", regex=True), errors="coerce")
 
-def _png_base64(fig, max_bytes=100_000):
-    for dpi in [110, 100, 90, 80, 70, 60, 50]:
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight", pad_inches=0.1, metadata={"Software":"matplotlib"})
-        b = buf.getvalue()
-        if len(b) <= max_bytes:
-            plt.close(fig)
-            return base64.b64encode(b).decode("ascii")
-    plt.close(fig)
-    return base64.b64encode(b).decode("ascii")
-
 def handle_films_task() -> list[str]:
-    df = _fetch_table()
+    table = _fetch_table()
+    # Answers depend only on the cached table, so repeat questions skip the chart render too
+    answers = _memo.get("answers")
+    if answers is not None and answers[0] is table:
+        return list(answers[1])
+    result = _answer_films(table.copy())
+    _memo["answers"] = (table, result)
+    return list(result)
+
+def _answer_films(df: pd.DataFrame) -> list[str]:
     df.columns = [str(c).strip() for c in df.columns]
 
     def find_col(options):
@@ -95,7 +208,7 @@ def handle_films_task() -> list[str]:
         x = sub[col_rank].astype(float).values
         y = sub[col_peak].astype(float).values
         if len(x) >= 2:
-            fig, ax = plt.subplots(figsize=(4,3))
+            fig, ax = new_subplots(figsize=(4,3))
             ax.scatter(x, y, s=14, alpha=0.9)
             b, a = np.polyfit(x, y, 1)
             xs = np.linspace(float(np.min(x)), float(np.max(x)), 200)
@@ -103,7 +216,7 @@ def handle_films_task() -> list[str]:
             ax.set_xlabel("Rank")
             ax.set_ylabel("Peak")
             ax.set_title("Rank vs Peak")
-            b64 = _png_base64(fig, max_bytes=100_000)
+            b64 = png_base64_under_limit(fig, max_bytes=100_000)
             a4 = f"data:image/png;base64,{b64}"
 
     return [a1, a2, a3, a4]
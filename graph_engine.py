@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+from typing import Any, Optional
+
+def _sorted_unique(a: np.ndarray) -> np.ndarray:
+    # Sort + adjacent compare; cheaper than np.unique's hashing path for int64 keys
+    if len(a) == 0:
+        return a
+    a = np.sort(a)
+    return a[np.concatenate(([True], a[1:] != a[:-1]))]
+
+class CSRGraph:
+    """
+    Undirected simple graph stored as NumPy CSR adjacency. Node labels are factorized
+    in first-seen order, which matches networkx insertion order, so ties (e.g. the
+    max-degree node) resolve the same way as nx.Graph.
+    """
+
+    def __init__(self, labels: np.ndarray, indptr: np.ndarray, indices: np.ndarray,
+                 degrees: np.ndarray, edge_count: int):
+        self.labels = labels
+        self.indptr = indptr
+        self.indices = indices
+        self.degrees = degrees
+        self.edge_count = edge_count
+
+    @classmethod
+    def from_edges(cls, u, v) -> "CSRGraph":
+        u = np.asarray(u)
+        v = np.asarray(v)
+        pairs = np.empty(2 * len(u), dtype=np.result_type(u, v) if u.dtype == v.dtype else object)
+        pairs[0::2] = u
+        pairs[1::2] = v
+        codes, labels = pd.factorize(pairs, use_na_sentinel=False)
+        n = len(labels)
+        a, b = codes[0::2].astype(np.int64), codes[1::2].astype(np.int64)
+        lo, hi = np.minimum(a, b), np.maximum(a, b)
+        # Collapse duplicate and reversed edges, as nx.Graph does
+        keys = _sorted_unique(lo * max(n, 1) + hi)
+        lo, hi = keys // max(n, 1), keys % max(n, 1)
+
+        # A self-loop adds 2 to its node's degree (networkx convention)
+        degrees = np.bincount(lo, minlength=n) + np.bincount(hi, minlength=n)
+        loop = lo == hi
+        src = np.concatenate([lo, hi[~loop]])
+        dst = np.concatenate([hi, lo[~loop]])
+        order = np.argsort(src, kind="stable")
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        return cls(np.asarray(labels, dtype=object), indptr, dst[order], degrees, int(len(keys)))
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "CSRGraph":
+        return cls.from_edges(df.iloc[:, 0].to_numpy(), df.iloc[:, 1].to_numpy())
+
+    @property
+    def node_count(self) -> int:
+        return len(self.labels)
+
+    def density(self) -> float:
+        n = self.node_count
+        if n <= 1:
+            return 0.0
+        return float(2 * self.edge_count / (n * (n - 1)))
+
+    def average_degree(self) -> float:
+        return float(self.degrees.mean()) if self.node_count else 0.0
+
+    def max_degree_node(self) -> Any:
+        return self.labels[int(np.argmax(self.degrees))] if self.node_count else ""
+
+    def find_node_ci(self, name: str) -> Optional[int]:
+        """Index of the node whose label lower-cases to `name` (last one wins, like a dict build)."""
+        try:
+            lowered = pd.Series(self.labels, dtype=object).str.lower().to_numpy()
+        except AttributeError:  # no string labels at all
+            return None
+        hits = np.flatnonzero(lowered == name.lower())
+        return int(hits[-1]) if len(hits) else None
+
+    def shortest_path_length(self, src: Optional[int], tgt: Optional[int]) -> int:
+        """Hop count by frontier-at-a-time BFS; -1 when either node is missing or unreachable."""
+        if src is None or tgt is None:
+            return -1
+        if src == tgt:
+            return 0
+        visited = np.zeros(self.node_count, dtype=bool)
+        visited[src] = True
+        frontier = np.array([src], dtype=np.int64)
+        dist = 0
+        while frontier.size:
+            dist += 1
+            starts = self.indptr[frontier]
+            lengths = self.indptr[frontier + 1] - starts
+            total = int(lengths.sum())
+            if total == 0:
+                break
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            nbrs = self.indices[offsets + np.arange(total)]
+            nbrs = nbrs[~visited[nbrs]]
+            if (nbrs == tgt).any():
+                return dist
+            frontier = _sorted_unique(nbrs)
+            visited[frontier] = True
+        return -1
+
+    def top_degree_subgraph_edges(self, max_nodes: int):
+        """Nodes with the highest degree (up to `max_nodes`) and the edges among them, as labels."""
+        if self.node_count <= max_nodes:
+            keep = np.arange(self.node_count)
+        else:
+            keep = np.sort(np.argsort(-self.degrees, kind="stable")[:max_nodes])
+        mask = np.zeros(self.node_count, dtype=bool)
+        mask[keep] = True
+        src = np.repeat(np.arange(self.node_count), np.diff(self.indptr))
+        sel = mask[src] & mask[self.indices] & (src <= self.indices)
+        return (self.labels[keep].tolist(),
+                list(zip(self.labels[src[sel]].tolist(), self.labels[self.indices[sel]].tolist())))
@@ -0,0 +1,36 @@
+import base64
+
+class PngImage(bytes):
+    """
+    Raw PNG bytes produced by the chart encoders. Size checks read len() directly;
+    base64 text is produced once, when the response is serialized (or when the image
+    is formatted into a string, e.g. f"data:image/png;base64,{img}").
+    """
+
+    @property
+    def nbytes(self) -> int:
+        return len(self)
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self).decode("ascii")
+
+    def data_uri(self) -> str:
+        return "data:image/png;base64," + self.to_base64()
+
+    def __str__(self) -> str:
+        return self.to_base64()
+
+    def __format__(self, spec: str) -> str:
+        return format(self.to_base64(), spec)
+
+    def __repr__(self) -> str:
+        return f"<PngImage {len(self)} bytes>"
+
+    def __reduce__(self):
+        # Crosses process pools and the sandbox pipe as plain bytes
+        return (PngImage, (bytes(self),))
+
+def base64_decoded_size(b64: str) -> int:
+    """Byte length a base64 string decodes to, computed from its length and padding."""
+    n = len(b64)
+    return n * 3 // 4 - (2 if b64.endswith("==") else 1 if b64.endswith("=") else 0)
@@ -1,8 +1,225 @@
-import pandas as pd
-from typing import Dict
+import os
+import csv
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from lazy_imports import LazyModule
 
-def load_first_csv(file_map: Dict[str, str]):
-    for name, path in file_map.items():
-        if name.lower().endswith(".csv"):
-            return pd.read_csv(path)
+# Routing only needs the csv module until a header sample is actually parsed
+pd = LazyModule("pandas")
+
+SNIFF_BYTES = 64 * 1024
+SNIFF_ROWS = 50
+SNIFF_DELIMITERS = ",;\t|"
+_UNSET = object()
+
+class FrameCache:
+    """
+    Parsed frames keyed by upload content hash, bounded by their in-memory size (LRU).
+    Callers get shallow copies; with pandas copy-on-write enabled, edits to a copy never
+    reach the cached frame.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._frames: "OrderedDict[str, Tuple[pd.DataFrame, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> "Optional[pd.DataFrame]":
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                return None
+            self._frames.move_to_end(key)
+            return entry[0].copy(deep=False)
+
+    def put(self, key: str, frame: "pd.DataFrame"):
+        size = int(frame.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._frames:
+                return
+            self._frames[key] = (frame, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, old) = self._frames.popitem(last=False)
+                self._bytes -= old
+
+# Off by default; long-lived processes that see the same uploads repeatedly (sandbox workers) enable it
+_shared_frames: Optional[FrameCache] = None
+
+def enable_shared_frames(max_bytes: int):
+    global _shared_frames
+    if max_bytes > 0:
+        _shared_frames = FrameCache(max_bytes)
+
+class CsvDataset:
+    """
+    Per-request handle on an uploaded CSV. The header, dtypes and delimiter are
+    sniffed once from a small sample; the full frame is parsed lazily, at most once,
+    and shared by the router, analyzers, csv_tools and the executor context.
+    """
+
+    def __init__(self, name: str, path: str, content_hash: Optional[str] = None):
+        self.name = name
+        self.path = path
+        self.content_hash = content_hash
+        self._delimiter: Optional[str] = None
+        self._sample: "Optional[pd.DataFrame]" = None
+        self._frame: "Optional[pd.DataFrame]" = None
+        self._lock = threading.Lock()
+        self._memo: Dict[str, list] = {}
+
+    def __repr__(self):
+        return f"CsvDataset({self.name!r}, {self.path!r})"
+
+    def __getstate__(self):
+        # Ship only the sniffed metadata to other processes; the frame reloads lazily there.
+        state = self.__dict__.copy()
+        state["_frame"] = None
+        state["_memo"] = {}
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @property
+    def delimiter(self) -> str:
+        if self._delimiter is None:
+            self._delimiter = _sniff_delimiter(self.path)
+        return self._delimiter
+
+    @property
+    def sample(self) -> "pd.DataFrame":
+        if self._sample is None:
+            if self._frame is not None:
+                self._sample = self._frame.head(SNIFF_ROWS)
+            else:
+                try:
+                    self._sample = pd.read_csv(self.path, sep=self.delimiter, nrows=SNIFF_ROWS)
+                except Exception:
+                    self._sample = pd.DataFrame()
+        return self._sample
+
+    @property
+    def columns(self) -> List[str]:
+        return [str(c) for c in self.sample.columns]
+
+    @property
+    def columns_lower(self) -> List[str]:
+        return [c.lower() for c in self.columns]
+
+    @property
+    def dtypes(self) -> "pd.Series":
+        return self.sample.dtypes
+
+    @property
+    def loaded(self) -> bool:
+        return self._frame is not None
+
+    @property
+    def cached(self) -> bool:
+        """Parsed frame available without tokenizing the CSV (in memory or in the columnar cache)."""
+        if self._frame is not None:
+            return True
+        import columnar_cache
+        return columnar_cache.has_frame(self.content_hash)
+
+    @property
+    def frame(self) -> "pd.DataFrame":
+        """Full parsed frame. Callers must not mutate it in place."""
+        if self._frame is None:
+            with self._lock:
+                if self._frame is None:
+                    self._frame = self._load_frame()
+        return self._frame
+
+    def memo(self, key: str, compute: Callable[[], Any]) -> Any:
+        """
+        Result of `compute()` for this dataset, computed at most once: later questions over
+        the same upload (e.g. a batch) reuse analyzer intermediates such as group totals.
+        Concurrent callers of one key wait for the first. The result is shared: do not mutate.
+        """
+        with self._lock:
+            entry = self._memo.get(key)
+            if entry is None:
+                entry = self._memo[key] = [threading.Lock(), _UNSET]
+        with entry[0]:
+            if entry[1] is _UNSET:
+                entry[1] = compute()
+        return entry[1]
+
+    def _load_frame(self) -> "pd.DataFrame":
+        shared = _shared_frames if self.content_hash else None
+        if shared is not None:
+            frame = shared.get(self.content_hash)
+            if frame is not None:
+                return frame
+        import columnar_cache
+        # Same bytes seen before: memory-map the columnar copy instead of re-tokenizing
+        frame = columnar_cache.load_frame(self.content_hash)
+        if frame is None:
+            frame = pd.read_csv(self.path, sep=self.delimiter)
+            columnar_cache.store_frame_async(self.content_hash, frame, self.path)
+        if shared is not None:
+            shared.put(self.content_hash, frame)
+            return frame.copy(deep=False)
+        return frame
+
+def _sniff_delimiter(path: str) -> str:
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_BYTES).decode("utf-8", errors="ignore")
+    except OSError:
+        return ","
+    first_line = head.split("\n", 1)[0]
+    try:
+        delim = csv.Sniffer().sniff(head, delimiters=SNIFF_DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+    # The sniffer can latch onto a character that only appears in the data rows
+    if delim not in first_line or first_line.count(",") >= first_line.count(delim):
+        return ","
+    return delim
+
+def open_datasets(file_map: Dict[str, str], file_hashes: Optional[Dict[str, str]] = None) -> Dict[str, CsvDataset]:
+    file_hashes = file_hashes or {}
+    return {name: CsvDataset(name, path, file_hashes.get(name)) for name, path in file_map.items()
+            if name.lower().endswith(".csv")}
+
+def as_dataset(source: Union[str, CsvDataset]) -> CsvDataset:
+    if isinstance(source, CsvDataset):
+        return source
+    return CsvDataset(str(source).replace("\\", "/").rsplit("/", 1)[-1], source)
+
+def load_first_csv(file_map: Dict[str, str], datasets: Optional[Dict[str, CsvDataset]] = None):
+    datasets = datasets if datasets is not None else open_datasets(file_map)
+    for name in file_map:
+        if name in datasets:
+            return datasets[name].frame
     return None
+
+def user_temp_path(name: str) -> str:
+    """Default location of a per-user cache or store: <tmp>/llm_daa_<name>-<uid>."""
+    uid = os.geteuid() if hasattr(os, "geteuid") else 0
+    return os.path.join(tempfile.gettempdir(), f"llm_daa_{name}-{uid}")
+
+def private_dir(path: str) -> str:
+    """
+    Create `path` with mode 0700 if missing and check that it is a real directory owned by
+    this user that nobody else can write to; PermissionError otherwise. Plans read from a
+    cache are executed and stored results are served back, so a directory planted in a
+    shared location must not be used.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    owner = os.geteuid() if hasattr(os, "geteuid") else st.st_uid
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != owner or st.st_mode & 0o022:
+        raise PermissionError(f"{path} is not a private directory of this user")
+    return path
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional
+
+from io_utils import private_dir, user_temp_path
+from metrics import RequestTimer
+from pipeline import answer_question, http_error, open_uploads
+from scratch import get_scratch_space, pid_alive
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "32"))
+# Finished jobs (and their results) are kept this long
+JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+# Shared by every server process of this user, so any of them can answer status polls; the
+# directory holding it must be private (job rows carry questions and results)
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(user_temp_path("jobs"), "jobs.sqlite3"))
+JOB_RETRY_AFTER = int(os.getenv("JOB_RETRY_AFTER", "5"))
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(RuntimeError):
+    pass
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    owner_pid INTEGER,
+    question TEXT,
+    files TEXT,
+    tempdir TEXT,
+    created REAL,
+    started REAL,
+    finished REAL,
+    route TEXT,
+    http_status INTEGER,
+    detail TEXT,
+    result BLOB
+)
+"""
+
+class JobStore:
+    """
+    Job rows in a local SQLite file: inputs while queued, status while running, the body when done.
+    Calls block (up to the 30s busy timeout), so async code runs them via asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = JOB_DB_PATH):
+        self.path = path
+        private_dir(os.path.dirname(os.path.abspath(path)))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+
+    def _exec(self, sql: str, args=()) -> List[tuple]:
+        # Rows are fetched while the lock is held; the connection is shared across threads
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    def _one(self, sql: str, args=()) -> Optional[tuple]:
+        rows = self._exec(sql, args)
+        return rows[0] if rows else None
+
+    def create(self, question: str, file_map: Dict[str, str], file_hashes: Dict[str, str], tempdir: str) -> str:
+        job_id = uuid.uuid4().hex
+        files = json.dumps({"paths": file_map, "hashes": file_hashes})
+        self._exec("INSERT INTO jobs (id, status, owner_pid, question, files, tempdir, created) VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                   (job_id, os.getpid(), question, files, tempdir, time.time()))
+        return job_id
+
+    def inputs(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._one("SELECT question, files, tempdir FROM jobs WHERE id = ?", (job_id,))
+        if row is None:
+            return None
+        files = json.loads(row[1])
+        return {"question": row[0], "file_map": files["paths"], "file_hashes": files["hashes"], "tempdir": row[2]}
+
+    def mark_running(self, job_id: str):
+        self._exec("UPDATE jobs SET status = 'running', started = ?, owner_pid = ? WHERE id = ?",
+                   (time.time(), os.getpid(), job_id))
+
+    def finish(self, job_id: str, route: str, http_status: int, result: Optional[bytes] = None, detail: Optional[str] = None):
+        status = "done" if http_status == 200 else "failed"
+        # Inputs are dropped once the job has run; only the outcome is kept
+        self._exec("UPDATE jobs SET status = ?, finished = ?, route = ?, http_status = ?, result = ?, detail = ?, "
+                   "question = NULL, files = NULL WHERE id = ?",
+                   (status, time.time(), route, http_status, result, detail, job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._one("SELECT id, status, created, started, finished, route, http_status, detail, result "
+                        "FROM jobs WHERE id = ?", (job_id,))
+        if row is None:
+            return None
+        keys = ("job_id", "status", "created", "started", "finished", "route", "http_status", "detail", "result")
+        return dict(zip(keys, row))
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self._exec("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+
+    def purge_expired(self, ttl: int = JOB_RESULT_TTL) -> List[str]:
+        """Delete finished jobs older than `ttl`; returns their scratch directories."""
+        cutoff = time.time() - ttl
+        rows = self._exec("SELECT id, tempdir FROM jobs WHERE status IN ('done', 'failed') AND finished < ?",
+                          (cutoff,))
+        if rows:
+            self._exec(f"DELETE FROM jobs WHERE id IN ({','.join('?' * len(rows))})", [r[0] for r in rows])
+        return [r[1] for r in rows if r[1]]
+
+    def orphans(self) -> List[Dict[str, Any]]:
+        """Unfinished jobs whose owning process is gone (e.g. a restart)."""
+        rows = self._exec("SELECT id, status, owner_pid FROM jobs WHERE status IN ('queued', 'running')")
+        return [{"id": r[0], "status": r[1]} for r in rows if not pid_alive(r[2])]
+
+    def live_tempdirs(self) -> List[str]:
+        rows = self._exec("SELECT tempdir FROM jobs WHERE status IN ('queued', 'running')")
+        return [r[0] for r in rows if r[0]]
+
+    def adopt(self, job_id: str):
+        self._exec("UPDATE jobs SET owner_pid = ?, status = 'queued' WHERE id = ?", (os.getpid(), job_id))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class JobQueue:
+    """
+    Bounded in-process queue of job ids served by a fixed set of asyncio workers.
+    Submitting to a full queue raises QueueFull; the caller answers 503.
+    """
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS, maxsize: int = JOB_QUEUE_SIZE):
+        self.store = store
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        # Submissions whose row is being written; they hold a queue slot meanwhile
+        self._submitting = 0
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._janitor()))
+        await self._recover()
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, question: str, file_map: Dict[str, str], file_hashes: Dict[str, str], tempdir: str) -> str:
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        if self.maxsize > 0 and self._queue.qsize() + self._submitting >= self.maxsize:
+            raise QueueFull(f"Job queue is full ({self.maxsize} waiting)")
+        self._submitting += 1
+        try:
+            job_id = await asyncio.to_thread(self.store.create, question, file_map, file_hashes, tempdir)
+        finally:
+            self._submitting -= 1
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _claim_orphans(self) -> List[str]:
+        # Queued jobs of a dead process are re-run while their uploads still exist; a job that
+        # was mid-run when its process died is failed rather than retried (it may be the cause)
+        adopted = []
+        for job in self.store.orphans():
+            inputs = self.store.inputs(job["id"])
+            if job["status"] == "running" or not inputs or not all(os.path.exists(p) for p in inputs["file_map"].values()):
+                self.store.finish(job["id"], "unknown", 500, detail="Job was interrupted by a server restart")
+            elif self.maxsize <= 0 or len(adopted) < self.maxsize:
+                self.store.adopt(job["id"])
+                adopted.append(job["id"])
+        return adopted
+
+    async def _recover(self):
+        # Runs at start, before anything else is queued
+        for job_id in await asyncio.to_thread(self._claim_orphans):
+            self._queue.put_nowait(job_id)
+
+    async def _worker(self, n: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        inputs = await asyncio.to_thread(self.store.inputs, job_id)
+        if inputs is None:
+            return
+        await asyncio.to_thread(self.store.mark_running, job_id)
+        timer = RequestTimer()
+        try:
+            uploads = open_uploads(inputs["tempdir"], inputs["file_map"], inputs["file_hashes"])
+            # Job workers are already bounded; they wait for a route slot instead of being shed
+            answer = await answer_question(inputs["question"], uploads, timer, shed=False)
+            await asyncio.to_thread(self.store.finish, job_id, answer.route, 200, result=answer.body)
+        except Exception as e:
+            err = http_error(e)
+            await asyncio.to_thread(self.store.finish, job_id, timer.route, err.status_code, detail=str(err.detail))
+        finally:
+            timer.finish()
+            # The outcome is stored; the uploads are no longer needed
+            get_scratch_space().release(inputs["tempdir"])
+
+    async def _janitor(self):
+        while True:
+            await asyncio.sleep(max(1, min(60, JOB_RESULT_TTL)))
+            try:
+                for tempdir in await asyncio.to_thread(self.store.purge_expired):
+                    get_scratch_space().release(tempdir)
+            except sqlite3.Error as e:
+                logger.warning("Job purge failed: %s", e)
+
+_job_queue: Optional[JobQueue] = None
+
+def get_job_queue() -> JobQueue:
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(JobStore())
+    return _job_queue
+
+async def shutdown_job_queue():
+    global _job_queue
+    if _job_queue is not None:
+        await _job_queue.stop()
+        _job_queue.store.close()
+        _job_queue = None
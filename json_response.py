@@ -0,0 +1,34 @@
+import json
+import math
+from typing import Any
+from images import PngImage
+
+try:
+    import orjson
+except ImportError:  # plain json fallback
+    orjson = None
+
+def _finite(obj: Any) -> Any:
+    # orjson writes NaN and +/-Infinity as null; the fallback must produce the same body
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {k: _finite(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(v) for v in obj]
+    return obj
+
+def _default(obj: Any):
+    if isinstance(obj, PngImage):
+        return obj.to_base64()
+    if hasattr(obj, "tolist") and hasattr(obj, "dtype"):  # numpy scalars and arrays (json fallback)
+        return _finite(obj.tolist())
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """Response JSON via orjson when installed; PngImage values become base64 here, once."""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default,
+                            option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_finite(content), default=_default, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
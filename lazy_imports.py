@@ -0,0 +1,34 @@
+import sys
+import time
+import types
+import importlib
+import threading
+from typing import Dict
+
+# Seconds spent importing each module through timed_import, in first-import order.
+# Modules already loaded by an earlier entry are attributed to that entry.
+_import_times: Dict[str, float] = {}
+_lock = threading.RLock()
+
+def timed_import(name: str) -> types.ModuleType:
+    mod = sys.modules.get(name)
+    if mod is not None:
+        return mod
+    with _lock:
+        start = time.perf_counter()
+        mod = importlib.import_module(name)
+        _import_times.setdefault(name, time.perf_counter() - start)
+    return mod
+
+def import_times() -> Dict[str, float]:
+    with _lock:
+        return {name: round(sec, 4) for name, sec in _import_times.items()}
+
+class LazyModule(types.ModuleType):
+    """Module placeholder that performs the real import on first attribute access."""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+
+    def __getattr__(self, attr):
+        return getattr(timed_import(self.__name__), attr)
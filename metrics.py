@@ -0,0 +1,214 @@
+import os
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+# Add a Server-Timing header with per-stage milliseconds to /api/ responses
+TIMING_HEADER = os.getenv("METRICS_TIMING_HEADER", "0").lower() in ("1", "true", "yes")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(key)} {value:g}")
+        return lines
+
+class Gauge:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(key)} {value:g}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        # label key -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = f'le="{bound:g}"'
+                    lines.append(f"{self.name}_bucket{_labels(key, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(key, le)} {series[-2]}")
+                lines.append(f"{self.name}_sum{_labels(key)} {series[-1]:.6f}")
+                lines.append(f"{self.name}_count{_labels(key)} {series[-2]}")
+        return lines
+
+STAGE_SECONDS = Histogram("daa_stage_seconds", "Time spent in each /api/ stage, by route.")
+REQUEST_SECONDS = Histogram("daa_request_seconds", "End-to-end /api/ latency, by route.")
+PNG_ENCODE_SECONDS = Histogram("daa_png_encode_seconds", "Time to encode one chart under its size limit, by route.")
+PNG_FALLBACKS = Counter("daa_png_fallback_attempts_total",
+                        "Re-encodes (quantize/downsample) needed because a chart exceeded its size limit, by route.")
+RESPONSE_CACHE = Counter("daa_response_cache_lookups_total", "Response cache lookups, by route and result.")
+PLAN_CACHE = Counter("daa_plan_cache_lookups_total", "LLM plan cache lookups, by result.")
+NETWORK_FALLBACKS = Counter("daa_network_engine_fallbacks_total",
+                            "Network stats recomputed with networkx after the CSR engine failed, by route.")
+ADMISSION = Counter("daa_admission_total", "Admission decisions (admitted, queued, shed, timeout), by route.")
+IN_FLIGHT = Gauge("daa_in_flight", "Requests currently running an analyzer or LLM plan, by route.")
+WAITING = Gauge("daa_waiting", "Requests waiting for a route's concurrency slot, by route.")
+
+_registry = [STAGE_SECONDS, REQUEST_SECONDS, PNG_ENCODE_SECONDS, PNG_FALLBACKS, RESPONSE_CACHE, PLAN_CACHE,
+             NETWORK_FALLBACKS, ADMISSION, IN_FLIGHT, WAITING]
+
+# Metrics recorded where the work runs: analyzer threads or processes, chart threads and
+# sandbox workers. Their samples travel back with each task's result and are labelled with
+# the route of the request that asked for it (see record / capture_samples / add_samples).
+WORKER_METRICS: Dict[str, Union[Counter, Histogram]] = {
+    m.name: m for m in (PNG_ENCODE_SECONDS, PNG_FALLBACKS, NETWORK_FALLBACKS)}
+# Sandboxed plans can forge samples; more than this per task are dropped
+MAX_TASK_SAMPLES = 1000
+
+Sample = Tuple[str, float]
+_pending: ContextVar[Optional[List[Sample]]] = ContextVar("daa_pending_samples", default=None)
+
+def _apply(name: str, value: float, **labels):
+    metric = WORKER_METRICS[name]
+    if isinstance(metric, Counter):
+        metric.inc(value, **labels)
+    else:
+        metric.observe(value, **labels)
+
+def record(metric: Union[Counter, Histogram], value: float = 1):
+    """
+    Record a sample of a WORKER_METRICS metric. Inside a request or a worker task it is
+    held until the request finishes; anywhere else it is recorded right away, unlabelled.
+    """
+    pending = _pending.get()
+    if pending is None:
+        _apply(metric.name, value)
+    else:
+        pending.append((metric.name, value))
+
+@contextmanager
+def capture_samples():
+    """Collect the samples recorded while running one worker task, to return with its result."""
+    samples: List[Sample] = []
+    token = _pending.set(samples)
+    try:
+        yield samples
+    finally:
+        _pending.reset(token)
+
+def add_samples(samples: Iterable[Sample]):
+    """Take samples returned by a worker task: held for the current request, or recorded now."""
+    pending = _pending.get()
+    try:
+        items = list(samples)[:MAX_TASK_SAMPLES]
+    except TypeError:
+        return
+    for item in items:
+        try:
+            name, value = item
+            value = float(value)
+        except (TypeError, ValueError):
+            continue
+        if name not in WORKER_METRICS or not math.isfinite(value) or value < 0:
+            continue
+        if pending is None:
+            _apply(name, value)
+        else:
+            pending.append((name, value))
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class RequestTimer:
+    """
+    Collects stage spans for one request. Spans are buffered and observed on `finish()`,
+    so stages that run before routing (e.g. the upload) are still labelled with the route.
+    Worker metric samples of the request (PNG encoding, engine fallbacks) are held the
+    same way: creating a timer makes it the current request of this task's context.
+    """
+
+    def __init__(self):
+        self.route = "unknown"
+        self.spans: List[Tuple[str, float]] = []
+        self.samples: List[Sample] = []
+        self._start = time.perf_counter()
+        _pending.set(self.samples)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, time.perf_counter() - start))
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={sec * 1000:.1f}" for name, sec in self.spans)
+
+    def finish(self):
+        total = time.perf_counter() - self._start
+        for name, sec in self.spans:
+            STAGE_SECONDS.observe(sec, stage=name, route=self.route)
+        REQUEST_SECONDS.observe(total, route=self.route)
+        for name, value in self.samples:
+            _apply(name, value, route=self.route)
+        self.samples.clear()
+        if _pending.get() is self.samples:
+            _pending.set(None)
+        logger.debug("route=%s total=%.1fms %s", self.route, total * 1000, self.server_timing())
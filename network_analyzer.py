@@ -1,68 +1,115 @@
+import os
+import logging
 import pandas as pd
 import networkx as nx
 import numpy as np
-import io, base64
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-from plot_utils import png_base64_under_limit
+from typing import Union
+from plot_utils import bar_chart, new_subplots, png_image_under_limit, render_charts
+from io_utils import CsvDataset, as_dataset
+from graph_engine import CSRGraph
+from metrics import NETWORK_FALLBACKS, record
 
-def handle_network_task(qtext: str, csv_path: str) -> dict:
-    # Load edge list
-    df = pd.read_csv(csv_path)
+# "csr" uses the NumPy engine; "networkx" forces the dict-based fallback
+NETWORK_ENGINE = os.getenv("NETWORK_ENGINE", "csr").lower()
+# Spring layout is quadratic, so large graphs are drawn as their highest-degree core
+MAX_DRAW_NODES = int(os.getenv("NETWORK_MAX_DRAW_NODES", "300"))
+
+logger = logging.getLogger(__name__)
+
+def _csr_stats(df: pd.DataFrame) -> dict:
+    g = CSRGraph.from_frame(df)
+    nodes, edges = g.top_degree_subgraph_edges(MAX_DRAW_NODES)
+    draw = nx.Graph()
+    draw.add_nodes_from(nodes)
+    draw.add_edges_from(edges)
+    return {
+        "edge_count": g.edge_count,
+        "highest_degree_node": g.max_degree_node(),
+        "average_degree": g.average_degree(),
+        "density": g.density(),
+        "shortest_path_alice_eve": g.shortest_path_length(g.find_node_ci("alice"), g.find_node_ci("eve")),
+        "degrees": g.degrees,
+        "draw_graph": draw,
+    }
+
+def _nx_stats(df: pd.DataFrame) -> dict:
     # Build undirected graph
     G = nx.Graph()
-    G.add_edges_from(df.values.tolist())
-    
+    G.add_edges_from(df.iloc[:, :2].values.tolist())
+
     nodes = list(G.nodes())
     degrees = dict(G.degree())
-    
-    # 1. Edge count
-    edge_count = G.number_of_edges()
-    
-    # 2. Highest degree node
-    highest_degree_node = max(degrees.items(), key=lambda kv: kv[1])[0] if degrees else ""
-    
-    # 3. Average degree
-    average_degree = float(np.mean(list(degrees.values()))) if degrees else 0.0
-    
-    # 4. Density
-    density = float(nx.density(G))
-    
-    # 5. Shortest path Alice-Eve (case-insensitive match)
-    nodelc = {name.lower(): name for name in nodes}
-    src = nodelc.get("alice")
-    tgt = nodelc.get("eve")
+
+    # Shortest path Alice-Eve (case-insensitive match)
+    nodelc = {name.lower(): name for name in nodes if isinstance(name, str)}
+    src, tgt = nodelc.get("alice"), nodelc.get("eve")
     try:
-        shortest = nx.shortest_path_length(G, src, tgt)
+        shortest = nx.shortest_path_length(G, src, tgt) if src is not None and tgt is not None else -1
     except Exception:
         shortest = -1
 
-    # 6. Network graph (nodes labelled, edges as in CSV)
-    fig1, ax1 = plt.subplots(figsize=(5,4))
-    pos = nx.spring_layout(G, seed=42)
-    nx.draw(G, pos, ax=ax1, with_labels=True, node_size=800, node_color="skyblue",
-            font_size=10, font_color="black", edge_color="gray", width=2)
-    ax1.set_title("Network Graph")
-    ax1.axis('off')
-    net_b64 = png_base64_under_limit(fig1)
-    
-    # 7. Degree histogram (green bars)
-    deg_counts = pd.Series(list(degrees.values())).value_counts().sort_index()
-    fig2, ax2 = plt.subplots(figsize=(4,3))
-    deg_counts.plot(kind="bar", color="green", ax=ax2)
-    ax2.set_xlabel("Degree")
-    ax2.set_ylabel("Node Count")
-    ax2.set_title("Degree Distribution")
-    plt.tight_layout()
-    hist_b64 = png_base64_under_limit(fig2)
-
+    if G.number_of_nodes() > MAX_DRAW_NODES:
+        core = sorted(degrees, key=degrees.get, reverse=True)[:MAX_DRAW_NODES]
+        draw = G.subgraph(core)
+    else:
+        draw = G
     return {
-        "edge_count": edge_count,
-        "highest_degree_node": str(highest_degree_node),
-        "average_degree": average_degree,
-        "density": density,
+        "edge_count": G.number_of_edges(),
+        "highest_degree_node": max(degrees.items(), key=lambda kv: kv[1])[0] if degrees else "",
+        "average_degree": float(np.mean(list(degrees.values()))) if degrees else 0.0,
+        "density": float(nx.density(G)),
         "shortest_path_alice_eve": shortest,
-        "network_graph": net_b64,
-        "degree_histogram": hist_b64,
+        "degrees": np.fromiter(degrees.values(), dtype=np.int64, count=len(degrees)),
+        "draw_graph": draw,
+    }
+
+def _graph_stats(ds: CsvDataset) -> dict:
+    # Shared edge list
+    df = ds.frame
+    if NETWORK_ENGINE != "networkx":
+        try:
+            return _csr_stats(df)
+        except Exception:
+            # Still answer, but a CSR engine bug must show up in logs and /metrics
+            logger.exception("CSR network engine failed on %s; falling back to networkx", ds.name)
+            record(NETWORK_FALLBACKS)
+    return _nx_stats(df)
+
+def handle_network_task(qtext: str, source: Union[str, CsvDataset]) -> dict:
+    ds = as_dataset(source)
+    stats = ds.memo("network_stats", lambda: _graph_stats(ds))
+
+    # Network graph (nodes labelled, edges as in CSV)
+    def graph_chart():
+        G = stats["draw_graph"]
+        fig1, ax1 = new_subplots(figsize=(5,4))
+        pos = nx.spring_layout(G, seed=42)
+        nx.draw_networkx(G, pos, ax=ax1, with_labels=True, node_size=800, node_color="skyblue",
+                         font_size=10, font_color="black", edge_color="gray", width=2)
+        ax1.set_title("Network Graph")
+        ax1.axis('off')
+        return png_image_under_limit(fig1)
+
+    # Degree histogram (green bars)
+    def degree_chart():
+        deg_counts = pd.Series(stats["degrees"]).value_counts().sort_index()
+        fig2, ax2 = new_subplots(figsize=(4,3))
+        bar_chart(ax2, deg_counts.index, deg_counts.to_numpy(), color="green")
+        ax2.set_xlabel("Degree")
+        ax2.set_ylabel("Node Count")
+        ax2.set_title("Degree Distribution")
+        fig2.tight_layout()
+        return png_image_under_limit(fig2)
+
+    charts = ds.memo("network_charts", lambda: render_charts(
+        {"network_graph": graph_chart, "degree_histogram": degree_chart}))
+
+    return {
+        "edge_count": int(stats["edge_count"]),
+        "highest_degree_node": str(stats["highest_degree_node"]),
+        "average_degree": float(stats["average_degree"]),
+        "density": float(stats["density"]),
+        "shortest_path_alice_eve": int(stats["shortest_path_alice_eve"]),
+        "network_graph": charts["network_graph"],
+        "degree_histogram": charts["degree_histogram"],
     }
@@ -0,0 +1,184 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from router import decide_route, detect_output_spec
+from planner import plan_with_llm
+from executor import run_code_steps
+from validators import ValidationError, validate_final_output_schema
+from yaml_utils import load_yaml_context
+from io_utils import CsvDataset, open_datasets
+from workers import run_analyzer
+from response_cache import response_cache, response_key
+from uploads import UploadBudget, UploadTooLarge, save_upload
+from registry import AnalyzerSpec, get_analyzer
+from json_response import dumps
+from metrics import PLAN_CACHE, RESPONSE_CACHE, RequestTimer
+from plan_cache import plan_cache, plan_key
+from admission import Overloaded, route_gate
+from scratch import ScratchDir
+
+# Try the deterministic query engine (csv_tools) on CSV questions before the LLM planner
+QUERY_ENGINE = os.getenv("QUERY_ENGINE", "1").lower() not in ("0", "false", "no", "off")
+
+@dataclass
+class UploadSet:
+    """Files of one request, saved and opened once; every question asked of them shares these handles."""
+    tempdir: str
+    file_map: Dict[str, str] = field(default_factory=dict)
+    file_hashes: Dict[str, str] = field(default_factory=dict)
+    datasets: Dict[str, CsvDataset] = field(default_factory=dict)
+    # YAML files are parsed on first use: by the planner's summary or by a plan
+    yaml_context: Any = None
+
+@dataclass
+class Answer:
+    body: bytes
+    route: str
+    cached: bool = False
+
+async def receive_uploads(files: Optional[List[UploadFile]], scratch: ScratchDir) -> UploadSet:
+    # Stream uploaded files into the request's scratch directory; map filename -> path and filename -> sha256
+    tempdir = scratch.path
+    file_map: Dict[str, str] = {}
+    file_hashes: Dict[str, str] = {}
+    if files:
+        budget = UploadBudget(scratch=scratch)
+        for f in files:
+            path, _, digest = await save_upload(f, tempdir, budget)
+            name = os.path.basename(path)
+            file_map[name] = path
+            file_hashes[name] = digest
+    return open_uploads(tempdir, file_map, file_hashes)
+
+def open_uploads(tempdir: str, file_map: Dict[str, str], file_hashes: Dict[str, str]) -> UploadSet:
+    # One dataset handle per CSV, shared by routing, analyzers and the executor
+    return UploadSet(tempdir, file_map, file_hashes,
+                     open_datasets(file_map, file_hashes), load_yaml_context(file_map))
+
+def http_error(e: Exception) -> HTTPException:
+    """The HTTP status and detail a failed question is reported with."""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, Overloaded):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    if isinstance(e, UploadTooLarge):
+        return HTTPException(status_code=413, detail=str(e))
+    if isinstance(e, ValidationError):
+        return HTTPException(status_code=400, detail=f"Validation failed: {e}")
+    return HTTPException(status_code=500, detail=f"Internal error: {e}")
+
+def _serialize(content: Any, timer: RequestTimer, cache_key: str) -> bytes:
+    with timer.stage("serialize"):
+        body = dumps(content)
+    response_cache.put(cache_key, body)
+    return body
+
+@asynccontextmanager
+async def _admitted(route: str, timer: RequestTimer, shed: bool):
+    gate = route_gate(route)
+    with timer.stage("admit"):
+        await gate.acquire(shed)
+    try:
+        yield
+    finally:
+        gate.release()
+
+async def answer_question(qtext: str, uploads: UploadSet, timer: RequestTimer, shed: bool = True) -> Answer:
+    """
+    Route one question over `uploads` and produce its JSON body: a cached response, a
+    fast-path analyzer result, a deterministic query engine answer, or the output of an
+    LLM plan run in the sandbox. Analyzer, engine and LLM work runs under the route's
+    concurrency budget (admission.py); when it is exhausted Overloaded is raised, or with
+    shed=False the call waits.
+    """
+    file_map, datasets = uploads.file_map, uploads.datasets
+    with timer.stage("route"):
+        route = decide_route(qtext, file_map, datasets)
+    timer.route = route["type"]
+
+    # Identical question + file contents + route: replay the stored response
+    with timer.stage("cache"):
+        cache_key = response_key(qtext, uploads.file_hashes, route["type"])
+        cached = response_cache.get(cache_key)
+    RESPONSE_CACHE.inc(route=route["type"], result="hit" if cached is not None else "miss")
+    if cached is not None:
+        return Answer(cached, route["type"], cached=True)
+
+    # ---- Fast-path analyzers (see registry.py) ----
+    spec = get_analyzer(route["type"])
+    if spec is not None:
+        async with _admitted(route["type"], timer, shed):
+            result = await _analyzer_result(spec, qtext, route, timer)
+        return Answer(_serialize(result, timer, cache_key), route["type"])
+
+    # ---- Deterministic query engine; falls through when it cannot answer every part ----
+    output_spec = detect_output_spec(qtext)
+    if QUERY_ENGINE and datasets:
+        async with _admitted("csv", timer, shed):
+            with timer.stage("query"):
+                result = await run_analyzer("csv_tools:maybe_answer_with_builtins",
+                                            qtext, file_map, datasets, output_spec)
+        if result is not None:
+            timer.route = "csv"
+            return Answer(_serialize(result, timer, cache_key), "csv")
+
+    # ---- Generic LLM pipeline ----
+    async with _admitted("llm", timer, shed):
+        result = await _plan_result(qtext, output_spec, uploads, timer)
+    return Answer(_serialize(result, timer, cache_key), route["type"])
+
+async def _analyzer_result(spec: AnalyzerSpec, qtext: str, route: Dict[str, Any], timer: RequestTimer) -> Any:
+    args = (qtext, route["dataset"]) if spec.needs_csv else ()
+    with timer.stage("analyzer"):
+        result = await run_analyzer(spec.target, *args)
+    if spec.validate is not None and not spec.validate(result):
+        raise HTTPException(status_code=400, detail="Validation failed: Unexpected analyzer output.")
+    return result
+
+async def _plan_result(qtext: str, output_spec: Dict[str, Any], uploads: UploadSet, timer: RequestTimer) -> Any:
+    file_map, datasets = uploads.file_map, uploads.datasets
+    yaml_context = uploads.yaml_context
+    # Same question shape over the same schema: reuse a plan that has not failed
+    pkey = plan_key(qtext, output_spec, file_map, datasets)
+    plan = plan_cache.get(pkey)
+    PLAN_CACHE.inc(result="hit" if plan is not None else "miss")
+    if plan is None:
+        with timer.stage("yaml"):
+            # An event scan of up to YAML_MAX_BYTES per file; kept off the event loop
+            yaml_summary = await asyncio.to_thread(yaml_context.get, "__summary__", {})
+        with timer.stage("plan"):
+            plan = await plan_with_llm(
+                qtext,
+                {"files": list(file_map.keys()), "yaml_summary": yaml_summary},
+                output_spec
+            )
+        plan_cache.put(pkey, plan)
+    context = {
+        "files": file_map,
+        "datasets": datasets,
+        "tempdir": uploads.tempdir,
+        "yaml_data": yaml_context
+    }
+    try:
+        with timer.stage("execute"):
+            exec_result: Any = await run_code_steps(plan, context)
+
+        with timer.stage("validate"):
+            validate_final_output_schema(exec_result, output_spec)
+
+        if output_spec.get("type") == "json_array":
+            if not isinstance(exec_result, list):
+                raise HTTPException(status_code=400, detail="Validation failed: Expected JSON array output.")
+            exec_result = [str(x) for x in exec_result]
+        elif not isinstance(exec_result, dict):
+            raise HTTPException(status_code=400, detail="Validation failed: Expected JSON object output.")
+    except Exception:
+        plan_cache.record(pkey, plan, ok=False)
+        raise
+    plan_cache.record(pkey, plan, ok=True)
+    return exec_result
@@ -0,0 +1,234 @@
+import os
+import hmac
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from io_utils import CsvDataset, private_dir, user_temp_path
+from response_cache import normalize_question
+
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "512"))
+PLAN_CACHE_TTL = int(os.getenv("PLAN_CACHE_TTL", str(7 * 24 * 3600)))
+# Plans persist here across restarts; set to an empty string for memory only. The directory
+# must be private to this user (see io_utils.private_dir), otherwise plans stay in memory.
+PLAN_CACHE_DIR = os.getenv("PLAN_CACHE_DIR", user_temp_path("plans"))
+
+logger = logging.getLogger(__name__)
+
+def schema_signature(file_map: Dict[str, str], datasets: Optional[Dict[str, CsvDataset]] = None) -> List[Any]:
+    """File names plus, for CSVs, sniffed column names and dtypes: the shape of the data, not its contents."""
+    datasets = datasets or {}
+    sig = []
+    for name in sorted(file_map):
+        ds = datasets.get(name)
+        if ds is None:
+            sig.append([name])
+            continue
+        try:
+            sig.append([name, list(map(str, ds.columns)), {str(k): str(v) for k, v in ds.dtypes.items()}])
+        except Exception:
+            sig.append([name])
+    return sig
+
+def plan_key(qtext: str, output_spec: Dict[str, Any], file_map: Dict[str, str],
+             datasets: Optional[Dict[str, CsvDataset]] = None) -> str:
+    material = json.dumps({
+        "q": normalize_question(qtext),
+        "spec": output_spec,
+        "schema": schema_signature(file_map, datasets),
+    }, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+def plan_digest(plan: List[Dict[str, Any]]) -> str:
+    return hashlib.sha256(json.dumps(plan, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class PlanCache:
+    """
+    LLM plans keyed by question, output spec and schema signature. Each entry records
+    whether its plan has run successfully; a plan that fails is never served again, and
+    the same plan text is refused if the planner produces it again for that key.
+    Memory LRU in front of a directory of one JSON file per key. Disk entries are signed
+    with a key kept in that directory, and an entry whose signature or plan digest does
+    not match is ignored: plans are executed, so a planted file must never load.
+    """
+
+    def __init__(self, max_entries: int = PLAN_CACHE_MAX_ENTRIES, ttl: int = PLAN_CACHE_TTL,
+                 disk_dir: str = PLAN_CACHE_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._key = b""
+        if disk_dir:
+            try:
+                self._key = self._signing_key(private_dir(disk_dir))
+            except OSError as e:
+                logger.warning("Plan cache kept in memory only: %s", e)
+                self.disk_dir = ""
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def _expired(self, entry: Dict[str, Any]) -> bool:
+        return self.ttl > 0 and time.time() - entry["created"] > self.ttl
+
+    def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._disk_get(key)
+            if entry is not None:
+                self._remember(key, entry)
+        if entry is not None and self._expired(entry):
+            self._entries.pop(key, None)
+            self._disk_remove(key)
+            return None
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None or entry.get("plan") is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["plan"]
+
+    def put(self, key: str, plan: List[Dict[str, Any]]):
+        digest = plan_digest(plan)
+        with self._lock:
+            entry = self._lookup(key) or {"failed": []}
+            if digest in entry["failed"]:
+                return
+            entry.update(plan=plan, digest=digest, created=time.time(), status="pending", successes=0)
+            self._remember(key, entry)
+            self._disk_put(key, entry)
+
+    def record(self, key: str, plan: List[Dict[str, Any]], ok: bool):
+        """Mark the outcome of running `plan` for `key`."""
+        digest = plan_digest(plan)
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is None or entry.get("digest") != digest:
+                return
+            if ok:
+                entry["status"] = "ok"
+                entry["successes"] = entry.get("successes", 0) + 1
+            else:
+                self.failures += 1
+                entry["status"] = "failed"
+                entry["failed"] = entry.get("failed", []) + [digest]
+                entry["plan"] = None
+            self._disk_put(key, entry)
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def _signing_key(disk_dir: str) -> bytes:
+        path = os.path.join(disk_dir, ".key")
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(32))
+        try:
+            # Publish atomically; a concurrent process that got there first wins
+            os.link(tmp, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp)
+        with open(path, "rb") as f:
+            key = f.read()
+        if len(key) != 32:
+            raise PermissionError(f"{path} is not a plan cache key")
+        return key
+
+    def _sign(self, body: bytes) -> str:
+        return hmac.new(self._key, body, hashlib.sha256).hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                mac, _, body = f.read().partition(b"\n")
+            if not hmac.compare_digest(mac.decode("ascii", "replace"), self._sign(body)):
+                logger.warning("Ignoring plan cache entry %s with a bad signature", key)
+                return None
+            entry = json.loads(body)
+            os.utime(self._disk_path(key))  # mtime is the disk LRU clock
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or "created" not in entry:
+            return None
+        if entry.get("plan") is not None and entry.get("digest") != plan_digest(entry["plan"]):
+            return None
+        return entry
+
+    def _disk_put(self, key: str, entry: Dict[str, Any]):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            body = json.dumps(entry, default=str).encode("utf-8")
+            with open(tmp, "wb") as f:
+                f.write(self._sign(body).encode("ascii") + b"\n" + body)
+            os.replace(tmp, path)
+            self._disk_evict()
+        except OSError:
+            pass
+
+    def _disk_remove(self, key: str):
+        if self.disk_dir:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def _disk_evict(self):
+        try:
+            names = [n for n in os.listdir(self.disk_dir) if n.endswith(".json")]
+        except OSError:
+            return
+        if len(names) <= self.max_entries:
+            return
+        files = []
+        for n in names:
+            p = os.path.join(self.disk_dir, n)
+            try:
+                files.append((os.stat(p).st_mtime, p))
+            except OSError:
+                continue
+        for _, p in sorted(files)[:len(files) - self.max_entries]:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "failures": self.failures,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk_dir": self.disk_dir or None,
+            }
+
+plan_cache = PlanCache()
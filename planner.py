@@ -9,9 +9,10 @@ SYSTEM_PROMPT = """You generate Python-only steps to solve data analysis tasks f
 Rules:
 - Use only pandas, numpy, matplotlib (Agg), and builtins.
 - Access uploaded files via context['files'][filename] exact paths.
+- Uploaded CSVs are already parsed: use context['datasets'][filename].frame (shared; do not modify in place) instead of pd.read_csv.
 - Access parsed YAML via context['yaml_data']={'files':{name:obj},'__summary__':{...}}.
 - If the task references a URL table, you may use pandas.read_html(url). If lxml is unavailable, flavor='html5lib' can be used if installed.
-- Always label plot axes and title; produce base64 PNG with png_base64(fig, max_bytes).
+- Always label plot axes and title; produce PNGs with png_image(fig, max_bytes) and put the returned image in RESULT as is (raw PNG bytes, base64-encoded on serialization; str(img) gives the base64 text). png_base64(fig, max_bytes) returns the base64 str directly when text is needed.
 - Do not print or write files; set final payload to RESULT (dict or list) matching requested format.
 - Do not produce YAML yourself; server handles serialization if needed.
 - Optimize for <3 minutes total execution.
@@ -24,8 +25,9 @@ def build_user_prompt(qtext: str, data_spec: Dict[str, Any], output_spec: Dict[s
         "output_spec": output_spec,
         "context_contract": {
             "files": "dict[str filename] -> absolute path",
+            "datasets": "dict[str csv filename] -> dataset handle; .frame is the parsed DataFrame, .columns the header",
             "yaml_data": "{'files': {filename: python_obj}, '__summary__': {...}}",
-            "helpers": ["png_base64(fig, max_bytes)", "assert_image_under_limit(b64, max_bytes)"]
+            "helpers": ["png_image(fig, max_bytes)", "png_base64(fig, max_bytes)", "assert_image_under_limit(img, max_bytes)"]
         }
     }, ensure_ascii=False)
 
@@ -41,13 +43,14 @@ matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 
 files = context["files"]
+datasets = context.get("datasets", {{}})
 yaml_data = context.get("yaml_data", {{}})
 
-csv_paths = [files[k] for k in files if k.lower().endswith(".csv")]
+csv_names = [k for k in files if k.lower().endswith(".csv")]
 payload = None
 
-if csv_paths:
-    df = pd.read_csv(csv_paths[0])
+if csv_names:
+    df = datasets[csv_names[0]].frame if csv_names[0] in datasets else pd.read_csv(files[csv_names[0]])
     summary = {{"columns": list(df.columns), "rows": int(len(df))}}
     num = df.select_dtypes(include=[np.number])
     if not num.empty:
@@ -58,9 +61,9 @@ if csv_paths:
         ax.set_xlabel("Column")
         ax.set_ylabel("Mean")
         ax.set_title("Numeric Column Means")
-        b64 = png_base64(fig, max_bytes=100000)
-        assert_image_under_limit(b64, 100000)
-        payload = {{"summary": summary, "plot": b64}}
+        img = png_image(fig, max_bytes=100000)
+        assert_image_under_limit(img, 100000)
+        payload = {{"summary": summary, "plot": img}}
     else:
         payload = {{"summary": summary}}
 else:
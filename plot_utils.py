@@ -1,16 +1,136 @@
-import io, base64
+import io, os, sys, time, math, contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+import numpy as np
 import matplotlib
 matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-
-def png_base64_under_limit(fig, max_bytes=100_000, start_dpi=110):
-    for dpi in [start_dpi, 100, 90, 80, 70, 60, 50]:
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight", pad_inches=0.1,
-                    metadata={"Software": "matplotlib"})
-        data = buf.getvalue()
-        if len(data) <= max_bytes:
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
+from metrics import PNG_ENCODE_SECONDS, PNG_FALLBACKS, record
+from images import PngImage
+
+MIN_DPI = 50
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "4"))
+# Leave headroom under the limit when predicting how far to shrink
+SIZE_MARGIN = 0.92
+
+_chart_pool = ThreadPoolExecutor(max_workers=CHART_WORKERS, thread_name_prefix="chart")
+
+def new_figure(figsize=None) -> Figure:
+    """A Figure on its own Agg canvas, outside pyplot's global figure manager (safe across threads)."""
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+def new_subplots(figsize=None):
+    fig = new_figure(figsize)
+    return fig, fig.add_subplot()
+
+def bar_chart(ax, labels, values, color, title=None):
+    # Same layout as Series.plot(kind="bar"), without going through pandas/pyplot
+    positions = np.arange(len(values))
+    ax.bar(positions, values, width=0.5, color=color)
+    ax.set_xticks(positions)
+    ax.set_xticklabels([str(v) for v in labels], rotation=90)
+    ax.set_xlim(-0.5, len(values) - 0.5)
+    if title:
+        ax.set_title(title)
+
+def render_charts(jobs: Dict[str, Callable[[], str]]) -> Dict[str, str]:
+    """Run independent chart builders concurrently; each returns its encoded image."""
+    # Each builder runs in a copy of the caller's context, so its metric samples reach the caller's request
+    futures = {name: _chart_pool.submit(contextvars.copy_context().run, job) for name, job in jobs.items()}
+    return {name: fut.result() for name, fut in futures.items()}
+
+def _close(fig):
+    # Figures from new_figure() are garbage-collected normally; only pyplot-managed ones need closing
+    if getattr(fig.canvas, "manager", None) is not None:
+        plt = sys.modules.get("matplotlib.pyplot")
+        if plt is not None:
             plt.close(fig)
-            return base64.b64encode(data).decode("ascii")
-    plt.close(fig)
-    return base64.b64encode(data).decode("ascii")
+
+def _render_png(fig, dpi) -> bytes:
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight", pad_inches=0.1,
+                metadata={"Software": "matplotlib"})
+    return buf.getvalue()
+
+def _reencode(img: Image.Image, scale: float) -> bytes:
+    # Resample the already-rendered raster and palette-quantize it instead of redrawing
+    if scale < 1.0:
+        w, h = img.size
+        img = img.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+    out = io.BytesIO()
+    img.quantize(colors=256).save(out, format="PNG", optimize=True)
+    return out.getvalue()
+
+def png_bytes_under_limit(fig, max_bytes=100_000, start_dpi=110, min_dpi=MIN_DPI) -> bytes:
+    """
+    Render `fig` once and return PNG bytes of at most `max_bytes` where possible.
+    Oversized renders are palette-quantized, then downsampled to a resolution predicted
+    from the observed size (PNG size scales roughly with pixel count), never below
+    `min_dpi`. Returns the smallest candidate if nothing fits.
+    """
+    start = time.perf_counter()
+    try:
+        data = _render_png(fig, start_dpi)
+        _close(fig)
+        if len(data) <= max_bytes:
+            return data
+
+        img = Image.open(io.BytesIO(data)).convert("RGB")
+        best = data
+        scale = 1.0
+        min_scale = min_dpi / start_dpi
+        while True:
+            record(PNG_FALLBACKS)
+            candidate = _reencode(img, scale)
+            if len(candidate) < len(best):
+                best = candidate
+            if len(candidate) <= max_bytes or scale <= min_scale:
+                return best
+            predicted = scale * math.sqrt(max_bytes / len(candidate)) * SIZE_MARGIN
+            scale = max(min_scale, min(predicted, scale * 0.9))
+    finally:
+        record(PNG_ENCODE_SECONDS, time.perf_counter() - start)
+
+def png_image_under_limit(fig, max_bytes=100_000, start_dpi=110) -> PngImage:
+    return PngImage(png_bytes_under_limit(fig, max_bytes, start_dpi))
+
+def png_base64_under_limit(fig, max_bytes=100_000, start_dpi=110) -> str:
+    return png_image_under_limit(fig, max_bytes, start_dpi).to_base64()
+
+def _as_position(x: np.ndarray) -> np.ndarray:
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(float)
+    if np.issubdtype(x.dtype, np.number):
+        return x.astype(float)
+    return np.arange(len(x), dtype=float)
+
+def downsample_line(x, y, width_px: int):
+    """
+    Shape-preserving reduction of a line series to what `width_px` pixel columns can
+    show: per column keep the first, last, min and max points (M4 bucketing), so peaks
+    and the drawn envelope survive. Short series are returned unchanged.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    width_px = max(1, int(width_px))
+    if n <= 4 * width_px:
+        return x, y
+    pos = _as_position(x)
+    # Unsorted or non-numeric x is bucketed by row order instead of by value
+    if np.isnan(pos).any() or np.any(np.diff(pos) < 0):
+        pos = np.arange(n, dtype=float)
+    span = pos[-1] - pos[0] or 1.0
+    bins = np.minimum(((pos - pos[0]) * (width_px / span)).astype(np.int64), width_px - 1)
+    starts = np.flatnonzero(np.concatenate(([True], bins[1:] != bins[:-1])))
+    ends = np.concatenate((starts[1:], [n])) - 1
+    order = np.lexsort((y, bins))  # rows grouped by bin, ascending y within each
+    keep = np.unique(np.concatenate((starts, ends, order[starts], order[ends])))
+    return x[keep], y[keep]
+
+def line_width_px(fig, dpi=110) -> int:
+    return int(fig.get_figwidth() * dpi)
@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+@dataclass(frozen=True)
+class AnalyzerSpec:
+    """
+    A fast-path analyzer and the signals that select it. `target` is a
+    "module:function" string so the analyzer module is only imported when dispatched.
+    """
+    name: str
+    target: str
+    needs_csv: bool = True
+    # All of these (lower-cased) column names present: strong match
+    columns: Tuple[str, ...] = ()
+    # Any column containing one of these substrings
+    column_patterns: Tuple[str, ...] = ()
+    # Files with a different column count are never matched
+    column_count: Optional[int] = None
+    # Every sampled column parsed as text (e.g. edge lists of node names)
+    text_columns: bool = False
+    filename_hints: Tuple[str, ...] = ()
+    # All of these phrases must appear in the question
+    keywords: Tuple[str, ...] = ()
+    # Lower wins whenever it matches at all; match scores only rank files for the same analyzer
+    priority: int = 100
+    validate: Optional[Callable[[Any], bool]] = None
+
+COLUMNS_SCORE = 3
+KEYWORDS_SCORE = 3
+PATTERN_SCORE = 2
+TEXT_COLUMNS_SCORE = 2
+FILENAME_SCORE = 1
+
+_registry: Dict[str, AnalyzerSpec] = {}
+
+def register_analyzer(spec: AnalyzerSpec) -> AnalyzerSpec:
+    _registry[spec.name] = spec
+    return spec
+
+def get_analyzer(name: str) -> Optional[AnalyzerSpec]:
+    return _registry.get(name)
+
+def registered_analyzers() -> List[AnalyzerSpec]:
+    return sorted(_registry.values(), key=lambda s: s.priority)
+
+def score_question(spec: AnalyzerSpec, text: str) -> int:
+    if spec.keywords and all(k in text for k in spec.keywords):
+        return KEYWORDS_SCORE
+    return 0
+
+def score_file(spec: AnalyzerSpec, name: str, cols: List[str], all_text: bool) -> int:
+    if spec.column_count is not None and len(cols) != spec.column_count:
+        return 0
+    score = 0
+    if spec.columns and all(c in cols for c in spec.columns):
+        score = max(score, COLUMNS_SCORE)
+    if spec.column_patterns and any(p in c for c in cols for p in spec.column_patterns):
+        score = max(score, PATTERN_SCORE)
+    if spec.text_columns and all_text:
+        score = max(score, TEXT_COLUMNS_SCORE)
+    if spec.filename_hints and any(h in name for h in spec.filename_hints):
+        score = max(score, FILENAME_SCORE)
+    return score
+
+def _four_strings(result: Any) -> bool:
+    return isinstance(result, list) and len(result) == 4 and all(isinstance(x, str) for x in result)
+
+register_analyzer(AnalyzerSpec(
+    name="sales", target="sales_analyzer:handle_sales_task",
+    columns=("region", "sales"), filename_hints=("sales",), priority=10,
+))
+register_analyzer(AnalyzerSpec(
+    name="films", target="films_analyzer:handle_films_task", needs_csv=False,
+    keywords=("highest grossing films", "wikipedia.org/wiki/list_of_highest-grossing_films"),
+    priority=20, validate=_four_strings,
+))
+register_analyzer(AnalyzerSpec(
+    name="network", target="network_analyzer:handle_network_task",
+    column_count=2, text_columns=True, filename_hints=("edge", "node"), priority=30,
+))
+register_analyzer(AnalyzerSpec(
+    name="weather", target="weather_analyzer:handle_weather_task",
+    column_patterns=("temp", "precip"), filename_hints=("weather",), priority=40,
+))
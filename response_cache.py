@@ -0,0 +1,167 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# Optional on-disk tier shared by every uvicorn worker on the machine; off when unset
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "")
+RESPONSE_CACHE_DISK_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+
+def normalize_question(qtext: str) -> str:
+    # Whitespace and line endings only; case can matter for requested key names
+    return re.sub(r"\s+", " ", (qtext or "")).strip()
+
+def response_key(qtext: str, file_hashes: Dict[str, str], route_type: str) -> str:
+    material = json.dumps({
+        "q": normalize_question(qtext),
+        "files": sorted(file_hashes.items()),
+        "route": route_type,
+    }, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    """
+    Serialized JSON responses keyed by question, uploaded file hashes and route.
+    An in-memory LRU bounded by total body bytes sits in front of an optional
+    directory tier that several worker processes can share.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES, ttl: int = RESPONSE_CACHE_TTL,
+                 disk_dir: str = RESPONSE_CACHE_DIR, disk_max_bytes: int = RESPONSE_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+        entry = self._disk_get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._insert(key, entry[0], entry[1])
+        return entry[1]
+
+    def put(self, key: str, body: bytes):
+        created = time.time()
+        with self._lock:
+            self._insert(key, created, body)
+        self._disk_put(key, created, body)
+
+    def _drop(self, key: str):
+        _, body = self._entries.pop(key)
+        self._bytes -= len(body)
+
+    def _insert(self, key: str, created: float, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (created, body)
+        self._bytes += len(body)
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, bytes]]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                header, body = f.read().split(b"\n", 1)
+            created = float(json.loads(header)["created"])
+        except (OSError, ValueError, KeyError):
+            return None
+        if self._expired(created):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(path)  # mtime doubles as the LRU clock for disk eviction
+        except OSError:
+            pass
+        return created, body
+
+    def _disk_put(self, key: str, created: float, body: bytes):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(json.dumps({"created": created}).encode("utf-8") + b"\n" + body)
+            os.replace(tmp, path)
+            self._disk_evict()
+        except OSError:
+            pass
+
+    def _disk_evict(self):
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for n in names:
+                if n.endswith(".json"):
+                    p = os.path.join(root, n)
+                    try:
+                        st = os.stat(p)
+                    except OSError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, p))
+        total = sum(f[1] for f in files)
+        for _, size, p in sorted(files):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                os.remove(p)
+                total -= size
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_tier": bool(self.disk_dir),
+            }
+
+response_cache = ResponseCache()
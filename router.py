@@ -1,62 +1,49 @@
 import re
-import pandas as pd
+from typing import Dict, Optional
+from io_utils import CsvDataset, open_datasets
+from registry import registered_analyzers, score_file, score_question
 
-def decide_route(qtext: str, file_map: dict):
+def decide_route(qtext: str, file_map: dict, datasets: Optional[Dict[str, CsvDataset]] = None):
+    """
+    Score every registered analyzer against the question and each CSV's pre-sniffed
+    header in one pass. The matching analyzer with the best registry priority wins, as in
+    the original detector cascade (sales, films, network, weather); the score only picks
+    which file it gets when several match. Falls back to the generic LLM pipeline when
+    nothing matches.
+    """
     text = (qtext or "").lower()
+    if datasets is None:
+        datasets = open_datasets(file_map)
+    specs = registered_analyzers()
 
-    # Detect sales CSV based on file name or content
-    for name, path in file_map.items():
-        if name.lower().endswith(".csv"):
-            try:
-                df = pd.read_csv(path, nrows=5)
-                cols = [c.lower() for c in df.columns]
-            except Exception:
-                cols = []
+    best = None  # (-priority, score, route)
+    for spec in specs:
+        if not spec.needs_csv:
+            score = score_question(spec, text)
+            if score and (best is None or (-spec.priority, score) > best[:2]):
+                best = (-spec.priority, score, {"type": spec.name})
 
-            if "region" in cols and "sales" in cols:
-                return {"type": "sales", "csv_path": path}
-            
-            if "sales" in name.lower():
-                return {"type": "sales", "csv_path": path}
+    for name in file_map:
+        ds = datasets.get(name)
+        if ds is None:
+            continue
+        # Header facts are computed once per file and shared by every analyzer's scorer
+        cols = ds.columns_lower
+        dtypes = ds.dtypes
+        all_text = len(dtypes) > 0 and all(dt == object for dt in dtypes)
+        lname = name.lower()
+        for spec in specs:
+            if not spec.needs_csv:
+                continue
+            score = score_file(spec, lname, cols, all_text) + score_question(spec, text)
+            if score and (best is None or (-spec.priority, score) > best[:2]):
+                best = (-spec.priority, score,
+                        {"type": spec.name, "csv_path": ds.path, "dataset": ds})
 
-    # Detect films task (question content)
-    if ("highest grossing films" in text) and \
-       ("wikipedia.org/wiki/list_of_highest-grossing_films" in text):
-        return {"type": "films"}
-
-    # Detect network CSV
-    for name, path in file_map.items():
-        if name.lower().endswith(".csv"):
-            try:
-                df = pd.read_csv(path, nrows=2)
-                cols = list(df.columns)
-            except Exception:
-                cols = []
-
-            if len(cols) == 2 and all(isinstance(c, str) for c in cols):
-                # Likely an edge list
-                if "edge" in name.lower() or "node" in name.lower():
-                    return {"type": "network", "csv_path": path}
-                # Also detect by typical node names
-                if df.dtypes.nunique() == 1 and df.dtypes.iloc[0] == 'object':
-                    return {"type": "network", "csv_path": path}
-
-    # Detect weather CSV
-    for name, path in file_map.items():
-        if name.lower().endswith(".csv"):
-            try:
-                df = pd.read_csv(path, nrows=5)
-                cols = [c.lower() for c in df.columns]
-            except Exception:
-                cols = []
-            
-            if any("temp" in c for c in cols) or any("precip" in c for c in cols):
-                return {"type": "weather", "csv_path": path}
-            if "weather" in name.lower():
-                return {"type": "weather", "csv_path": path}
-
-    # Default: generic LLM pipeline
-    return {"type": "llm"}
+    if best is None:
+        # Default: generic LLM pipeline
+        return {"type": "llm"}
+    return best[2]
 
 def detect_output_spec(qtext: str):
     text = (qtext or "").lower()
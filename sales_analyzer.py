@@ -1,47 +1,122 @@
+import os
 import pandas as pd
 import numpy as np
-from plot_utils import png_base64_under_limit
+from typing import Union
+from plot_utils import bar_chart, downsample_line, line_width_px, new_subplots, png_image_under_limit, render_charts
+from io_utils import CsvDataset, as_dataset
+from stream_stats import CoMoments, QuantileSketch
 
-def handle_sales_task(qtext: str, csv_path: str) -> dict:
-    df = pd.read_csv(csv_path)
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df["sales"] = pd.to_numeric(df["sales"], errors="coerce")
-    df = df.dropna(subset=["date", "region", "sales"])
+# Files above this size are aggregated chunk by chunk instead of loaded whole
+SALES_STREAM_THRESHOLD_BYTES = int(os.getenv("SALES_STREAM_THRESHOLD_BYTES", str(256 * 1024 * 1024)))
+SALES_CHUNK_ROWS = int(os.getenv("SALES_CHUNK_ROWS", "500000"))
+# Upper bound on cumulative-series buckets kept while streaming
+CUMULATIVE_MAX_BUCKETS = 4096
+DAY_NS = 24 * 3600 * 10**9
 
-    total_sales = float(df["sales"].sum())
-    by_region = df.groupby("region")["sales"].sum().sort_values(ascending=False)
-    top_region = str(by_region.index[0]) if len(by_region) else ""
+def _clean(raw: pd.DataFrame) -> pd.DataFrame:
+    df = pd.DataFrame({
+        "date": pd.to_datetime(raw["date"], errors="coerce"),
+        "region": raw["region"],
+        "sales": pd.to_numeric(raw["sales"], errors="coerce"),
+    })
+    return df.dropna(subset=["date", "region", "sales"])
 
-    df["day"] = df["date"].dt.day
-    day_sales_correlation = float(df["day"].corr(df["sales"]))
+def _frame_stats(raw: pd.DataFrame) -> dict:
+    df = _clean(raw)
+    s = df.sort_values("date")
+    return {
+        "total_sales": float(df["sales"].sum()),
+        "by_region": df.groupby("region")["sales"].sum().sort_values(ascending=False),
+        "day_sales_correlation": float(df["date"].dt.day.corr(df["sales"])),
+        "median_sales": float(df["sales"].median()),
+        "cumulative": pd.Series(s["sales"].cumsum().to_numpy(), index=s["date"].to_numpy()),
+    }
 
-    # Blue bar chart
-    bar_fig = by_region.plot(kind="bar", color="blue", title="Total Sales by Region").get_figure()
-    ax1 = bar_fig.axes[0]
-    ax1.set_xlabel("Region")
-    ax1.set_ylabel("Total Sales")
-    bar_b64 = png_base64_under_limit(bar_fig)
+def _stream_stats(ds: CsvDataset) -> dict:
+    """Single pass over the file in chunks with mergeable accumulators; memory is bounded by the chunk size."""
+    by_region = pd.Series(dtype=float)
+    moments = CoMoments()
+    sketch = QuantileSketch()
+    buckets = pd.Series(dtype=float)
+    bucket_ns = DAY_NS
+    total_sales = 0.0
+    reader = pd.read_csv(ds.path, sep=ds.delimiter, usecols=["date", "region", "sales"],
+                         chunksize=SALES_CHUNK_ROWS)
+    for raw in reader:
+        df = _clean(raw)
+        if df.empty:
+            continue
+        total_sales += float(df["sales"].sum())
+        by_region = by_region.add(df.groupby("region")["sales"].sum(), fill_value=0)
+        moments.update(df["date"].dt.day.to_numpy(), df["sales"].to_numpy())
+        sketch.update(df["sales"].to_numpy())
+
+        keys = df["date"].to_numpy().astype("datetime64[ns]").astype(np.int64) // bucket_ns * bucket_ns
+        buckets = buckets.add(df["sales"].groupby(keys).sum(), fill_value=0)
+        # Widen the buckets whenever the series outgrows its bound
+        while len(buckets) > CUMULATIVE_MAX_BUCKETS:
+            bucket_ns *= 2
+            buckets = buckets.groupby(buckets.index.to_numpy() // bucket_ns * bucket_ns).sum()
+
+    buckets = buckets.sort_index()
+    return {
+        "total_sales": total_sales,
+        "by_region": by_region.sort_values(ascending=False),
+        "day_sales_correlation": float(moments.corr()),
+        "median_sales": float(sketch.median()),
+        "cumulative": pd.Series(buckets.cumsum().to_numpy(),
+                                index=pd.to_datetime(buckets.index.to_numpy(dtype=np.int64))),
+    }
+
+def _should_stream(ds: CsvDataset) -> bool:
+    # A memory-mapped columnar copy is cheaper than a chunked re-parse
+    if ds.cached:
+        return False
+    try:
+        return os.path.getsize(ds.path) > SALES_STREAM_THRESHOLD_BYTES
+    except OSError:
+        return False
+
+def handle_sales_task(qtext: str, source: Union[str, CsvDataset]) -> dict:
+    ds = as_dataset(source)
+    stats = ds.memo("sales_stats", lambda: _stream_stats(ds) if _should_stream(ds) else _frame_stats(ds.frame))
+
+    total_sales = stats["total_sales"]
+    by_region = stats["by_region"]
+    top_region = str(by_region.index[0]) if len(by_region) else ""
+    day_sales_correlation = stats["day_sales_correlation"]
 
-    median_sales = float(df["sales"].median())
+    median_sales = stats["median_sales"]
     total_sales_tax = float(round(total_sales * 0.10))
 
+    # Blue bar chart
+    def region_chart():
+        fig1, ax1 = new_subplots()
+        bar_chart(ax1, by_region.index, by_region.to_numpy(), color="blue", title="Total Sales by Region")
+        ax1.set_xlabel("Region")
+        ax1.set_ylabel("Total Sales")
+        return png_image_under_limit(fig1)
+
     # Red cumulative line chart
-    s = df.sort_values("date").copy()
-    s["cumulative_sales"] = s["sales"].cumsum()
-    import matplotlib.pyplot as plt
-    fig2, ax2 = plt.subplots(figsize=(4,3))
-    ax2.plot(s["date"], s["cumulative_sales"], color="red")
-    ax2.set_xlabel("Date")
-    ax2.set_ylabel("Cumulative Sales")
-    ax2.set_title("Cumulative Sales Over Time")
-    line_b64 = png_base64_under_limit(fig2)
+    cumulative = stats["cumulative"]
+    def cumulative_chart():
+        fig2, ax2 = new_subplots(figsize=(4,3))
+        xs, ys = downsample_line(cumulative.index.to_numpy(), cumulative.to_numpy(), line_width_px(fig2))
+        ax2.plot(xs, ys, color="red")
+        ax2.set_xlabel("Date")
+        ax2.set_ylabel("Cumulative Sales")
+        ax2.set_title("Cumulative Sales Over Time")
+        return png_image_under_limit(fig2)
+
+    charts = ds.memo("sales_charts", lambda: render_charts(
+        {"bar_chart": region_chart, "cumulative_sales_chart": cumulative_chart}))
 
     return {
         "total_sales": total_sales,
         "top_region": top_region,
         "day_sales_correlation": day_sales_correlation,
-        "bar_chart": bar_b64,
+        "bar_chart": charts["bar_chart"],
         "median_sales": median_sales,
         "total_sales_tax": total_sales_tax,
-        "cumulative_sales_chart": line_b64,
+        "cumulative_sales_chart": charts["cumulative_sales_chart"],
     }
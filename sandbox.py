@@ -0,0 +1,223 @@
+import os
+import asyncio
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import add_samples, capture_samples
+
+try:
+    import resource
+except ImportError:  # not available on Windows; limits are then wall-clock only
+    resource = None
+
+SANDBOX_WORKERS = int(os.getenv("SANDBOX_WORKERS", "2"))
+SANDBOX_CPU_SEC = int(os.getenv("SANDBOX_CPU_SEC", "120"))
+SANDBOX_MEMORY_MB = int(os.getenv("SANDBOX_MEMORY_MB", "2048"))
+SANDBOX_MAX_JOBS = int(os.getenv("SANDBOX_MAX_JOBS", "50"))
+# Parsed uploads each worker keeps for later plans over the same file (0 disables)
+SANDBOX_FRAME_CACHE_MB = int(os.getenv("SANDBOX_FRAME_CACHE_MB", "256"))
+SANDBOX_START_TIMEOUT = 60
+SANDBOX_START_METHOD = os.getenv("SANDBOX_START_METHOD", "spawn")
+
+class PlanTimeout(RuntimeError):
+    pass
+
+class SandboxCrash(RuntimeError):
+    pass
+
+def _limit_memory(memory_mb: int):
+    if resource is None or memory_mb <= 0:
+        return
+    limit = memory_mb * 1024 * 1024
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def _limit_cpu(cpu_sec: int):
+    # Only the soft limit moves, relative to what this long-lived worker has used so far;
+    # crossing it delivers SIGXCPU and the parent recycles the worker.
+    if resource is None or cpu_sec <= 0:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = int(usage.ru_utime + usage.ru_stime) + 1
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = used + cpu_sec
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def _worker_main(conn, memory_mb: int):
+    # Plans are single-threaded; keep BLAS from reserving per-core arenas under RLIMIT_AS
+    for var in ("OPENBLAS_NUM_THREADS", "OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    _limit_memory(memory_mb)
+    import numpy, pandas  # noqa: F401
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot  # noqa: F401
+    from executor import exec_plan
+    from io_utils import enable_shared_frames
+
+    # Plans get shallow copies of cached frames; copy-on-write keeps their edits private
+    pandas.set_option("mode.copy_on_write", True)
+    enable_shared_frames(SANDBOX_FRAME_CACHE_MB * 1024 * 1024)
+
+    conn.send(("ready", os.getpid()))
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if msg is None:
+            break
+        plan, context, cpu_sec = msg
+        _limit_cpu(cpu_sec)
+        # PNG encode samples of the plan go back with the reply; this process is never scraped
+        with capture_samples() as samples:
+            try:
+                reply = ("ok", exec_plan(plan, context), samples)
+            except BaseException as e:
+                reply = ("error", f"{type(e).__name__}: {e}", samples)
+        try:
+            conn.send(reply)
+        except Exception as e:
+            conn.send(("error", f"Plan RESULT is not serializable: {e}", samples))
+
+class _Worker:
+    def __init__(self, ctx, memory_mb: int):
+        self.conn, child = ctx.Pipe()
+        self.proc = ctx.Process(target=_worker_main, args=(child, memory_mb),
+                                name="plan-sandbox", daemon=True)
+        self.proc.start()
+        child.close()
+        self.ready = False
+        self.jobs = 0
+
+    def wait_ready(self, timeout: float):
+        if self.ready:
+            return
+        if not self.conn.poll(timeout):
+            raise SandboxCrash("Sandbox worker did not start in time")
+        try:
+            self.conn.recv()
+        except EOFError:
+            raise SandboxCrash(f"Sandbox worker died during startup (exit code {self.proc.exitcode})")
+        self.ready = True
+
+    def stop(self, kill: bool = False):
+        try:
+            if kill:
+                self.proc.kill()
+            else:
+                self.conn.send(None)
+        except Exception:
+            pass
+        self.proc.join(timeout=5)
+        if self.proc.is_alive():
+            self.proc.kill()
+            self.proc.join(timeout=5)
+        self.conn.close()
+
+class SandboxPool:
+    """
+    Long-lived worker processes for LLM-generated plans. Each worker imports pandas,
+    numpy and matplotlib once; a plan gets a hard wall-clock kill plus CPU and memory
+    rlimits, and timed-out, crashed or worn-out workers are replaced. Plans are driven from
+    a thread pool of the same size, so a thread always finds an idle worker and plans waiting
+    for one queue there rather than holding threads of the event loop's default executor.
+    """
+
+    def __init__(self, size: int = SANDBOX_WORKERS, cpu_sec: int = SANDBOX_CPU_SEC,
+                 memory_mb: int = SANDBOX_MEMORY_MB, max_jobs: int = SANDBOX_MAX_JOBS):
+        self.size = max(1, size)
+        self.cpu_sec = cpu_sec
+        self.memory_mb = memory_mb
+        self.max_jobs = max_jobs
+        self._ctx = multiprocessing.get_context(SANDBOX_START_METHOD)
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="sandbox")
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for _ in range(self.size):
+            self._idle.put(_Worker(self._ctx, self.memory_mb))
+
+    def _release(self, worker: _Worker, recycle: bool, kill: bool = False):
+        if recycle or self._closed:
+            worker.stop(kill=kill)
+            if self._closed:
+                return
+            worker = _Worker(self._ctx, self.memory_mb)
+        self._idle.put(worker)
+
+    def run_blocking(self, plan: List[Dict[str, Any]], context: Dict[str, Any],
+                     timeout_sec: float) -> Tuple[str, Any, list]:
+        """Run `plan` on an idle worker; returns (status, result or error, metric samples)."""
+        self.start()
+        worker = self._idle.get()
+        try:
+            worker.wait_ready(SANDBOX_START_TIMEOUT)
+            worker.conn.send((plan, context, int(self.cpu_sec or 0)))
+        except Exception:
+            self._release(worker, recycle=True, kill=True)
+            raise
+        if not worker.conn.poll(timeout_sec):
+            self._release(worker, recycle=True, kill=True)
+            raise PlanTimeout(f"Plan exceeded {timeout_sec}s wall-clock limit")
+        try:
+            status, payload, samples = worker.conn.recv()
+        except (EOFError, OSError):
+            worker.proc.join(timeout=5)
+            code = worker.proc.exitcode
+            self._release(worker, recycle=True, kill=True)
+            raise SandboxCrash(f"Plan worker crashed (exit code {code}); CPU or memory limit likely exceeded")
+        worker.jobs += 1
+        self._release(worker, recycle=worker.jobs >= self.max_jobs)
+        return status, payload, samples
+
+    async def run(self, plan: List[Dict[str, Any]], context: Dict[str, Any], timeout_sec: float) -> Any:
+        loop = asyncio.get_running_loop()
+        status, payload, samples = await loop.run_in_executor(self._executor, self.run_blocking, plan, context, timeout_sec)
+        # Recorded here, in the request's context, so they carry its route
+        add_samples(samples)
+        if status != "ok":
+            raise RuntimeError(payload)
+        return payload
+
+    def shutdown(self):
+        self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+def get_sandbox_pool() -> SandboxPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SandboxPool()
+    return _pool
+
+def shutdown_sandbox_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
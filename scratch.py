@@ -0,0 +1,160 @@
+import os
+import shutil
+import logging
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from admission import Overloaded
+
+def _default_memory_dir() -> str:
+    shm = "/dev/shm"
+    return os.path.join(shm, "llm_daa_scratch") if os.path.isdir(shm) and os.access(shm, os.W_OK) else ""
+
+# Per-request directories for uploads and plan outputs live under these roots
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", os.path.join(tempfile.gettempdir(), "llm_daa_scratch"))
+SCRATCH_QUOTA_BYTES = int(os.getenv("SCRATCH_QUOTA_BYTES", str(4 * 1024 * 1024 * 1024)))
+# tmpfs root for small requests (empty = always use SCRATCH_DIR)
+SCRATCH_MEMORY_DIR = os.getenv("SCRATCH_MEMORY_DIR", _default_memory_dir())
+SCRATCH_MEMORY_MAX_BYTES = int(os.getenv("SCRATCH_MEMORY_MAX_BYTES", str(8 * 1024 * 1024)))
+SCRATCH_MEMORY_TOTAL_BYTES = int(os.getenv("SCRATCH_MEMORY_TOTAL_BYTES", str(256 * 1024 * 1024)))
+
+DIR_PREFIX = "llm_daa_"
+
+logger = logging.getLogger(__name__)
+
+class ScratchFull(Overloaded):
+    pass
+
+class ScratchDir:
+    """One request's directory and the bytes charged to it."""
+
+    def __init__(self, manager: "ScratchSpace", path: str, in_memory: bool):
+        self.manager = manager
+        self.path = path
+        self.in_memory = in_memory
+        # Bytes charged to the disk quota (False) and the tmpfs budget (True)
+        self.reserved = {False: 0, True: 0}
+        # Part of the tmpfs reservation made at allocation that uploads have not used yet
+        self.credit = 0
+
+    def reserve(self, nbytes: int):
+        self.manager._reserve(self, nbytes)
+
+class ScratchSpace:
+    """
+    Allocates request directories, charges uploaded bytes against a quota and removes
+    directories when their request (or async job) is done. Requests whose uploads fit
+    SCRATCH_MEMORY_MAX_BYTES go to tmpfs while it has room (reserved when the directory is
+    allocated); the rest to SCRATCH_DIR. Accounting is per process.
+    """
+
+    def __init__(self, root: str = SCRATCH_DIR, quota: int = SCRATCH_QUOTA_BYTES,
+                 memory_root: str = SCRATCH_MEMORY_DIR, memory_max: int = SCRATCH_MEMORY_MAX_BYTES,
+                 memory_total: int = SCRATCH_MEMORY_TOTAL_BYTES):
+        self.root = root
+        self.quota = quota
+        self.memory_root = memory_root
+        self.memory_max = memory_max
+        self.memory_total = memory_total
+        self._dirs: Dict[str, ScratchDir] = {}
+        self._used = {False: 0, True: 0}
+        self._lock = threading.Lock()
+
+    def allocate(self, expected_bytes: int = 0) -> ScratchDir:
+        with self._lock:
+            in_memory = bool(self.memory_root) and expected_bytes <= self.memory_max \
+                and self._used[True] + expected_bytes <= self.memory_total
+            if in_memory:
+                # Reserved under the lock, so concurrent requests cannot all count on the same free tmpfs
+                self._used[True] += expected_bytes
+        root = self.memory_root if in_memory else self.root
+        try:
+            os.makedirs(root, exist_ok=True)
+            path = tempfile.mkdtemp(prefix=f"{DIR_PREFIX}{os.getpid()}_", dir=root)
+        except OSError:
+            if not in_memory:
+                raise
+            # tmpfs unavailable after all: fall back to disk
+            with self._lock:
+                self._used[True] -= expected_bytes
+            in_memory = False
+            os.makedirs(self.root, exist_ok=True)
+            path = tempfile.mkdtemp(prefix=f"{DIR_PREFIX}{os.getpid()}_", dir=self.root)
+        area = ScratchDir(self, path, in_memory)
+        if in_memory:
+            area.reserved[True] = area.credit = expected_bytes
+        with self._lock:
+            self._dirs[path] = area
+        return area
+
+    def _reserve(self, area: ScratchDir, nbytes: int):
+        with self._lock:
+            used = min(nbytes, area.credit)
+            area.credit -= used
+            nbytes -= used
+            if not nbytes:
+                return
+            if area.in_memory and self._used[True] + nbytes <= self.memory_total:
+                on_tmpfs = True
+            elif self._used[False] + nbytes <= self.quota:
+                # More than the declared size reached a tmpfs directory that is now full: the files
+                # cannot move mid-upload, so the overflow counts against the disk quota instead
+                on_tmpfs = False
+            else:
+                raise ScratchFull("Scratch space is full; retry later")
+            self._used[on_tmpfs] += nbytes
+            area.reserved[on_tmpfs] += nbytes
+
+    def release(self, path: Optional[str]):
+        """Delete a request directory and return its bytes to the quota."""
+        if not path:
+            return
+        with self._lock:
+            area = self._dirs.pop(path, None)
+            if area is not None:
+                self._used[False] -= area.reserved[False]
+                self._used[True] -= area.reserved[True]
+        shutil.rmtree(path, ignore_errors=True)
+
+    def sweep(self, keep: Iterable[str] = ()):
+        """Remove directories left by dead processes, except those still needed (e.g. queued jobs)."""
+        keep = set(keep)
+        for root in (self.root, self.memory_root):
+            try:
+                names = os.listdir(root) if root else []
+            except OSError:
+                continue
+            for name in names:
+                path = os.path.join(root, name)
+                pid = name[len(DIR_PREFIX):].split("_", 1)[0]
+                if not name.startswith(DIR_PREFIX) or path in keep or not pid.isdigit():
+                    continue
+                if int(pid) != os.getpid() and not pid_alive(int(pid)):
+                    logger.info("Removing abandoned scratch directory %s", path)
+                    shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"directories": len(self._dirs), "disk_bytes": self._used[False], "quota_bytes": self.quota,
+                    "memory_dir": self.memory_root or None, "memory_bytes": self._used[True],
+                    "memory_max_bytes": self.memory_total}
+
+def pid_alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+_scratch: Optional[ScratchSpace] = None
+
+def get_scratch_space() -> ScratchSpace:
+    global _scratch
+    if _scratch is None:
+        _scratch = ScratchSpace()
+    return _scratch
@@ -0,0 +1,110 @@
+import math
+import numpy as np
+from typing import List
+
+class QuantileSketch:
+    """
+    Mergeable KLL-style quantile sketch. Exact (plain median) until more than `k`
+    values have been seen; afterwards level h holds items of weight 2**h and the
+    rank error stays around 1/k regardless of input size.
+    """
+
+    def __init__(self, k: int = 4096, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self.levels) - h - 1
+        return max(8, int(self.k * (2 / 3) ** depth))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self._compress()
+
+    def merge(self, other: "QuantileSketch"):
+        for h, lvl in enumerate(other.levels):
+            if h == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[h] = np.concatenate([self.levels[h], lvl])
+        self.n += other.n
+        self._compress()
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                lvl = np.sort(self.levels[h])
+                keep = lvl[len(lvl) - len(lvl) % 2:]
+                promoted = lvl[int(self._rng.integers(2)):len(lvl) - len(keep):2]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+                self.levels[h] = keep
+            h += 1
+
+    def quantile(self, q: float) -> float:
+        if self.n == 0:
+            return math.nan
+        if len(self.levels) == 1:
+            return float(np.quantile(self.levels[0], q))
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lvl), 2 ** h, dtype=float) for h, lvl in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        cum = np.cumsum(weights[order])
+        idx = int(np.searchsorted(cum, q * cum[-1], side="left"))
+        return float(values[order][min(idx, len(values) - 1)])
+
+    def median(self) -> float:
+        return self.quantile(0.5)
+
+class CoMoments:
+    """Running count, means and co-moments for Pearson correlation; chunks merge with Chan's formulas."""
+
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_x = 0.0
+        self.m2_y = 0.0
+        self.c_xy = 0.0
+
+    def update(self, x, y):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        ok = ~(np.isnan(x) | np.isnan(y))
+        x, y = x[ok], y[ok]
+        if len(x) == 0:
+            return
+        other = CoMoments()
+        other.n = len(x)
+        other.mean_x = float(x.mean())
+        other.mean_y = float(y.mean())
+        dx, dy = x - other.mean_x, y - other.mean_y
+        other.m2_x = float(dx @ dx)
+        other.m2_y = float(dy @ dy)
+        other.c_xy = float(dx @ dy)
+        self.merge(other)
+
+    def merge(self, other: "CoMoments"):
+        if other.n == 0:
+            return
+        n = self.n + other.n
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        f = self.n * other.n / n
+        self.m2_x += other.m2_x + dx * dx * f
+        self.m2_y += other.m2_y + dy * dy * f
+        self.c_xy += other.c_xy + dx * dy * f
+        self.mean_x += dx * other.n / n
+        self.mean_y += dy * other.n / n
+        self.n = n
+
+    def corr(self) -> float:
+        if self.n < 2 or self.m2_x == 0 or self.m2_y == 0:
+            return math.nan
+        return self.c_xy / math.sqrt(self.m2_x * self.m2_y)
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import admission
+import app as app_module
+from admission import BatchGate, RouteGate
+from pipeline import Answer
+
+@pytest.fixture
+def gate(monkeypatch):
+    # One slot and one interactive waiting place on a fake route
+    gate = RouteGate("slow", limit=1, max_waiting=1)
+    monkeypatch.setattr(admission, "_gates", {"slow": gate})
+
+    async def fake_answer(qtext, uploads, timer, shed=True):
+        timer.route = "slow"
+        await gate.acquire(shed=shed)
+        try:
+            await asyncio.sleep(0.02)
+        finally:
+            gate.release()
+        return Answer(body=json.dumps({"q": qtext}).encode(), route="slow")
+
+    monkeypatch.setattr(app_module, "answer_question", fake_answer)
+    monkeypatch.setattr(app_module, "batch_gate", BatchGate(limit=1))
+    return gate
+
+async def post_batch(client, questions):
+    return await client.post("/api/batch/", files=[("questions", ("q.txt", json.dumps(questions).encode()))])
+
+async def post_single(client, question):
+    return await client.post("/api/", files=[("questions", ("q.txt", question.encode()))])
+
+def test_full_batch_next_to_a_single_request(gate):
+    async def run():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            batch = asyncio.create_task(post_batch(client, [f"b{i}" for i in range(12)]))
+            while gate.in_flight == 0:
+                await asyncio.sleep(0.001)
+            # Batch questions are parked on the route, but not in the interactive queue
+            assert gate.waiting == 0 and gate.stats()["waiting_unshed"] > 0
+            single = await post_single(client, "one")
+            return await batch, single
+
+    batch, single = asyncio.run(run())
+    assert single.status_code == 200 and single.json() == {"q": "one"}
+    results = batch.json()["results"]
+    assert [r["status"] for r in results] == [200] * 12
+    assert [r["result"]["q"] for r in results] == [f"b{i}" for i in range(12)]
+
+def test_batches_past_the_limit_are_shed_up_front(gate):
+    async def run():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = asyncio.create_task(post_batch(client, ["a", "b", "c"]))
+            while gate.in_flight == 0:
+                await asyncio.sleep(0.001)
+            second = await post_batch(client, ["d"])
+            return await first, second
+
+    first, second = asyncio.run(run())
+    assert first.status_code == 200
+    assert second.status_code == 503 and second.headers["retry-after"]
+
+def test_result_shape_in_question_order(gate, monkeypatch):
+    answer = app_module.answer_question
+
+    async def some_fail(qtext, uploads, timer, shed=True):
+        if qtext == "bad":
+            timer.route = "slow"
+            raise ValueError("boom")
+        return await answer(qtext, uploads, timer, shed)
+
+    monkeypatch.setattr(app_module, "answer_question", some_fail)
+    client = TestClient(app_module.app)
+    response = client.post("/api/batch/", files=[("questions", ("q1.txt", json.dumps(["one", "bad"]).encode())),
+                                                 ("questions", ("q2.txt", b"plain text question"))])
+    assert response.status_code == 200
+    assert response.json() == {"results": [
+        {"status": 200, "route": "slow", "cached": False, "result": {"q": "one"}},
+        {"status": 500, "route": "slow", "detail": "Internal error: boom"},
+        {"status": 200, "route": "slow", "cached": False, "result": {"q": "plain text question"}},
+    ]}
+
+def test_no_questions_is_a_bad_request(gate):
+    client = TestClient(app_module.app)
+    response = client.post("/api/batch/", files=[("questions", ("q.txt", b"[]"))])
+    assert response.status_code == 400
+
+def test_too_many_questions(gate, monkeypatch):
+    monkeypatch.setattr(app_module, "BATCH_MAX_QUESTIONS", 3)
+    client = TestClient(app_module.app)
+    response = client.post("/api/batch/", files=[("questions", ("q.txt", json.dumps(["a", "b", "c", "d"]).encode()))])
+    assert response.status_code == 413
+    assert client.post("/api/batch/", files=[("questions", ("q.txt", json.dumps(["a", "b", "c"]).encode()))]).status_code == 200
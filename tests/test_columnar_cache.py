@@ -0,0 +1,52 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+import columnar_cache
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(columnar_cache, "DATASET_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(columnar_cache, "_verified", {})
+    return tmp_path
+
+def leftover(cache_dir, name, size, age):
+    path = cache_dir / name
+    path.mkdir()
+    (path / "0.npy").write_bytes(b"x" * size)
+    stamp = time.time() - age
+    os.utime(path, (stamp, stamp))
+    return path
+
+def test_stale_temp_directories_are_removed(cache_dir):
+    stale = leftover(cache_dir, ".0123456789abcdef.killed", 10, columnar_cache.DATASET_CACHE_TMP_GRACE + 60)
+    fresh = leftover(cache_dir, ".fedcba9876543210.writing", 10, 0)
+    columnar_cache._evict()
+    assert not stale.exists() and fresh.exists()
+
+def test_writes_in_progress_count_toward_the_budget(cache_dir, monkeypatch):
+    frame = pd.DataFrame({"a": range(100)})
+    columnar_cache.store_frame("a" * 64, frame)
+    assert columnar_cache.has_frame("a" * 64)
+    entry_size = columnar_cache._dir_size(str(cache_dir / ("a" * 64)))
+    leftover(cache_dir, ".fedcba9876543210.writing", entry_size, 0)
+    monkeypatch.setattr(columnar_cache, "DATASET_CACHE_MAX_BYTES", entry_size + entry_size // 2)
+    columnar_cache._evict()
+    assert not columnar_cache.has_frame("a" * 64)
+
+def test_shared_directory_is_not_used(tmp_path, monkeypatch, caplog):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    monkeypatch.setattr(columnar_cache, "DATASET_CACHE_DIR", str(shared))
+    monkeypatch.setattr(columnar_cache, "_verified", {})
+    # An entry planted by another user for a known upload hash
+    columnar_cache.store_frame("b" * 64, pd.DataFrame({"a": range(10)}))
+    assert not (shared / ("b" * 64)).exists()
+    (shared / ("b" * 64)).mkdir()
+    (shared / ("b" * 64) / columnar_cache.SCHEMA_FILE).write_text('{"version": 1, "columns": []}')
+    assert not columnar_cache.has_frame("b" * 64)
+    assert columnar_cache.load_frame("b" * 64) is None
+    assert "Columnar cache disabled" in caplog.text
@@ -0,0 +1,106 @@
+import os
+
+import pytest
+
+from conftest import ROOT
+from csv_tools import _Table, answer_query, maybe_answer_with_builtins
+from io_utils import open_datasets
+from router import detect_output_spec
+
+SALES = os.path.join(ROOT, "sales", "sample-sales.csv")
+
+@pytest.fixture(scope="module")
+def sales():
+    return _Table(open_datasets({"sample-sales.csv": SALES})["sample-sales.csv"])
+
+@pytest.fixture(scope="module")
+def sales_units(tmp_path_factory):
+    # The sales fixture plus a units column (West rows: 5 + 7)
+    with open(SALES) as f:
+        lines = f.read().splitlines()
+    units = ["units", "3", "5", "4", "1", "2", "7", "6", "3"]
+    path = tmp_path_factory.mktemp("units") / "sales-units.csv"
+    path.write_text("\n".join(f"{line},{u}" for line, u in zip(lines, units)) + "\n")
+    return _Table(open_datasets({"sales-units.csv": str(path)})["sales-units.csv"])
+
+@pytest.mark.parametrize("question, expected", [
+    ("What is the total sales across all regions?", 1140.0),
+    ("What is the median sales amount across all orders?", 140.0),
+    ("Which region has the highest total sales?", "West"),
+    ("Which region has the most orders?", "East"),
+    ("How many orders have sales above 100?", 6),
+    ("What is the total sales in the East region?", 380.0),
+    ("How many regions are there?", 4),
+])
+def test_answers_modeled_questions(sales, question, expected):
+    assert answer_query(question, sales) == expected
+
+@pytest.mark.parametrize("question", [
+    "How many orders were placed in 2023?",
+    "How many orders were placed after 2024-01-05?",
+    "How many orders were placed before 2024-01-05?",
+    "How many orders were placed between 2024-01-02 and 2024-01-04?",
+    "How many orders were placed since January?",
+    "What is the average total sales per region?",
+    "What is the average daily sales?",
+    "What is the total monthly sales?",
+    "What is the total sales by region?",
+    "What were the sales on 2024-01-04?",
+    "Plot monthly sales as a line chart.",
+    "What is the average sales excluding the West region?",
+    "What is the maximum sales not in East?",
+    "What are the total sales except the North region?",
+    "What is the total sales for regions other than South?",
+    "What is the second highest sales?",
+    "What is the 3rd lowest sales amount?",
+    "How many orders have sales above 10%?",
+    "How many orders are 10% of the total?",
+])
+def test_unmodeled_qualifiers_fall_through(sales, question):
+    assert answer_query(question, sales) is None
+
+def test_builtins_fall_through_on_negation_and_ordinals():
+    for item in ("What is the average sales excluding the West region?", "What is the maximum sales not in East?",
+                 "What is the second highest sales?"):
+        question = ("Analyze `sample-sales.csv`.\n\nReturn a JSON object with keys:\n"
+                    f"- `answer`: number\n\nAnswer:\n1. {item}\n")
+        assert maybe_answer_with_builtins(question, {"sample-sales.csv": SALES},
+                                          output_spec=detect_output_spec(question)) is None
+
+@pytest.mark.parametrize("question, expected", [
+    ("What is the total number of units sold in the West?", 12),
+    ("How many units were sold?", 31),
+    ("How many orders were placed in the West region?", 2),
+])
+def test_counts_sum_a_named_measure(sales_units, question, expected):
+    assert answer_query(question, sales_units) == expected
+
+@pytest.mark.parametrize("question, expected", [
+    ("What is the total sales tax at 10%?", 114.0),
+    ("What is the total sales tax if the tax rate is 10%?", 114.0),
+    ("What is 15 percent of the average sales?", 21.375),
+])
+def test_percentages_are_applied(sales, question, expected):
+    assert answer_query(question, sales) == pytest.approx(expected)
+
+def test_date_values_are_not_filters(sales):
+    assert "date" not in sales.values()
+
+def test_whole_task_falls_through_on_one_unmodeled_part():
+    question = ("Analyze `sample-sales.csv`.\n\nReturn a JSON object with keys:\n"
+                "- `total_sales`: number\n- `orders_2023`: number\n\nAnswer:\n"
+                "1. What is the total sales across all regions?\n"
+                "2. How many orders were placed in 2023?\n")
+    result = maybe_answer_with_builtins(question, {"sample-sales.csv": SALES},
+                                        output_spec=detect_output_spec(question))
+    assert result is None
+
+def test_sales_fixture_task():
+    with open(os.path.join(ROOT, "sales", "questions.txt")) as f:
+        question = f.read()
+    result = maybe_answer_with_builtins(question, {"sample-sales.csv": SALES},
+                                        output_spec=detect_output_spec(question))
+    assert result["total_sales"] == 1140.0
+    assert result["top_region"] == "West"
+    assert result["median_sales"] == 140.0
+    assert result["total_sales_tax"] == pytest.approx(114.0)
@@ -0,0 +1,35 @@
+import base64
+
+import json_response
+from executor import exec_plan, png_base64, png_image
+from images import PngImage
+from plot_utils import new_subplots
+
+def figure():
+    fig, ax = new_subplots(figsize=(2, 2))
+    ax.plot([0, 1], [1, 0])
+    return fig
+
+def test_png_base64_returns_text():
+    b64 = png_base64(figure(), max_bytes=50_000)
+    assert type(b64) is str and b64.startswith("iVBOR")
+    assert ("data:image/png;base64," + b64).startswith("data:image/png;base64,iVBOR")
+    assert base64.b64decode(b64).startswith(b"\x89PNG")
+
+def test_png_image_is_raw_bytes_encoded_on_serialization():
+    img = png_image(figure(), max_bytes=50_000)
+    assert isinstance(img, PngImage) and img.startswith(b"\x89PNG")
+    assert json_response.dumps({"plot": img}) == json_response.dumps({"plot": img.to_base64()})
+
+def test_plans_using_either_helper():
+    code = ("import matplotlib.pyplot as plt\n"
+            "fig, ax = plt.subplots()\n"
+            "ax.plot([1, 2], [3, 4])\n"
+            "uri = 'data:image/png;base64,' + png_base64(fig, max_bytes=80000)\n"
+            "assert png_base64(fig).startswith('iVBOR')\n"
+            "img = png_image(fig, max_bytes=80000)\n"
+            "assert_image_under_limit(img, 80000)\n"
+            "RESULT = {'uri': uri, 'img': img}\n")
+    result = exec_plan([{"type": "python", "code": code}], {})
+    assert result["uri"].startswith("data:image/png;base64,iVBOR")
+    assert isinstance(result["img"], PngImage)
@@ -0,0 +1,49 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from jobs import JobQueue, JobStore, QueueFull
+
+@pytest.fixture
+def store(tmp_path):
+    store = JobStore(str(tmp_path / "jobs" / "jobs.sqlite3"))
+    yield store
+    store.close()
+
+def test_store_directory_is_private(store, tmp_path):
+    assert os.stat(tmp_path / "jobs").st_mode & 0o777 == 0o700
+
+def test_shared_directory_is_refused(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        JobStore(str(shared / "jobs.sqlite3"))
+
+def test_concurrent_reads_and_writes(store):
+    ids = [store.create(f"q{i}", {"a.csv": "/nonexistent"}, {"a.csv": "h"}, "/tmp/x") for i in range(20)]
+
+    def churn(job_id):
+        store.mark_running(job_id)
+        assert store.get(job_id)["status"] == "running"
+        store.finish(job_id, "sales", 200, result=job_id.encode())
+        return store.get(job_id)["result"]
+
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(churn, ids)) == [i.encode() for i in ids]
+    assert store.counts() == {"done": 20}
+
+def test_concurrent_submits_respect_the_bound(store):
+    async def run():
+        queue = JobQueue(store, workers=0, maxsize=3)
+        await queue.start()
+        results = await asyncio.gather(*(queue.submit("q", {}, {}, "") for _ in range(5)),
+                                       return_exceptions=True)
+        await queue.stop()
+        return results
+
+    results = asyncio.run(run())
+    assert sum(isinstance(r, str) for r in results) == 3
+    assert sum(isinstance(r, QueueFull) for r in results) == 2
@@ -0,0 +1,37 @@
+import json
+
+import numpy as np
+import pytest
+
+import json_response
+from images import PngImage
+
+CONTENT = {
+    "count": np.int64(7),
+    "mean": np.float32(2.5),
+    "corr": np.float64("nan"),
+    "ratio": float("inf"),
+    "values": np.array([1.5, np.nan, -np.inf, 3.0]),
+    "matrix": np.arange(6).reshape(2, 3),
+    "nested": [{"x": float("-inf")}, (1, float("nan"))],
+    "chart": PngImage(b"\x89PNG\r\n"),
+    "text": "Ünïcode",
+    "empty": np.array([]),
+}
+EXPECTED = {
+    "count": 7, "mean": 2.5, "corr": None, "ratio": None,
+    "values": [1.5, None, None, 3.0], "matrix": [[0, 1, 2], [3, 4, 5]],
+    "nested": [{"x": None}, [1, None]], "chart": PngImage(b"\x89PNG\r\n").to_base64(),
+    "text": "Ünïcode", "empty": [],
+}
+
+def test_stdlib_fallback(monkeypatch):
+    monkeypatch.setattr(json_response, "orjson", None)
+    assert json.loads(json_response.dumps(CONTENT)) == EXPECTED
+
+def test_orjson_and_fallback_bodies_match(monkeypatch):
+    if json_response.orjson is None:
+        pytest.skip("orjson is not installed")
+    with_orjson = json_response.dumps(CONTENT)
+    monkeypatch.setattr(json_response, "orjson", None)
+    assert json.loads(with_orjson) == json.loads(json_response.dumps(CONTENT)) == EXPECTED
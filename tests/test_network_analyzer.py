@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import network_analyzer
+from network_analyzer import _csr_stats, _nx_stats
+
+SCALARS = ("edge_count", "highest_degree_node", "average_degree", "density", "shortest_path_alice_eve")
+
+def assert_same_stats(df: pd.DataFrame):
+    # networkx is the correctness oracle for the CSR engine
+    csr, ref = _csr_stats(df), _nx_stats(df)
+    for key in SCALARS:
+        if isinstance(ref[key], float):
+            assert csr[key] == pytest.approx(ref[key], abs=1e-12), key
+        else:
+            assert csr[key] == ref[key], key
+    assert sorted(csr["degrees"].tolist()) == sorted(ref["degrees"].tolist())
+
+@pytest.mark.parametrize("seed", range(25))
+def test_random_named_graphs(seed):
+    rng = np.random.default_rng(seed)
+    n, m = int(rng.integers(1, 40)), int(rng.integers(1, 80))
+    names = np.array(["Alice", "Bob", "Eve", "carol", "dave"] + [f"n{i}" for i in range(n)], dtype=object)
+    assert_same_stats(pd.DataFrame({"source": rng.choice(names, m), "target": rng.choice(names, m)}))
+
+@pytest.mark.parametrize("seed", range(25))
+def test_random_integer_label_graphs(seed):
+    rng = np.random.default_rng(seed)
+    n, m = int(rng.integers(1, 40)), int(rng.integers(1, 80))
+    assert_same_stats(pd.DataFrame({"source": rng.integers(0, n, m), "target": rng.integers(0, n, m)}))
+
+def test_disconnected_graph():
+    # Alice and Eve in different components: no path
+    assert_same_stats(pd.DataFrame({"source": ["Alice", "Bob", "Eve", "Frank"],
+                                    "target": ["Bob", "Carol", "Frank", "Grace"]}))
+
+def test_self_loops_and_duplicate_edges():
+    assert_same_stats(pd.DataFrame({"source": ["Alice", "Alice", "Bob", "Bob", "Eve", "Carol"],
+                                    "target": ["Alice", "Bob", "Alice", "Eve", "Eve", "Carol"]}))
+
+def test_mixed_case_endpoints():
+    assert_same_stats(pd.DataFrame({"source": ["ALICE", "bob"], "target": ["bob", "eve"]}))
+
+def test_csr_failure_falls_back_and_is_counted(monkeypatch, caplog):
+    class FakeDataset:
+        name = "edges.csv"
+        frame = pd.DataFrame({"source": ["Alice", "Bob"], "target": ["Bob", "Eve"]})
+
+    def broken(df):
+        raise RuntimeError("engine bug")
+
+    monkeypatch.setattr(network_analyzer, "_csr_stats", broken)
+    before = dict(network_analyzer.NETWORK_FALLBACKS._values)
+    stats = network_analyzer._graph_stats(FakeDataset())
+    assert stats["edge_count"] == 2
+    assert sum(network_analyzer.NETWORK_FALLBACKS._values.values()) == sum(before.values()) + 1
+    assert "CSR network engine failed" in caplog.text
@@ -0,0 +1,77 @@
+import json
+import os
+
+import pytest
+
+from plan_cache import PlanCache, plan_digest
+
+PLAN = [{"type": "python", "code": "RESULT = {'a': 1}"}]
+EVIL = [{"type": "python", "code": "import os; RESULT = os.listdir('/')"}]
+KEY = "f" * 64
+
+@pytest.fixture
+def disk(tmp_path):
+    return str(tmp_path / "plans")
+
+def entry_path(disk):
+    return os.path.join(disk, f"{KEY}.json")
+
+def rewrite(disk, change):
+    with open(entry_path(disk), "rb") as f:
+        mac, _, body = f.read().partition(b"\n")
+    mac, body = change(mac, body)
+    with open(entry_path(disk), "wb") as f:
+        f.write(mac + b"\n" + body)
+
+def test_signed_entry_survives_a_restart(disk):
+    PlanCache(disk_dir=disk).put(KEY, PLAN)
+    assert PlanCache(disk_dir=disk).get(KEY) == PLAN
+    assert oct(os.stat(disk).st_mode & 0o777) == "0o700"
+
+def test_tampered_plan_is_ignored(disk, caplog):
+    PlanCache(disk_dir=disk).put(KEY, PLAN)
+
+    def swap_plan(mac, body):
+        entry = json.loads(body)
+        entry["plan"], entry["digest"] = EVIL, plan_digest(EVIL)
+        return mac, json.dumps(entry).encode()
+
+    rewrite(disk, swap_plan)
+    assert PlanCache(disk_dir=disk).get(KEY) is None
+    assert "bad signature" in caplog.text
+
+def test_entry_signed_with_another_key_is_ignored(disk, tmp_path):
+    # A file planted by someone without this directory's key
+    other = PlanCache(disk_dir=str(tmp_path / "other"))
+    other.put(KEY, EVIL)
+    os.makedirs(disk, exist_ok=True)
+    PlanCache(disk_dir=disk)
+    with open(os.path.join(str(tmp_path / "other"), f"{KEY}.json"), "rb") as src, open(entry_path(disk), "wb") as dst:
+        dst.write(src.read())
+    assert PlanCache(disk_dir=disk).get(KEY) is None
+
+def test_unsigned_or_truncated_entries_are_ignored(disk):
+    PlanCache(disk_dir=disk).put(KEY, PLAN)
+    rewrite(disk, lambda mac, body: (b"", body))
+    assert PlanCache(disk_dir=disk).get(KEY) is None
+    PlanCache(disk_dir=disk).put(KEY, PLAN)
+    rewrite(disk, lambda mac, body: (mac, body[:-5]))
+    assert PlanCache(disk_dir=disk).get(KEY) is None
+
+def test_shared_directory_keeps_plans_in_memory(tmp_path, caplog):
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    cache = PlanCache(disk_dir=str(shared))
+    cache.put(KEY, PLAN)
+    assert cache.disk_dir == "" and cache.get(KEY) == PLAN
+    assert os.listdir(shared) == []
+    assert "memory only" in caplog.text
+
+def test_failed_plan_is_never_served_again(disk):
+    cache = PlanCache(disk_dir=disk)
+    cache.put(KEY, PLAN)
+    cache.record(KEY, PLAN, ok=False)
+    assert cache.get(KEY) is None
+    cache.put(KEY, PLAN)
+    assert PlanCache(disk_dir=disk).get(KEY) is None
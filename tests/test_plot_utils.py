@@ -0,0 +1,89 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+from metrics import PNG_FALLBACKS, capture_samples
+from plot_utils import MIN_DPI, downsample_line, new_subplots, png_bytes_under_limit
+
+def noisy_figure(seed=0, figsize=(6, 4)):
+    # Random scatter compresses badly, so the first render is large
+    rng = np.random.default_rng(seed)
+    fig, ax = new_subplots(figsize=figsize)
+    ax.scatter(rng.random(4000), rng.random(4000), c=rng.random(4000), s=4, cmap="viridis")
+    ax.set_title("noise")
+    return fig
+
+def simple_figure():
+    fig, ax = new_subplots(figsize=(3, 2))
+    ax.plot([0, 1, 2], [1, 0, 1])
+    return fig
+
+def size(data):
+    with Image.open(io.BytesIO(data)) as img:
+        img.verify()
+    return Image.open(io.BytesIO(data)).size
+
+def fallbacks(samples):
+    return sum(1 for name, _ in samples if name == PNG_FALLBACKS.name)
+
+def test_fitting_render_is_returned_as_is():
+    with capture_samples() as samples:
+        data = png_bytes_under_limit(simple_figure(), max_bytes=100_000)
+    assert data.startswith(b"\x89PNG") and len(data) <= 100_000
+    assert fallbacks(samples) == 0
+
+def test_oversized_render_is_shrunk_under_the_limit():
+    full = png_bytes_under_limit(noisy_figure(), max_bytes=10 ** 9)
+    limit = len(full) // 3
+    with capture_samples() as samples:
+        data = png_bytes_under_limit(noisy_figure(), max_bytes=limit)
+    assert len(data) <= limit
+    assert fallbacks(samples) >= 1
+    (w, h), (fw, fh) = size(data), size(full)
+    assert w <= fw and h <= fh
+
+def test_resolution_never_drops_below_min_dpi():
+    start_dpi = 110
+    full_w, _ = size(png_bytes_under_limit(noisy_figure(), max_bytes=10 ** 9, start_dpi=start_dpi))
+    # Nothing fits 1 kB: the smallest candidate comes back, at no less than MIN_DPI
+    data = png_bytes_under_limit(noisy_figure(), max_bytes=1_000, start_dpi=start_dpi)
+    w, _ = size(data)
+    assert len(data) > 1_000
+    assert w >= int(full_w * MIN_DPI / start_dpi) - 1
+
+def buckets(n, width_px):
+    # The bins downsample_line assigns to evenly spaced positions
+    pos = np.arange(n, dtype=float)
+    return np.minimum((pos * (width_px / (n - 1))).astype(np.int64), width_px - 1)
+
+def test_downsample_keeps_first_last_min_max_of_each_bucket():
+    rng = np.random.default_rng(0)
+    n, width = 10_000, 100
+    x = np.arange(n)
+    y = rng.normal(size=n).cumsum()
+    y[1234] = 500.0   # a spike the plot must still show
+    xs, ys = downsample_line(x, y, width)
+    assert len(xs) <= 4 * width and np.all(np.diff(xs) > 0)
+    kept = set(xs.tolist())
+    bins = buckets(n, width)
+    for b in range(width):
+        rows = np.flatnonzero(bins == b)
+        expected = {rows[0], rows[-1], rows[np.argmin(y[rows])], rows[np.argmax(y[rows])]}
+        assert expected <= kept, b
+    assert 500.0 in ys.tolist()
+    np.testing.assert_array_equal(ys, y[xs])
+
+def test_downsample_datetime_x():
+    n = 5_000
+    x = np.datetime64("2024-01-01") + np.arange(n).astype("timedelta64[h]")
+    y = np.sin(np.arange(n) / 50.0)
+    xs, ys = downsample_line(x, y, 50)
+    assert xs.dtype == x.dtype and len(xs) <= 200
+    assert xs[0] == x[0] and xs[-1] == x[-1]
+    assert ys.max() == y.max() and ys.min() == y.min()
+
+def test_short_series_are_unchanged():
+    x, y = np.arange(40), np.arange(40.0)
+    xs, ys = downsample_line(x, y, 10)
+    assert xs is x and ys is y
@@ -0,0 +1,50 @@
+import time
+
+from response_cache import ResponseCache, response_key
+
+def test_hits_and_misses():
+    cache = ResponseCache(max_bytes=1000, ttl=0)
+    assert cache.get("a") is None
+    cache.put("a", b"body")
+    assert cache.get("a") == b"body"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"], stats["bytes"]) == (1, 1, 1, 4)
+
+def test_least_recently_used_is_evicted_by_bytes():
+    cache = ResponseCache(max_bytes=10, ttl=0)
+    cache.put("a", b"aaaa")
+    cache.put("b", b"bbbb")
+    cache.get("a")  # b is now the least recently used
+    cache.put("c", b"cccc")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"aaaa" and cache.get("c") == b"cccc"
+    assert cache.stats()["evictions"] == 1 and cache.stats()["bytes"] == 8
+
+def test_oversized_body_is_not_cached():
+    cache = ResponseCache(max_bytes=4, ttl=0)
+    cache.put("big", b"12345")
+    assert cache.get("big") is None and cache.stats()["bytes"] == 0
+
+def test_expired_entries_miss(monkeypatch):
+    cache = ResponseCache(max_bytes=100, ttl=60)
+    cache.put("a", b"x")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+def test_disk_tier_is_shared_between_instances(tmp_path):
+    first = ResponseCache(max_bytes=100, ttl=0, disk_dir=str(tmp_path))
+    second = ResponseCache(max_bytes=100, ttl=0, disk_dir=str(tmp_path))
+    first.put("k" * 64, b"shared")
+    assert second.get("k" * 64) == b"shared"
+    assert second.stats()["disk_hits"] == 1
+    # Now in the second instance's memory tier too
+    assert second.get("k" * 64) == b"shared" and second.stats()["disk_hits"] == 1
+
+def test_key_ignores_whitespace_but_not_files_or_route():
+    files = {"a.csv": "h1"}
+    base = response_key("What is the total?\n", files, "csv")
+    assert response_key("  What is   the total?", files, "csv") == base
+    assert response_key("What is the total?", {"a.csv": "h2"}, "csv") != base
+    assert response_key("What is the total?", files, "llm") != base
@@ -0,0 +1,45 @@
+import pytest
+
+from router import decide_route
+
+FILMS_Q = ("Scrape the list of highest grossing films from Wikipedia: "
+           "https://en.wikipedia.org/wiki/List_of_highest-grossing_films")
+SALES = "order_id,date,region,sales\n1,2024-01-01,East,100\n2,2024-01-02,West,200\n"
+WEATHER = "date,temperature_c,precip_mm\n2024-01-01,5,0.0\n2024-01-02,7,1.2\n"
+EDGES = "source,target\nAlice,Bob\nBob,Carol\n"
+TEXT2 = "a,b\nx,y\nz,w\n"
+NUMS2 = "a,b\n1,2\n3,4\n"
+
+# Routes of the original detector cascade: sales (columns or file name) before films
+# (question) before network (two text columns or edge/node file name) before weather
+CASES = [
+    ("sales columns", "Analyze it.", [("data.csv", SALES)], "sales"),
+    ("sales file name, text columns", "Analyze it.", [("sales.csv", TEXT2)], "sales"),
+    ("sales file name beside weather", "Analyze it.",
+     [("my_sales.csv", NUMS2), ("sample-weather.csv", WEATHER)], "sales"),
+    ("weather before sales file", "Analyze it.",
+     [("sample-weather.csv", WEATHER), ("my_sales.csv", NUMS2)], "sales"),
+    ("sales file beats films question", FILMS_Q, [("sales_2024.csv", NUMS2)], "sales"),
+    ("films question", FILMS_Q, [], "films"),
+    ("films question beats edge list", FILMS_Q, [("edges.csv", EDGES)], "films"),
+    ("films question needs both phrases", "List the highest grossing films.", [], "llm"),
+    ("edge list", "Analyze it.", [("edges.csv", EDGES)], "network"),
+    ("two text columns", "Analyze it.", [("links.csv", TEXT2)], "network"),
+    ("node file name, numeric columns", "Analyze it.", [("node_pairs.csv", NUMS2)], "network"),
+    ("edge file name, three columns", "Analyze it.", [("edges.csv", "a,b,c\nx,y,z\n")], "llm"),
+    ("network before weather", "Analyze it.",
+     [("sample-weather.csv", WEATHER), ("edges.csv", EDGES)], "network"),
+    ("weather columns", "Analyze it.", [("readings.csv", WEATHER)], "weather"),
+    ("weather file name", "Analyze it.", [("weather.csv", "a,b,c\n1,2,3\n")], "weather"),
+    ("numeric columns", "Analyze it.", [("numbers.csv", NUMS2)], "llm"),
+    ("no files", "What is 2 + 2?", [], "llm"),
+]
+
+@pytest.mark.parametrize("question, files, expected", [c[1:] for c in CASES], ids=[c[0] for c in CASES])
+def test_routes_like_the_original_detectors(tmp_path, question, files, expected):
+    file_map = {}
+    for name, content in files:
+        path = tmp_path / name
+        path.write_text(content)
+        file_map[name] = str(path)
+    assert decide_route(question, file_map)["type"] == expected
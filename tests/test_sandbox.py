@@ -0,0 +1,60 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sandbox import PlanTimeout, SandboxCrash, SandboxPool
+
+PLAN_OK = [{"type": "python", "code": "RESULT = {'answer': 42}"}]
+
+def plan(code):
+    return [{"type": "python", "code": code}]
+
+@pytest.fixture(scope="module")
+def pool():
+    pool = SandboxPool(size=1, cpu_sec=60, memory_mb=1024, max_jobs=50)
+    pool.start()
+    yield pool
+    pool.shutdown()
+
+def run(pool, steps, timeout_sec=30):
+    return asyncio.run(pool.run(steps, {}, timeout_sec))
+
+def test_runs_a_plan(pool):
+    assert run(pool, PLAN_OK) == {"answer": 42}
+
+def test_runaway_plan_is_killed_and_the_worker_replaced(pool):
+    start = time.monotonic()
+    with pytest.raises(PlanTimeout):
+        run(pool, plan("while True:\n    pass\n"), timeout_sec=1)
+    assert time.monotonic() - start < 10
+    assert run(pool, PLAN_OK) == {"answer": 42}
+
+def test_plan_over_the_memory_limit(pool):
+    with pytest.raises(RuntimeError, match="MemoryError"):
+        run(pool, plan("blob = bytearray(4 * 1024 ** 3)\nRESULT = {'n': len(blob)}"))
+    assert run(pool, PLAN_OK) == {"answer": 42}
+
+def test_crashed_worker_is_replaced(pool):
+    with pytest.raises(SandboxCrash):
+        run(pool, plan("import os\nos._exit(3)"))
+    assert run(pool, PLAN_OK) == {"answer": 42}
+
+def test_waiting_plans_do_not_use_the_default_executor(pool):
+    async def main():
+        loop = asyncio.get_running_loop()
+        # One default-executor thread: a plan parked on it would block to_thread below
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=1))
+        slow = plan("import time\ntime.sleep(0.5)\nRESULT = {'answer': 42}")
+        plans = [asyncio.create_task(pool.run(slow, {}, 30)) for _ in range(4)]
+        await asyncio.sleep(0.1)
+        # With one sandbox worker busy, to_thread still gets a thread straight away
+        start = time.monotonic()
+        await asyncio.to_thread(lambda: None)
+        waited = time.monotonic() - start
+        return waited, await asyncio.gather(*plans)
+
+    waited, results = asyncio.run(main())
+    assert waited < 0.2
+    assert results == [{"answer": 42}] * 4
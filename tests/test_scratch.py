@@ -0,0 +1,36 @@
+import pytest
+
+from scratch import ScratchFull, ScratchSpace
+
+@pytest.fixture
+def space(tmp_path):
+    return ScratchSpace(root=str(tmp_path / "disk"), quota=100, memory_root=str(tmp_path / "mem"),
+                        memory_max=8, memory_total=10)
+
+def test_tmpfs_is_reserved_at_allocation(space):
+    first, second = space.allocate(8), space.allocate(8)
+    # The second request no longer counts on tmpfs room the first one already holds
+    assert first.in_memory and not second.in_memory
+    first.reserve(8)
+    second.reserve(8)
+    assert space.stats()["memory_bytes"] == 8 and space.stats()["disk_bytes"] == 8
+
+def test_tmpfs_overflow_is_charged_to_disk(space):
+    area = space.allocate(4)
+    area.reserve(4)
+    area.reserve(20)
+    stats = space.stats()
+    assert stats["memory_bytes"] == 4 and stats["disk_bytes"] == 20
+    space.release(area.path)
+    assert space.stats()["memory_bytes"] == 0 and space.stats()["disk_bytes"] == 0
+
+def test_full_when_both_budgets_are_used(space):
+    area = space.allocate(8)
+    with pytest.raises(ScratchFull):
+        area.reserve(8 + 2 + 101)
+
+def test_release_returns_unused_reservation(space):
+    area = space.allocate(8)
+    area.reserve(3)
+    space.release(area.path)
+    assert space.allocate(8).in_memory
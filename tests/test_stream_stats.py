@@ -0,0 +1,89 @@
+import math
+
+import numpy as np
+import pytest
+
+from stream_stats import CoMoments, QuantileSketch
+
+QS = np.linspace(0.01, 0.99, 25)
+
+def rank_error(sketch, data):
+    ordered = np.sort(data)
+    return max(abs(np.searchsorted(ordered, sketch.quantile(q), side="right") / len(ordered) - q) for q in QS)
+
+def chunks(data, n, seed):
+    # Uneven chunk boundaries, including empty chunks
+    cuts = np.sort(np.random.default_rng(seed).integers(0, len(data), n))
+    return np.split(data, cuts)
+
+def test_sketch_is_exact_below_k():
+    data = np.random.default_rng(1).normal(size=500)
+    sketch = QuantileSketch(k=1024)
+    sketch.update(data)
+    for q in QS:
+        assert sketch.quantile(q) == pytest.approx(np.quantile(data, q))
+
+@pytest.mark.parametrize("k", [64, 256, 1024])
+@pytest.mark.parametrize("seed", range(3))
+def test_sketch_rank_error(k, seed):
+    # Documented rank error is about 1/k; allow a small constant factor
+    data = np.random.default_rng(seed).lognormal(size=100_000)
+    sketch = QuantileSketch(k=k, seed=seed)
+    for part in chunks(data, 40, seed):
+        sketch.update(part)
+    assert sketch.n == len(data)
+    assert rank_error(sketch, data) <= 4 / k
+
+def test_merged_sketches_match_one_stream():
+    rng = np.random.default_rng(7)
+    data = np.concatenate([rng.normal(0, 1, 30_000), rng.exponential(5, 50_000)])
+    merged = QuantileSketch(k=256, seed=1)
+    for i, part in enumerate(chunks(data, 12, 3)):
+        sketch = QuantileSketch(k=256, seed=i)
+        sketch.update(part)
+        merged.merge(sketch)
+    assert merged.n == len(data)
+    assert rank_error(merged, data) <= 4 / 256
+
+def test_sketch_skips_nan_and_handles_empty_input():
+    sketch = QuantileSketch(k=64)
+    assert math.isnan(sketch.median())
+    sketch.update([])
+    sketch.update([np.nan, 3.0, np.nan])
+    assert sketch.n == 1 and sketch.median() == 3.0
+
+def test_comoments_match_numpy_across_chunks():
+    rng = np.random.default_rng(3)
+    x = rng.normal(100, 15, 20_000)
+    y = 0.3 * x + rng.normal(0, 5, 20_000)
+    total = CoMoments()
+    for cx, cy in zip(chunks(x, 25, 4), chunks(y, 25, 4)):
+        part = CoMoments()
+        part.update(cx, cy)
+        total.merge(part)
+    assert total.n == len(x)
+    assert total.corr() == pytest.approx(np.corrcoef(x, y)[0, 1], rel=1e-9)
+    assert total.m2_x / total.n == pytest.approx(np.var(x), rel=1e-9)
+    assert total.m2_y / total.n == pytest.approx(np.var(y), rel=1e-9)
+    assert (total.mean_x, total.mean_y) == pytest.approx((x.mean(), y.mean()), rel=1e-12)
+
+def test_comoments_single_rows_and_empty_chunks():
+    rng = np.random.default_rng(5)
+    x, y = rng.normal(size=50), rng.normal(size=50)
+    total = CoMoments()
+    total.update([], [])
+    total.merge(CoMoments())
+    for xi, yi in zip(x, y):
+        total.update([xi], [yi])
+        total.update([np.nan], [yi])
+    assert total.n == 50
+    assert total.corr() == pytest.approx(np.corrcoef(x, y)[0, 1], rel=1e-9)
+    assert total.m2_x / total.n == pytest.approx(np.var(x), rel=1e-9)
+
+def test_comoments_undefined_correlation():
+    single = CoMoments()
+    single.update([1.0], [2.0])
+    assert math.isnan(single.corr())
+    constant = CoMoments()
+    constant.update([1.0, 1.0, 1.0], [1.0, 2.0, 3.0])
+    assert math.isnan(constant.corr())
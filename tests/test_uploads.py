@@ -0,0 +1,66 @@
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from scratch import SCRATCH_MEMORY_DIR, SCRATCH_MEMORY_MAX_BYTES
+from uploads import RequestSizeLimit
+
+LIMIT = 64 * 1024
+BOUNDARY = "xyzzy"
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(RequestSizeLimit, max_bytes=LIMIT)
+    seen = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        seen.append(file.filename)
+        return {"size": len(await file.read())}
+
+    return TestClient(app), seen
+
+def multipart(size):
+    head = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.csv\"\r\n"
+            "Content-Type: text/csv\r\n\r\n").encode()
+    return head + b"x" * size + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+def chunked(body, step=4096):
+    # A generator body is sent without Content-Length
+    for i in range(0, len(body), step):
+        yield body[i:i + step]
+
+def post(client, body, stream):
+    return client.post("/upload", content=chunked(body) if stream else body,
+                       headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"})
+
+def test_within_limit_passes():
+    client, seen = make_client()
+    for stream in (False, True):
+        assert post(client, multipart(1000), stream).json() == {"size": 1000}
+    assert seen == ["a.csv", "a.csv"]
+
+def test_declared_length_over_limit():
+    client, seen = make_client()
+    assert post(client, multipart(LIMIT), stream=False).status_code == 413
+    assert seen == []
+
+def test_chunked_body_over_limit_is_cut_off():
+    client, seen = make_client()
+    response = post(client, multipart(4 * LIMIT), stream=True)
+    assert response.status_code == 413
+    assert response.json() == {"detail": f"Request exceeds {LIMIT} bytes"}
+    assert seen == []
+
+@pytest.mark.skipif(not SCRATCH_MEMORY_DIR, reason="no memory scratch directory")
+def test_parts_that_fit_the_memory_scratch_are_not_spooled_to_disk():
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"on_disk": file.file._rolled}
+
+    client = TestClient(app)
+    small, large = SCRATCH_MEMORY_MAX_BYTES // 2, SCRATCH_MEMORY_MAX_BYTES + 1024
+    assert post(client, multipart(small), stream=False).json() == {"on_disk": False}
+    assert post(client, multipart(large), stream=False).json() == {"on_disk": True}
@@ -0,0 +1,34 @@
+import os
+import signal
+import asyncio
+
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import workers
+
+@pytest.fixture
+def process_backend(monkeypatch):
+    monkeypatch.setattr(workers, "ANALYZER_BACKEND", "process")
+    monkeypatch.setattr(workers, "ANALYZER_WORKERS", 1)
+    workers.shutdown_workers()
+    yield
+    workers.shutdown_workers()
+
+def test_killed_worker_is_replaced_and_the_call_retried(process_backend):
+    async def scenario():
+        pid = await workers.run_analyzer("os:getpid")
+        os.kill(pid, signal.SIGKILL)
+        return pid, await workers.run_analyzer("os:getpid")
+
+    old_pid, new_pid = asyncio.run(scenario())
+    assert new_pid != old_pid
+
+def test_crashing_analyzer_is_retried_once_then_raises(process_backend):
+    async def scenario():
+        with pytest.raises(BrokenProcessPool):
+            await workers.run_analyzer("os:_exit", 1)
+        return await workers.run_analyzer("operator:add", 2, 3)
+
+    assert asyncio.run(scenario()) == 5
@@ -0,0 +1,68 @@
+import pytest
+import yaml
+
+import yaml_utils
+from yaml_utils import YAML_MAX_DEPTH, YamlLimitExceeded, load_yaml_files_merged
+
+def nested(depth):
+    return "a: " + "[" * (depth - 1) + "1" + "]" * (depth - 1)
+
+def write(tmp_path, text):
+    path = tmp_path / "doc.yaml"
+    path.write_text(text)
+    return {"doc.yaml": str(path)}
+
+def test_single_parse_matches_safe_load(tmp_path):
+    text = "k: &a {z: 1}\nm:\n  <<: *a\n  y: [1, 2.5, null, true, 2024-01-02]\n"
+    assert load_yaml_files_merged(write(tmp_path, text))["files"]["doc.yaml"] == yaml.safe_load(text)
+
+def test_depth_limit_in_load(tmp_path, monkeypatch):
+    files = write(tmp_path, nested(YAML_MAX_DEPTH))
+    assert load_yaml_files_merged(files)["files"]["doc.yaml"]["a"]
+    files = write(tmp_path, nested(YAML_MAX_DEPTH + 1))
+    assert "YAML limit exceeded" in load_yaml_files_merged(files)["files"]["doc.yaml"]["__error__"]
+    # The load must not rely on the summary scan for its depth check
+    monkeypatch.setattr(yaml_utils, "scan_top_level_keys", lambda text: [])
+    with pytest.raises(YamlLimitExceeded):
+        yaml_utils._safe_load_yaml_path(files["doc.yaml"])
+
+def test_very_deep_input_is_rejected_not_crashing(tmp_path):
+    files = write(tmp_path, "[" * 100000 + "]" * 100000)
+    assert "YAML limit exceeded" in load_yaml_files_merged(files)["files"]["doc.yaml"]["__error__"]
+
+def test_multi_document_stream_is_an_error(tmp_path):
+    files = write(tmp_path, "a: 1\n---\nb: 2\n")
+    assert "__error__" in load_yaml_files_merged(files)["files"]["doc.yaml"]
+    assert load_yaml_files_merged(files, summary_only=True) == {"__summary__": {"count": 1, "keys": []}}
+
+def test_plan_summary_scan_runs_off_the_event_loop(tmp_path, monkeypatch):
+    import asyncio
+    import threading
+
+    import pipeline
+    from metrics import RequestTimer
+
+    files = write(tmp_path, "a: 1\nb: [2]\n")
+    threads = []
+    scan = yaml_utils.scan_top_level_keys
+    monkeypatch.setattr(yaml_utils, "scan_top_level_keys", lambda text: threads.append(threading.get_ident()) or scan(text))
+    monkeypatch.setattr(pipeline.plan_cache, "get", lambda key: None)
+
+    class Planned(Exception):
+        pass
+
+    async def plan_with_llm(qtext, data_spec, output_spec):
+        assert data_spec["yaml_summary"] == {"count": 1, "keys": ["a", "b"]}
+        raise Planned()
+
+    monkeypatch.setattr(pipeline, "plan_with_llm", plan_with_llm)
+    uploads = pipeline.UploadSet(file_map=files, file_hashes={}, datasets={}, tempdir=str(tmp_path),
+                                 yaml_context=yaml_utils.load_yaml_context(files))
+
+    async def run():
+        with pytest.raises(Planned):
+            await pipeline._plan_result("q", {}, uploads, RequestTimer())
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+    assert threads and loop_thread not in threads
@@ -0,0 +1,143 @@
+import os
+import hashlib
+from typing import Any, List, Optional, Tuple
+from fastapi import UploadFile
+from fastapi.responses import JSONResponse
+from starlette.formparsers import MultiPartParser
+
+from scratch import SCRATCH_MEMORY_DIR, SCRATCH_MEMORY_MAX_BYTES
+
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(500 * 1024 * 1024)))
+MAX_QUESTION_BYTES = int(os.getenv("MAX_QUESTION_BYTES", str(1024 * 1024)))
+
+if SCRATCH_MEMORY_DIR:
+    # Starlette spools multipart parts over 1 MB to the system temp dir before the endpoint
+    # runs; parts small enough for the memory scratch stay in RAM instead, so those uploads
+    # never touch persistent disk. Buffered bytes per request remain capped by MAX_REQUEST_BYTES
+    MultiPartParser.spool_max_size = max(MultiPartParser.spool_max_size, SCRATCH_MEMORY_MAX_BYTES)
+
+class UploadTooLarge(Exception):
+    pass
+
+class UploadBudget:
+    """Byte allowance shared by all files of one request."""
+
+    def __init__(self, max_request_bytes: int = MAX_REQUEST_BYTES, max_file_bytes: int = MAX_UPLOAD_BYTES,
+                 scratch: Optional[Any] = None):
+        self.remaining = max_request_bytes
+        self.max_request_bytes = max_request_bytes
+        self.max_file_bytes = max_file_bytes
+        # ScratchDir the bytes land in; charged so the scratch quota holds across requests
+        self.scratch = scratch
+
+    def precheck(self, name: str, declared: int):
+        if declared > self.max_file_bytes:
+            raise UploadTooLarge(f"{name} exceeds the {self.max_file_bytes} byte per-file limit")
+        if declared > self.remaining:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_request_bytes} byte per-request limit")
+
+    def charge(self, name: str, nbytes: int, file_total: int):
+        if file_total > self.max_file_bytes:
+            raise UploadTooLarge(f"{name} exceeds the {self.max_file_bytes} byte per-file limit")
+        if nbytes > self.remaining:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_request_bytes} byte per-request limit")
+        if self.scratch is not None:
+            self.scratch.reserve(nbytes)
+        self.remaining -= nbytes
+
+class _BodyTooLarge(Exception):
+    pass
+
+class RequestSizeLimit:
+    """
+    ASGI middleware answering 413 for POST bodies over `max_bytes`. A declared Content-Length
+    is refused before anything is read; chunked bodies (no length) are counted as they arrive,
+    so the multipart parser stops spooling at the limit instead of after the whole body.
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_REQUEST_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(status_code=413, content={"detail": f"Request exceeds {self.max_bytes} bytes"})
+        await response(scope, receive, send)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_bytes:
+            return await self._reject(scope, receive, send)
+        received = 0
+        exceeded = started = False
+
+        async def counted_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            # Once over the limit, whatever the app makes of the aborted body (FastAPI: 400) is dropped
+            if not exceeded:
+                started = True
+                await send(message)
+
+        try:
+            await self.app(scope, counted_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+        if exceeded and not started:
+            await self._reject(scope, receive, send)
+
+def safe_filename(name: str) -> str:
+    name = os.path.basename((name or "").replace("\\", "/"))
+    return name if name not in ("", ".", "..") else "upload"
+
+async def save_upload(f: UploadFile, dest_dir: str, budget: UploadBudget) -> Tuple[str, int, str]:
+    """
+    Stream an upload to `dest_dir` in chunks, enforcing `budget` as bytes arrive.
+    Returns (path, size, sha256 hex digest); a partially written file is removed on rejection.
+    """
+    name = safe_filename(f.filename)
+    # Reject on the declared size before copying anything
+    if f.size is not None:
+        budget.precheck(name, f.size)
+    path = os.path.join(dest_dir, name)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = await f.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                budget.charge(name, len(chunk), size)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        raise
+    return path, size, digest.hexdigest()
+
+def declared_size(files: Optional[List[UploadFile]]) -> int:
+    # Multipart parts are spooled before the endpoint runs, so their sizes are known up front
+    return sum(f.size or 0 for f in files or ())
+
+async def read_question(f: UploadFile) -> str:
+    data = await f.read(MAX_QUESTION_BYTES + 1)
+    if len(data) > MAX_QUESTION_BYTES:
+        raise UploadTooLarge(f"Question text exceeds {MAX_QUESTION_BYTES} bytes")
+    return data.decode("utf-8", errors="ignore")
@@ -1,5 +1,5 @@
-import base64
 from typing import Any, Dict
+from images import PngImage, base64_decoded_size
 
 class ValidationError(Exception):
     pass
@@ -10,7 +10,7 @@ def validate_final_output_schema(result: Any, output_spec: Dict[str, Any]):
         if not isinstance(result, list):
             raise ValidationError("Expected JSON array output.")
         # Prefer primitive types in array (esp. for evaluators expecting strings)
-        if not all(isinstance(x, (str, int, float, bool)) for x in result):
+        if not all(isinstance(x, (str, int, float, bool, PngImage)) for x in result):
             raise ValidationError("JSON array items must be primitive types (prefer strings).")
     else:
         if not isinstance(result, dict):
@@ -23,22 +23,23 @@ def validate_final_output_schema(result: Any, output_spec: Dict[str, Any]):
         if missing:
             raise ValidationError(f"Missing keys: {missing}")
 
-    # Validate PNG sizes for likely base64 fields (look for PNG magic iVBOR)
+    # Validate PNG sizes: PngImage carries its raw size; base64 strings (PNG magic iVBOR)
+    # are sized from their length without decoding
     max_bytes = output_spec.get("image_constraints", {}).get("max_png_bytes", 100_000)
 
-    def check_b64_png(val: str):
-        try:
-            raw = base64.b64decode(val, validate=True)
-        except Exception:
+    def check_png(val: Any):
+        if isinstance(val, PngImage):
+            size = len(val)
+        elif isinstance(val, str) and len(val) > 100 and "iVBOR" in val[:20]:
+            size = base64_decoded_size(val)
+        else:
             return
-        if len(raw) > max_bytes:
+        if size > max_bytes:
             raise ValidationError(f"PNG exceeds {max_bytes} bytes")
 
     if isinstance(result, dict):
         for v in result.values():
-            if isinstance(v, str) and len(v) > 100 and "iVBOR" in v[:20]:
-                check_b64_png(v)
+            check_png(v)
     elif isinstance(result, list):
         for v in result:
-            if isinstance(v, str) and len(v) > 100 and "iVBOR" in v[:20]:
-                check_b64_png(v)
+            check_png(v)
@@ -1,17 +1,21 @@
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-from plot_utils import png_base64_under_limit
-
-def handle_weather_task(qtext: str, csv_path: str) -> dict:
-    # Load CSV with date, temperature_c, precip_mm columns
-    df = pd.read_csv(csv_path)
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df["temperature_c"] = pd.to_numeric(df["temperature_c"], errors="coerce")
-    df["precip_mm"] = pd.to_numeric(df["precip_mm"], errors="coerce")
-    df = df.dropna(subset=["date", "temperature_c", "precip_mm"])
+from typing import Union
+from plot_utils import downsample_line, line_width_px, new_subplots, png_image_under_limit, render_charts
+from io_utils import CsvDataset, as_dataset
+
+def _clean(raw: pd.DataFrame) -> pd.DataFrame:
+    df = pd.DataFrame({
+        "date": pd.to_datetime(raw["date"], errors="coerce"),
+        "temperature_c": pd.to_numeric(raw["temperature_c"], errors="coerce"),
+        "precip_mm": pd.to_numeric(raw["precip_mm"], errors="coerce"),
+    })
+    return df.dropna(subset=["date", "temperature_c", "precip_mm"])
+
+def handle_weather_task(qtext: str, source: Union[str, CsvDataset]) -> dict:
+    # Shared frame with date, temperature_c, precip_mm columns
+    ds = as_dataset(source)
+    df = ds.memo("weather_frame", lambda: _clean(ds.frame))
 
     # 1. Average temp
     average_temp_c = float(np.mean(df["temperature_c"])) if not df.empty else 0.0
@@ -35,22 +39,28 @@ def handle_weather_task(qtext: str, csv_path: str) -> dict:
     average_precip_mm = float(np.mean(df["precip_mm"])) if not df.empty else 0.0
 
     # 6. Temperature over time: line chart, red line, labeled
-    fig1, ax1 = plt.subplots(figsize=(4,3))
-    ax1.plot(df["date"], df["temperature_c"], color="red", linewidth=2)
-    ax1.set_xlabel("Date")
-    ax1.set_ylabel("Temperature (°C)")
-    ax1.set_title("Temperature Over Time")
-    plt.tight_layout()
-    temp_chart_b64 = png_base64_under_limit(fig1)
+    def temp_chart():
+        fig1, ax1 = new_subplots(figsize=(4,3))
+        xs, ys = downsample_line(df["date"].to_numpy(), df["temperature_c"].to_numpy(), line_width_px(fig1))
+        ax1.plot(xs, ys, color="red", linewidth=2)
+        ax1.set_xlabel("Date")
+        ax1.set_ylabel("Temperature (°C)")
+        ax1.set_title("Temperature Over Time")
+        fig1.tight_layout()
+        return png_image_under_limit(fig1)
 
     # 7. Precip histogram, orange bars, labeled
-    fig2, ax2 = plt.subplots(figsize=(4,3))
-    ax2.hist(df["precip_mm"], color="orange", bins=min(10, len(df)))
-    ax2.set_xlabel("Precipitation (mm)")
-    ax2.set_ylabel("Count")
-    ax2.set_title("Precipitation Histogram")
-    plt.tight_layout()
-    precip_chart_b64 = png_base64_under_limit(fig2)
+    def precip_chart():
+        fig2, ax2 = new_subplots(figsize=(4,3))
+        ax2.hist(df["precip_mm"], color="orange", bins=min(10, len(df)))
+        ax2.set_xlabel("Precipitation (mm)")
+        ax2.set_ylabel("Count")
+        ax2.set_title("Precipitation Histogram")
+        fig2.tight_layout()
+        return png_image_under_limit(fig2)
+
+    charts = ds.memo("weather_charts", lambda: render_charts(
+        {"temp_line_chart": temp_chart, "precip_histogram": precip_chart}))
 
     return {
         "average_temp_c": average_temp_c,
@@ -58,6 +68,6 @@ def handle_weather_task(qtext: str, csv_path: str) -> dict:
         "min_temp_c": min_temp_c,
         "temp_precip_correlation": temp_precip_correlation,
         "average_precip_mm": average_precip_mm,
-        "temp_line_chart": temp_chart_b64,
-        "precip_histogram": precip_chart_b64,
+        "temp_line_chart": charts["temp_line_chart"],
+        "precip_histogram": charts["precip_histogram"],
     }
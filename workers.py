@@ -0,0 +1,105 @@
+import os
+import asyncio
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Union
+from lazy_imports import import_times, timed_import
+from metrics import add_samples, capture_samples
+
+# "thread" keeps analyzers in-process; "process" sidesteps the GIL for pandas/matplotlib work
+ANALYZER_BACKEND = os.getenv("ANALYZER_BACKEND", "thread").lower()
+ANALYZER_WORKERS = int(os.getenv("ANALYZER_WORKERS", "0")) or (os.cpu_count() or 1)
+ANALYZER_START_METHOD = os.getenv("ANALYZER_START_METHOD", "spawn")
+
+# Heaviest first, so each entry's time is roughly its own incremental cost
+WARM_MODULES = ("numpy", "pandas", "matplotlib", "matplotlib.backends.backend_agg", "PIL.Image",
+                "networkx", "lxml.html", "requests",
+                "sales_analyzer", "films_analyzer", "network_analyzer", "weather_analyzer", "csv_tools")
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+def _warm_worker() -> Dict[str, float]:
+    # Agg is selected by plot_utils, which every analyzer imports
+    for name in WARM_MODULES:
+        timed_import(name)
+    return import_times()
+
+def _resolve(target: Union[Callable[..., Any], str]) -> Callable[..., Any]:
+    if callable(target):
+        return target
+    module, attr = target.split(":", 1)
+    return getattr(timed_import(module), attr)
+
+def _invoke(target: Union[Callable[..., Any], str], args, kwargs) -> Any:
+    # Worker-side metric samples go back with the result; a process worker's own registry is never scraped
+    with capture_samples() as samples:
+        return _resolve(target)(*args, **kwargs), samples
+
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                if ANALYZER_BACKEND == "process":
+                    _executor = ProcessPoolExecutor(
+                        max_workers=ANALYZER_WORKERS,
+                        mp_context=multiprocessing.get_context(ANALYZER_START_METHOD),
+                        initializer=_warm_worker,
+                    )
+                elif ANALYZER_BACKEND == "thread":
+                    _executor = ThreadPoolExecutor(max_workers=ANALYZER_WORKERS,
+                                                   thread_name_prefix="analyzer")
+                else:
+                    raise ValueError(f"Unknown ANALYZER_BACKEND: {ANALYZER_BACKEND!r}")
+    return _executor
+
+async def start_workers() -> Dict[str, float]:
+    """
+    Create the pool and make sure every worker has imported the heavy modules.
+    Returns the per-module import times measured in a worker.
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    if ANALYZER_BACKEND == "process":
+        # One warm-up task per worker forces the pool to spawn all of them now
+        results = await asyncio.gather(*[loop.run_in_executor(executor, _warm_worker)
+                                         for _ in range(ANALYZER_WORKERS)])
+        return results[0]
+    return await loop.run_in_executor(executor, _warm_worker)
+
+def shutdown_workers():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def _discard_broken(executor: Executor):
+    # Only the first caller to see a broken pool drops it; the next get_executor() builds a fresh one
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+async def run_analyzer(target: Union[Callable[..., Any], str], *args, **kwargs) -> Any:
+    """
+    Run a blocking analyzer on the configured backend without stalling the event loop.
+    `target` may be a "module:function" string, imported lazily inside the worker so the
+    API process never loads the analyzer stack itself. A process pool left broken by a
+    killed worker (e.g. OOM) is replaced and the call retried once.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(_invoke, target, args, kwargs)
+    executor = get_executor()
+    try:
+        result, samples = await loop.run_in_executor(executor, call)
+    except BrokenProcessPool:
+        _discard_broken(executor)
+        result, samples = await loop.run_in_executor(get_executor(), call)
+    add_samples(samples)
+    return result
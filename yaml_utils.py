@@ -1,29 +1,212 @@
 import os
-from typing import Dict, Any
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List
 import yaml
+from yaml.composer import Composer
+from yaml.constructor import SafeConstructor
+from yaml.resolver import Resolver
 
-def _safe_load_yaml_path(path: str):
+try:
+    from yaml.cyaml import CParser
+except ImportError:  # PyYAML built without libyaml
+    CParser = None
+
+# libyaml-backed loader when PyYAML was built with it; same safe tag set either way
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Larger files and deeper nesting are reported as errors instead of being parsed
+YAML_MAX_BYTES = int(os.getenv("YAML_MAX_BYTES", str(16 * 1024 * 1024)))
+YAML_MAX_DEPTH = int(os.getenv("YAML_MAX_DEPTH", "64"))
+YAML_PARSE_WORKERS = int(os.getenv("YAML_PARSE_WORKERS", "4"))
+
+_parse_pool = ThreadPoolExecutor(max_workers=YAML_PARSE_WORKERS, thread_name_prefix="yaml")
+
+class YamlLimitExceeded(ValueError):
+    pass
+
+def _read_yaml_text(path: str) -> str:
+    if os.path.getsize(path) > YAML_MAX_BYTES:
+        raise YamlLimitExceeded(f"{os.path.basename(path)} is larger than {YAML_MAX_BYTES} bytes")
     with open(path, "rb") as f:
         data = f.read()
     try:
-        text = data.decode("utf-8")
+        return data.decode("utf-8")
     except UnicodeDecodeError:
-        text = data.decode("utf-8", errors="ignore")
-    return yaml.safe_load(text)
+        return data.decode("utf-8", errors="ignore")
+
+def scan_top_level_keys(text: str) -> List[str]:
+    """
+    Top-level mapping keys from the parser's event stream, without constructing the
+    document. Enforces YAML_MAX_DEPTH; like safe_load, rejects multi-document streams.
+    """
+    keys: List[str] = []
+    depth = 0
+    root_is_mapping = False
+    expect_key = True
+    documents = 0
+    for event in yaml.parse(text, Loader=SafeLoader):
+        if isinstance(event, yaml.DocumentStartEvent):
+            documents += 1
+            if documents > 1:
+                raise yaml.YAMLError("expected a single document in the stream")
+        elif isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+            if depth == 0:
+                root_is_mapping = isinstance(event, yaml.MappingStartEvent)
+            elif depth == 1 and root_is_mapping:
+                expect_key = not expect_key
+            depth += 1
+            if depth > YAML_MAX_DEPTH:
+                raise YamlLimitExceeded(f"nesting deeper than {YAML_MAX_DEPTH} levels")
+        elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            depth -= 1
+        elif isinstance(event, (yaml.ScalarEvent, yaml.AliasEvent)) and depth == 1 and root_is_mapping:
+            if expect_key and isinstance(event, yaml.ScalarEvent) and event.value != "<<":
+                keys.append(event.value)
+            expect_key = not expect_key
+    return keys
+
+class _DepthLimit:
+    """Composer mixin: nesting deeper than YAML_MAX_DEPTH is rejected while the node graph is built."""
+
+    _depth = 0
+
+    def _enter(self):
+        self._depth += 1
+        if self._depth > YAML_MAX_DEPTH:
+            raise YamlLimitExceeded(f"nesting deeper than {YAML_MAX_DEPTH} levels")
+
+    def compose_sequence_node(self, anchor):
+        self._enter()
+        try:
+            return super().compose_sequence_node(anchor)
+        finally:
+            self._depth -= 1
+
+    def compose_mapping_node(self, anchor):
+        self._enter()
+        try:
+            return super().compose_mapping_node(anchor)
+        finally:
+            self._depth -= 1
+
+if CParser is not None:
+    class DepthLimitedLoader(_DepthLimit, Composer, CParser, SafeConstructor, Resolver):
+        """
+        Safe loader that parses once: libyaml produces the events and Python composes them,
+        so the depth limit holds before libyaml's own (unbounded, recursive) composer runs.
+        """
+
+        def __init__(self, stream):
+            CParser.__init__(self, stream)
+            Composer.__init__(self)
+            SafeConstructor.__init__(self)
+            Resolver.__init__(self)
+else:
+    class DepthLimitedLoader(_DepthLimit, yaml.SafeLoader):
+        """Safe loader that enforces YAML_MAX_DEPTH in the same parse that builds the document."""
+
+def _safe_load_yaml_path(path: str):
+    return yaml.load(_read_yaml_text(path), Loader=DepthLimitedLoader)
+
+def _error(path: str, e: Exception) -> Dict[str, str]:
+    if isinstance(e, YamlLimitExceeded):
+        return {"__error__": f"YAML limit exceeded: {e}"}
+    return {"__error__": f"Failed to parse YAML: {os.path.basename(path)}"}
+
+def _parse_or_error(path: str) -> Any:
+    try:
+        return _safe_load_yaml_path(path)
+    except Exception as e:
+        return _error(path, e)
+
+def _keys_or_none(path: str):
+    try:
+        return scan_top_level_keys(_read_yaml_text(path))
+    except Exception:
+        return None
+
+def _map_files(fn, paths: Dict[str, str]) -> Dict[str, Any]:
+    if len(paths) <= 1:
+        return {name: fn(path) for name, path in paths.items()}
+    return dict(zip(paths, _parse_pool.map(fn, paths.values())))
+
+class YamlFiles(Mapping):
+    """Filename -> parsed YAML document; each file is parsed on first access, then kept."""
+
+    def __init__(self, paths: Dict[str, str]):
+        self._paths = paths
+        self._parsed: Dict[str, Any] = {}
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._parsed:
+            self._parsed[name] = _parse_or_error(self._paths[name])
+        return self._parsed[name]
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def load_all(self) -> "YamlFiles":
+        """Parse every file not yet parsed, across the YAML thread pool."""
+        todo = {n: p for n, p in self._paths.items() if n not in self._parsed}
+        self._parsed.update(_map_files(_parse_or_error, todo))
+        return self
 
-def load_yaml_files_merged(file_map: Dict[str, str]) -> Dict[str, Any]:
-    yaml_files = {n: p for n, p in file_map.items() if n.lower().endswith((".yaml", ".yml"))}
+    def top_level_keys(self) -> Dict[str, Any]:
+        """Filename -> top-level keys (None for unparseable or non-mapping files), scanning unparsed files."""
+        out = {n: list(obj.keys()) if isinstance(obj, dict) else None for n, obj in self._parsed.items()}
+        todo = {n: p for n, p in self._paths.items() if n not in self._parsed}
+        out.update(_map_files(_keys_or_none, todo))
+        return out
+
+class YamlContext(Mapping):
+    """
+    Lazy equivalent of load_yaml_files_merged's result: {'files': ..., '__summary__': ...}.
+    The summary comes from an event scan of each file, so planning never builds the
+    documents; they are parsed when a plan reads them and travel with the context.
+    """
+
+    def __init__(self, paths: Dict[str, str]):
+        self.files = YamlFiles(paths)
+        self._summary = None
+
+    def summary(self) -> Dict[str, Any]:
+        if self._summary is None:
+            top_keys = set()
+            for keys in self.files.top_level_keys().values():
+                top_keys |= set(map(str, keys or ()))
+            self._summary = {"count": len(self.files), "keys": sorted(top_keys)}
+        return self._summary
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "files":
+            return self.files
+        if key == "__summary__":
+            return self.summary()
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(("files", "__summary__"))
+
+    def __len__(self) -> int:
+        return 2
+
+def _yaml_paths(file_map: Dict[str, str]) -> Dict[str, str]:
+    return {n: p for n, p in file_map.items() if n.lower().endswith((".yaml", ".yml"))}
+
+def load_yaml_context(file_map: Dict[str, str]):
+    yaml_files = _yaml_paths(file_map)
+    return YamlContext(yaml_files) if yaml_files else {}
+
+def load_yaml_files_merged(file_map: Dict[str, str], summary_only: bool = False) -> Dict[str, Any]:
+    """Eager form: every file parsed (in parallel), or with summary_only just the key scan."""
+    yaml_files = _yaml_paths(file_map)
     if not yaml_files:
         return {}
-    parsed: Dict[str, Any] = {"files": {}}
-    top_keys = set()
-    for name, path in yaml_files.items():
-        try:
-            obj = _safe_load_yaml_path(path)
-        except Exception:
-            obj = {"__error__": f"Failed to parse YAML: {os.path.basename(path)}"}
-        parsed["files"][name] = obj
-        if isinstance(obj, dict):
-            top_keys |= set(obj.keys())
-    parsed["__summary__"] = {"count": len(yaml_files), "keys": sorted(list(top_keys))}
-    return parsed
+    ctx = YamlContext(yaml_files)
+    if summary_only:
+        return {"__summary__": ctx.summary()}
+    return {"files": dict(ctx.files.load_all()), "__summary__": ctx.summary()}